@@ -1,3 +1,5 @@
+from functools import partial
+
 from rdkit import Chem
 from rdkit.Chem import Draw
 from rdkit.Chem.Draw import MolDraw2D
@@ -6,9 +8,22 @@ from rdkit.Chem.Draw import rdMolDraw2D
 from rdkit import DataStructs
 from rdkit.Chem.Fingerprints import FingerprintMols
 from rdkit.Chem.AtomPairs import Pairs
+from rdkit.Chem import rdFingerprintGenerator
+
+
+# Morgan generators, one per setting, so they are only made once
+_morgan_generators = {}
 
 
 class ChemOperators:
+    # Default settings for each fingerprint type. "pattern" is only used to screen compounds for substructure search
+    fingerprint_defaults = {
+        "finger": {},
+        "morgan": {"radius": 2, "n_bits": 2048, "chirality": False, "features": False},
+        "dice": {},
+        "pattern": {"n_bits": 2048},
+    }
+
     def __str__(self):
         """
         All the chemical operations that are being made.
@@ -27,6 +42,20 @@ class ChemOperators:
         """
         return Chem.MolFromSmiles(smiles)
 
+    def get_query_mol(self, smiles):
+        """
+        Gets the molecule for a substructure search. If the smiles code can not be read, it is read as SMARTS
+
+        :param smiles: Smiles code or SMARTS for the substructure
+        :type smiles: str
+        :return: The substructure, or None if it can not be read
+        :rtype: Chem.Mol
+        """
+        mol = self.get_mol(smiles)
+        if mol is None:
+            mol = Chem.MolFromSmarts(smiles)
+        return mol
+
     def png_string(self, smiles, size=(250, 100)):
         """
         Translate smiles code to a png-string that can be drawn, to get a 2d drawing of compounds from a smiles code
@@ -44,11 +73,129 @@ class ChemOperators:
         data.FinishDrawing()
         return data.GetDrawingText()
 
-    def structure_search(self, methode, threshold, rows, smiles_search, morgan_values=None):
+    def fingerprint_params(self, methode, params=None):
+        """
+        Gets the full settings for a fingerprint type, with the default values for the settings that are missing
+
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params: The settings for the fingerprint
+        :type params: dict or None
+        :return: The settings for the fingerprint
+        :rtype: dict
+        """
+        try:
+            fingerprint_params = dict(self.fingerprint_defaults[methode])
+        except KeyError:
+            raise ValueError(f"Unknown structure search methode: {methode}")
+        if params:
+            for key, value in params.items():
+                if key not in fingerprint_params or value is None or value == "":
+                    continue
+                default = fingerprint_params[key]
+                # Values from the GUI and the config are strings, and needs the same type as the default, so the
+                # same settings always gives the same fingerprints in the fingerprint store
+                if isinstance(default, bool):
+                    if isinstance(value, str):
+                        value = value.strip().lower() in ("true", "1", "yes")
+                    fingerprint_params[key] = bool(value)
+                else:
+                    fingerprint_params[key] = type(default)(value)
+        return fingerprint_params
+
+    @staticmethod
+    def fingerprint(mol, methode, params):
+        """
+        Makes the fingerprint for a compound
+
+        :param mol: The compound
+        :type mol: Chem.Mol
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params: The settings for the fingerprint, see fingerprint_params
+        :type params: dict
+        :return: The fingerprint
+        :rtype: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        """
+        if methode == "finger":
+            return FingerprintMols.FingerprintMol(mol)
+        elif methode == "morgan":
+            return ChemOperators.morgan_generator(params).GetFingerprint(mol)
+        elif methode == "dice":
+            return Pairs.GetAtomPairFingerprint(mol)
+        elif methode == "pattern":
+            return Chem.PatternFingerprint(mol, fpSize=params["n_bits"])
+
+        raise ValueError(f"Unknown structure search methode: {methode}")
+
+    @staticmethod
+    def morgan_generator(params):
+        """
+        Gets the Morgan fingerprint generator for a setting. Gives the same fingerprints as
+        AllChem.GetMorganFingerprintAsBitVect
+
+        :param params: The settings for the fingerprint, see fingerprint_params
+        :type params: dict
+        :return: The generator
+        :rtype: rdFingerprintGenerator.FingerprintGenerator64
+        """
+        key = (params["radius"], params["n_bits"], params["chirality"], params["features"])
+        if key not in _morgan_generators:
+            settings = {"radius": params["radius"], "fpSize": params["n_bits"], "includeChirality": params["chirality"]}
+            if params["features"]:
+                settings["atomInvariantsGenerator"] = rdFingerprintGenerator.GetMorganFeatureAtomInvGen()
+            _morgan_generators[key] = rdFingerprintGenerator.GetMorganGenerator(**settings)
+        return _morgan_generators[key]
+
+    @staticmethod
+    def similarity(methode, fp_1, fp_2):
+        """
+        Scores how similar two fingerprints are
+
+        :param methode: What fingerprint type the fingerprints are. (finger, morgan or dice)
+        :type methode: str
+        :param fp_1: The first fingerprint
+        :type fp_1: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        :param fp_2: The second fingerprint
+        :type fp_2: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        :return: Match score from 0 to 100
+        :rtype: float
+        """
+        if methode == "dice":
+            return DataStructs.DiceSimilarity(fp_1, fp_2) * 100
+        return DataStructs.FingerprintSimilarity(fp_1, fp_2) * 100
+
+    @staticmethod
+    def bulk_similarity(methode, fp_search, fingerprints):
+        """
+        Scores how similar a list of fingerprints are to one fingerprint, in one call
+
+        :param methode: What fingerprint type the fingerprints are. (finger, morgan or dice)
+        :type methode: str
+        :param fp_search: The fingerprint the others are compared with
+        :type fp_search: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        :param fingerprints: The fingerprints to score
+        :type fingerprints: list
+        :return: Match scores from 0 to 100, in the same order as fingerprints
+        :rtype: list
+        """
+        if methode == "dice":
+            scores = DataStructs.BulkDiceSimilarity(fp_search, fingerprints)
+        elif all(fp.GetNumBits() == fp_search.GetNumBits() for fp in fingerprints):
+            scores = DataStructs.BulkTanimotoSimilarity(fp_search, fingerprints)
+        else:
+            # "finger" fingerprints are folded to different lengths, that the bulk function can not compare.
+            # FingerprintSimilarity folds the longest one first.
+            scores = [DataStructs.FingerprintSimilarity(fp_search, fp) for fp in fingerprints]
+        return [score * 100 for score in scores]
+
+    def structure_search(self, methode, threshold, rows, smiles_search, morgan_values=None, fingerprints=None):
         """
         Compare molecules with a main smiles code, to see how similar they are.
+        The fingerprint for the main smiles code is only made once. If fingerprints are given, they are used for the
+        compounds, instead of making new ones.
 
-        :param methode: What structure search methode to use. (general, morgan or dice)
+        :param methode: What structure search methode to use. (finger, morgan or dice)
         :type methode: str
         :param threshold: Minimum similarity score the compound needs
         :type threshold: int
@@ -57,17 +204,36 @@ class ChemOperators:
         :param smiles_search: Main smiles code, that compounds are compared to.
         :type smiles_search: str
         :param morgan_values: Morgan search values, for determining different variables of the search criteria.
-        :type: list or None
+            See fingerprint_defaults
+        :type morgan_values: dict or None
+        :param fingerprints: Fingerprints for the compounds in rows, with the same keys as rows.
+        :type fingerprints: dict or None
         :return: Rows from the database, with compounds under the threshold removed.
         :rtype: dict
         """
-        sub_search = self.sub_search_method(methode)
-        smiles_1 = smiles_search
+        if methode == "substructure":
+            return self.substructure_search(rows, smiles_search)
+
+        params = self.fingerprint_params(methode, morgan_values)
+        fp_search = self.fingerprint(self.get_mol(smiles_search), methode, params)
         compound_to_delete = []
+        compounds = []
+        fp_compounds = []
         for compound in rows:
-            smiles_2 = rows[compound]["smiles"]
-            smiles_temp = (smiles_1, smiles_2)
-            score = sub_search(smiles_temp)
+            if fingerprints is not None:
+                fp_compound = fingerprints.get(compound)
+            else:
+                mol = self.get_mol(rows[compound]["smiles"])
+                fp_compound = mol and self.fingerprint(mol, methode, params)
+
+            if fp_compound is None:
+                # The smiles code could not be read, so the compound can not be compared
+                compound_to_delete.append(compound)
+            else:
+                compounds.append(compound)
+                fp_compounds.append(fp_compound)
+
+        for compound, score in zip(compounds, self.bulk_similarity(methode, fp_search, fp_compounds)):
             if score >= threshold:
                 rows[compound]["match_score"] = round(score, 2)
             else:
@@ -78,21 +244,52 @@ class ChemOperators:
 
         return rows
 
-    def sub_search_method(self, methode):
+    def substructure_search(self, rows, smiles_search):
+        """
+        Finds the compounds that contains a substructure. All matches gets a score of 100.
+
+        :param rows: Rows from the database with compounds.
+        :type rows: dict
+        :param smiles_search: Smiles code or SMARTS for the substructure
+        :type smiles_search: str
+        :return: Rows from the database, with the compounds that do not contain the substructure removed.
+        :rtype: dict
+        """
+        query = self.get_query_mol(smiles_search)
+        compound_to_delete = []
+        for compound in rows:
+            mol = self.get_mol(rows[compound]["smiles"])
+            if mol is not None and mol.HasSubstructMatch(query):
+                rows[compound]["match_score"] = 100
+            else:
+                compound_to_delete.append(compound)
+
+        for compound in compound_to_delete:
+            rows.pop(compound)
+
+        return rows
+
+    def sub_search_method(self, methode, morgan_values=None):
         """
         set the methode to use
 
         :param methode: What methode to use
         :type methode: str
-        :return: Sub_search with the right set-up
+        :param morgan_values: Morgan search values, see fingerprint_defaults. Only used for morgan
+        :type morgan_values: dict or None
+        :return: Sub_search with the right set-up. Takes a tuple with two smiles codes, and returns the match score
         :rtype: function
         """
         if methode == "finger":
             sub_search = self.match_sub_structure_general
         elif methode == "morgan":
-            sub_search = self.match_morgan
+            params = self.fingerprint_params(methode, morgan_values)
+            sub_search = partial(self.match_morgan, bonds=params["radius"], n_bits=params["n_bits"],
+                                 chirality=params["chirality"], features=params["features"])
         elif methode == "dice":
             sub_search = self.match_dice
+        else:
+            raise ValueError(f"Unknown structure search methode: {methode}")
 
         return sub_search
 
@@ -111,32 +308,29 @@ class ChemOperators:
         match_score = DataStructs.FingerprintSimilarity(fp1, fp2) * 100
         return match_score
 
-    def match_morgan(self, smiles, bonds, n_bits, chirality, features):
+    def match_morgan(self, smiles, bonds=2, n_bits=2048, chirality=False, features=False):
         """
-        Using Morgan search to find out how similar two compounds are
-        NEEDS TO READ UP ON THIS! ! !
+        Using Morgan search to find out how similar two compounds are.
+        Each atom is described by the atoms around it, out to a number of bonds away, and the descriptions are hashed
+        into a bit vector. The match score is the Tanimoto similarity of the two bit vectors.
 
         :param smiles: The two smiles codes that are compared
         :type smiles: tuple
-        :param bonds:
-        :type bonds:
-        :param n_bits:
+        :param bonds: The radius, how many bonds away from each atom that are used
+        :type bonds: int
+        :param n_bits: The length of the bit vector
         :type n_bits: int
-        :param chirality:
+        :param chirality: If chirality should be used, so stereo isomers gets different fingerprints
         :type chirality: bool
-        :param features:
+        :param features: If atoms should be described by their features (donor, acceptor...), instead of the element
         :type features: bool
         :return: Match score for how similar the two compounds are
-        :rtype: int
+        :rtype: float
         """
-        mols = [self.get_mol(smile) for smile in smiles]
-        fp1, fp2 = [AllChem.GetMorganFingerprintAsBitVect(mol, radius=bonds, nBits=n_bits,
-                                                          useChirality=chirality, useFeatures=features)
-                    for mol in mols]
-
-        match_score_1 = DataStructs.FingerprintSimilarity(fp1, fp2) * 100
-        match_score_2 = DataStructs.TanimotoSimilarity(fp1, fp2) * 100
-        return match_score_1, match_score_2
+        params = self.fingerprint_params("morgan", {"radius": bonds, "n_bits": n_bits, "chirality": chirality,
+                                                    "features": features})
+        fp1, fp2 = [self.fingerprint(self.get_mol(smile), "morgan", params) for smile in smiles]
+        return DataStructs.TanimotoSimilarity(fp1, fp2) * 100
 
     def match_dice(self, smiles):
         """
@@ -171,4 +365,6 @@ if __name__ =="__main__":
     #print(co.PNGString(mol1, size))
     print(co.match_sub_structure_general(smiles))
     print(co.match_morgan(smiles, bound_range, n_bits, chirality, features))
+    print(co.sub_search_method("morgan", {"radius": bound_range, "n_bits": n_bits, "chirality": chirality,
+                                          "features": features})(smiles))
     print(co.match_dice(smiles))
\ No newline at end of file
@@ -0,0 +1,32 @@
+import configparser
+import os
+
+import pytest
+
+from database_handler import DataBaseFunctions, connection_manager
+from database_startup import DatabaseSetUp
+
+
+@pytest.fixture
+def config(tmp_path):
+    """
+    The config file from the repo, with the database moved to a temp folder
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(__file__), "config.ini"))
+    config["Database"]["database"] = str(tmp_path / "SCore.db")
+    config["folders"]["main_output_folder"] = str(tmp_path / "output")
+    return config
+
+
+@pytest.fixture
+def dbf(config):
+    """
+    Database functions for a new database with all the tables
+    """
+    setup = DatabaseSetUp(config, config["Database"]["database"])
+    setup.cw.run = lambda *args, **kwargs: None
+    setup.controller()
+    dbf = DataBaseFunctions(config)
+    yield dbf
+    connection_manager.close_all()
@@ -1,11 +1,47 @@
+import io
 import os
 import numpy as np
 import pandas as pd
 import re
 import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain, islice
 
+from ms_spectrum import SparseSpectrum
 
-def _uv_date(file, all_data, row_id):
+
+def _pda_3d(pda_text, dtype=np.float64):
+    """
+    Reads the UV data from the "[PDA 3D]" section of a UV file. The data is converted in one go with np.loadtxt,
+    instead of one line at the time.
+
+    :param pda_text: The "[PDA 3D]" section of the file. 10 lines of information, a line with the wavelengths and a
+        line per retention time
+    :type pda_text: str
+    :param dtype: The type for the UV intensities. np.float32 uses half the memory
+    :type dtype: type
+    :return: UV intensities, with wavelengths (columns) and retention times (rows)
+    :rtype: pd.DataFrame
+    """
+    # Delete the first 10 lines, and split the wavelengths from the data
+    pda_lines = pda_text.split('\n', 11)
+    # Extract wavelengths for column labels
+    UV_wavelengths = np.asarray(pda_lines[10].split('\t')[1:]).astype(float) / 100
+
+    # Retention times uses decimal comma, the intensities do not. The columns are tab separated, so all commas can be
+    # replaced before loading, without a converter
+    if len(pda_lines) > 11:
+        uv_data = np.loadtxt(io.StringIO(pda_lines[11].replace(',', '.')), delimiter='\t', ndmin=2)
+    else:
+        uv_data = np.zeros((0, len(UV_wavelengths) + 1))
+    if uv_data.shape[1] != len(UV_wavelengths) + 1:
+        raise ValueError("The UV data do not have the same amount of wavelengths as the header")
+
+    # Combine UV intensities, wavelengths (columns) and retention times (rows) in one dataframe
+    return pd.DataFrame(uv_data[:, 1:].astype(dtype), columns=UV_wavelengths, index=list(uv_data[:, 0]))
+
+
+def _uv_date(file, all_data, row_id, dtype=np.float64):
     """
     grabs UV data based on files ending with ".txt"
     It also uses data in the UV-files for batch name, and sample name for the complete DataFrame.
@@ -14,6 +50,8 @@ def _uv_date(file, all_data, row_id):
 
     :param file: raw data file for UV data
     :type file: str
+    :param dtype: The type for the UV intensities. np.float32 uses half the memory
+    :type dtype: type
     :param temp_file_name: List of file names of the data, to match it against MS data
     :type temp_file_name: list
     :param sample_id: List of compound id per sample
@@ -48,9 +86,8 @@ def _uv_date(file, all_data, row_id):
 
     for k in K:
 
-        x = uv_txt[k]
-        # Split x (string) at '/n', returns a list of strings
-        x = x.split('\n')
+        # Split x (string) at '/n', returns a list of strings. Only the first lines are needed to find the section
+        x = uv_txt[k].split('\n', 4)
 
         # get date and time
         if x[0] == "[File Information]":
@@ -66,37 +103,7 @@ def _uv_date(file, all_data, row_id):
 
         # Find relevant UV data where x[0]=='[PDA 3D]'
         if x[0] == '[PDA 3D]':
-            UV_data_index_sample = x
-            del UV_data_index_sample[0:10]
-
-    # Extract wavelengths for column labels
-    wavelengths = UV_data_index_sample[0]
-    wavelengths = wavelengths.split('\t')
-    del wavelengths[0]
-    wavelengths = np.asarray(wavelengths)
-    wavelengths = wavelengths.astype(float)
-    UV_wavelengths = wavelengths / 100
-
-    # Extract retention times doe row labels
-    UV_data1 = UV_data_index_sample[1:]
-    L = np.arange(0, len(UV_data1), 1)
-    UV_retention_times = []
-    for l in L:
-        x = UV_data1[l]
-        x = x.split('\t')
-        UV_retention_times.append(float(x[0].replace(',', '.')))
-
-    # Extract UV intensities
-    UV = []
-    for l in L:
-        x = UV_data1[l]
-        x = x.split('\t')
-        x = x[1:]
-        x = np.asarray(x)
-        x = x.astype(float)
-        UV.append(x)
-    # Combine UV intensities, wavelengths (columns) and retention times (rows) in one dataframe
-    temp_uv_data = pd.DataFrame(UV, columns=UV_wavelengths, index=UV_retention_times)
+            temp_uv_data = _pda_3d(uv_txt[k], dtype)
 
     # Setting up the data ditch for each sample for later use
     all_data[temp_sample] = {"row_id": "", "compound_id": "", "sample": "", "batch": "", "uv": "", "ms_pos": "",
@@ -111,202 +118,258 @@ def _uv_date(file, all_data, row_id):
     return all_data
 
 
-def _ms_neg(file, all_data):
-    """
-    Grabs negative MS data from "_Seg1Ev2.JDX"
-    compares the name with UV-file name to make sure that it is the right data.
+# The m/z-values the MS data is put on (ranges from 100 to 1000, with 0.05 intervals)
+# OBS: Change the m/z range here if needed
+mz_start = 100
+mz_step = 0.05
+mz_range = np.arange(mz_start, 1000.05, mz_step).round(2)
 
-    :param file: raw data file for MS data (Negative mode)
-    :type file:str
-    :param temp_file_name: list of file names, to compare with UV, to make sure that the same data is added to the
-        same sample/compound
-    :type temp_file_name: str
-    :param ms_neg_files: the MS data
-    :type ms_neg_files: list
-    :return: temp_ms_neg(infomation for ms_positive to make sure the two type matches), ms_neg_files (MS Data)
-    :rtype: str, list
+# Finds the first two numbers on each line, the same numbers as re.findall('\d*\.?\d+', line)[0:2] would find.
+# Each number needs to be the whole number, so a line with only one number, like "123,45", is not split into two
+_number = r"(?<!\d)(?<!\d\.)(\d*\.?\d+)(?!\.?\d)"
+_peak_pattern = re.compile(rf"^.*?{_number}.*?{_number}.*$", re.MULTILINE)
+
+
+def _jdx_scans(file):
     """
+    Reads a JCAMP-DX file with MS data, and splits it into scans
 
+    :param file: raw data file for MS data
+    :type file: str
+    :return: The text for each scan, without the "##SCAN_NUMBER" they are split on
+    :rtype: list
+    """
     with open(file) as f:
         jdx_file = f.read()
-    # Split MS_file at '##SCAN_NUMBER'
-    ms_file = jdx_file.split('##SCAN_NUMBER')
-    # Delete first string in MS_file
-    del ms_file[0]
-
-    # Generate the m/z-values (ranges from 100 to 1000, with 0.05 intervals)
-    # OBS: Change the m/z range here if needed
-    mz_range = np.arange(100, 1000.05, 0.05)
-    mz_range = mz_range.round(2)
-    # Generate array with length of the total number of scans
-    array = np.arange(0, len(ms_file), 1)
-    # Generate zero matrix
-    zero_matrix = np.zeros((len(array), len(mz_range)))
-    # Empty retention time array
+    # Split MS_file at '##SCAN_NUMBER', and delete the first string, as that is the file header
+    return jdx_file.split('##SCAN_NUMBER')[1:]
+
+
+def _ms_spectrum(ms_file):
+    """
+    Makes a sparse spectrum from MS scans, with retention times as rows and the m/z-values in mz_range as columns.
+    All peaks in a scan are read with one search, with the column found from the m/z-value, instead of searching
+    mz_range for it. Only the peaks are kept, SparseSpectrum.to_frame gives the dense DataFrame.
+
+    :param ms_file: The text for each scan, from _jdx_scans
+    :type ms_file: list
+    :return: The MS intensities, with m/z-values (columns) and retention times (rows)
+    :rtype: SparseSpectrum
+    """
     ms_retention_times = []
-    for m in array:
-        x = ms_file[m]
-        # Split MS_file at '/n'
-        x = x.split('\n')
+    peaks = []
+    peak_counts = []
+    last_scan = len(ms_file) - 1
+    for m, scan in enumerate(ms_file):
+        x = scan.split('\n')
         # Extract retention times
-        rt = re.findall('\d*\.?\d+', x[1].replace(",", "."))  # Extract retion time
-        rt = float(np.asarray(rt))
-        ms_retention_times.append(rt)
-        # Extract MS- data
-        del x[0:5]
-        del x[-1]
-        # Delete '##END' in the end of the file
-        if m == array[-1]:
-            del x[-1]
-        # Replace 0's in zero_matrix with detected m/z-values
-        N = np.arange(0, len(x), 1)
-        for n in N:
-            x[n] = x[n].replace(",", ".", 1)
-            x_mz = (float(re.findall('\d*\.?\d+', x[n])[0]))
-            ind = np.where(mz_range == x_mz)[0][0]
-            zero_matrix[m][ind] = float(re.findall('\d*\.?\d+', x[n])[1])
-    # Combine MS- intensities, m/z-values (columns) and retention times (rows) in one dataframe
-    df_ms_neg = pd.DataFrame(zero_matrix)
-    df_ms_neg.columns = mz_range
-    df_ms_neg.index = ms_retention_times
-    all_data["ms_neg"] = df_ms_neg
+        rt, = re.findall(r'\d*\.?\d+', x[1].replace(",", "."))
+        ms_retention_times.append(float(rt))
+        # Extract MS data. The last line is empty, and the last scan also ends with '##END'
+        # The first comma on each line is the decimal comma for the m/z-value
+        peak_lines = x[5:-2] if m == last_scan else x[5:-1]
+        scan_peaks = _peak_pattern.findall("\n".join(line.replace(",", ".", 1) for line in peak_lines))
+        if len(scan_peaks) != len(peak_lines):
+            raise ValueError(f"Could not read the peaks for scan {m + 1}")
+        peaks += chain.from_iterable(scan_peaks)
+        peak_counts.append(len(scan_peaks))
+
+    peaks = np.fromstring(" ".join(peaks), sep=" ").reshape(-1, 2)
+    rows = np.repeat(np.arange(len(ms_file)), peak_counts)
+    columns = np.rint((peaks[:, 0] - mz_start) / mz_step).astype(np.intp)
+    outside = (columns < 0) | (columns >= len(mz_range))
+    if outside.any() or np.any(mz_range[columns] != peaks[:, 0]):
+        raise ValueError("The MS data have m/z-values that are not in the m/z range")
+
+    return SparseSpectrum.from_peaks(rows, columns, peaks[:, 1], ms_retention_times, mz_range)
 
+
+def _ms_neg(file, all_data):
+    """
+    Grabs negative MS data from "_Seg1Ev2.JDX"
+
+    :param file: raw data file for MS data (Negative mode)
+    :type file:str
+    :param all_data: The data for the sample
+    :type all_data: dict
+    :return: The data for the sample, with the MS data under "ms_neg", as a SparseSpectrum
+    :rtype: dict
+    """
+    all_data["ms_neg"] = _ms_spectrum(_jdx_scans(file))
     return all_data
 
 
 def _ms_post(file, all_data):
     """
     Grabs positive MS data from "_Seg1Ev1.JDX"
-    compares the name with UV-file name to make sure that it is the rigth data.
 
     :param file: raw data file for MS data (Positive mode)
     :type file: str
-    :param temp_file_name: list of file names to make
-    :type temp_file_name: list
-    :param temp_ms_neg: list of file names, to compare with UV, to make sure that the same data is added to the
-        same sample/compound
-    :type temp_ms_neg: list
-    :param ms_pos_files: The Data
-    :type ms_pos_files: list
-    :return: ms_pos_files (MS data)
-    :rtype: list
+    :param all_data: The data for the sample, with the negative MS data
+    :type all_data: dict
+    :return: The data for the sample, with the MS data under "ms_pos", as a SparseSpectrum
+    :rtype: dict
     """
-
-    with open(file) as f:
-        JDXfile = f.read()
-
-    MS_file = JDXfile.split('##SCAN_NUMBER')
-    # Delete first string in MS_file
-    # self.ms_pos_file_name.append(MS_file[0].removeprefix("##TITLE= "))
-    del MS_file[0]
+    MS_file = _jdx_scans(file)
 
     # MS+ measurements does not always include the first reading (scan number 1)
     # If the first reading is present it is deleted, to make sure all MS+
     # readings have the same dimensions
-
     if len(MS_file) == len(all_data["ms_neg"]):
         del MS_file[0]
 
-    # Generate the m/z-values (ranges from 100 to 1000, with 0.05 intervals)
-    # OBS: Change the m/z range here if needed
-    mz_range = np.arange(100, 1000.05, 0.05)
-    mz_range = mz_range.round(2)
-    # Generate array with length of the total number of scans
-    M = np.arange(0, len(MS_file), 1)
-    # Generate zero matrix
-    zero_matrix = np.zeros((len(M), len(mz_range)))
-    # Empty retention time array
-    MS_retention_times = []
-    for m in M:
-        x = MS_file[m]
-        # Split MS_file at '/n'
-        x = x.split('\n')
-        # Extract retention times
-        RT = re.findall('\d*\.?\d+', x[1].replace(",", "."))  # Extract retion time
-        RT = float(np.asarray(RT))
-        MS_retention_times.append(RT)
-        # Extract MS+ data
-        del x[0:5]
-        del x[-1]
-        # Delete '##END' in the end of the file
-        if m == M[-1]:
-            del x[-1]
-        # Replace 0's in zero_matrix with detected m/z-values
-        N = np.arange(0, len(x), 1)
-        for n in N:
-            x[n] = x[n].replace(",", ".", 1)
-            x_mz = (float(re.findall('\d*\.?\d+', x[n])[0]))
-            ind = np.where(mz_range == x_mz)[0][0]
-            zero_matrix[m][ind] = float(re.findall('\d*\.?\d+', x[n])[1])
-    # Combine MS+ intensities, m/z-values (columns) and retention times (rows) in one dataframe
-    df_MS_pos = pd.DataFrame(zero_matrix)
-    df_MS_pos.columns = mz_range
-    df_MS_pos.index = MS_retention_times
-    all_data["ms_pos"] = df_MS_pos
+    all_data["ms_pos"] = _ms_spectrum(MS_file)
     return all_data
 
-def _file_handler(file_list):
+
+# The end of the file name for each type of file, and the key for the file in the sample files
+sample_file_types = {".txt": "uv", "_Seg1Ev2.JDX": "ms_neg", "_Seg1Ev1.JDX": "ms_pos"}
+
+
+def _sample_files(file_list):
     """
-    Goes through the full list of files and folders, and sends the right files to the right data handlers
+    Groups the files per sample, from the file names, so the files for a sample can be read together
 
     :param file_list: List of all files in a specific folder
     :type file_list: list
-    :return: sample_id, batch_id, batch_dic, temp_file_name, uv_files, ms_neg_files, ms_pos_files, sample_date
-    :rtype: list, list, dict, str, list, list, list, dict
+    :return: A dict with the sample names as keys, and a dict with the file for each type ("uv", "ms_neg" and
+        "ms_pos") as values. The samples are in the same order as the UV files in the file list
+    :rtype: dict
     """
+    samples = {}
+    # The UV files are first, so the samples are in the order of the UV files
+    for suffix, file_type in sample_file_types.items():
+        for file in file_list:
+            if file.endswith(suffix):
+                sample = os.path.basename(file).removesuffix(suffix)
+                samples.setdefault(sample, {})[file_type] = file
+    return samples
 
-    # running each file type seperated, as their names are being checked against each other, to make sure that
-    # there are files for each type of data. This could be changed for Threading, But then a different check needs
-    # to be put in place
-
-    row_id = 0
-    all_data = {}
-
-    for file in file_list:
-        # uv files
-        if file.endswith('.txt'):
-            row_id += 1
-            all_data = _uv_date(file, all_data, row_id)
 
-    for file in file_list:
-        # ms negativ files
-        if file.endswith('Ev2.JDX'):
+def _sample_data(sample, files, row_id, uv_dtype=np.float64):
+    """
+    Reads the UV file and the two MS files for one sample. Runs in the worker processes.
+
+    :param sample: The sample name, from the file names
+    :type sample: str
+    :param files: The file for each type, from _sample_files
+    :type files: dict
+    :param row_id: The row_id for the sample
+    :type row_id: int
+    :param uv_dtype: The type for the UV intensities
+    :type uv_dtype: type
+    :return: The sample name, the data for the sample, or None if the UV data is missing, and a list of problems
+        with the files for the sample
+    :rtype: (str, dict or None, list)
+    """
+    problems = []
+    if "uv" not in files:
+        return sample, None, ["Missing UV file (.txt)"]
+
+    try:
+        uv_data = _uv_date(files["uv"], {}, row_id, uv_dtype)
+    except (OSError, ValueError, IndexError, UnboundLocalError) as error:
+        return sample, None, [f"Could not read {files['uv']}: {error}"]
+    uv_sample, sample_data = next(iter(uv_data.items()))
+    if uv_sample != sample:
+        problems.append(f"The UV file is for sample {uv_sample}")
+
+    for file_type, read_ms, name in [("ms_neg", _ms_neg, "negative MS file (_Seg1Ev2.JDX)"),
+                                     ("ms_pos", _ms_post, "positive MS file (_Seg1Ev1.JDX)")]:
+        if file_type not in files:
+            problems.append(f"Missing {name}")
+            continue
+        try:
+            sample_data = read_ms(files[file_type], sample_data)
+        except (OSError, ValueError, IndexError) as error:
+            problems.append(f"Could not read {files[file_type]}: {error}")
+
+    return sample, sample_data, problems
+
+
+def stream_samples(file_list, workers=1, uv_dtype=np.float64):
+    """
+    Reads the data one sample at the time, and yields each sample when it is read.
+    With more than one worker, the samples are read in a process pool, and yielded in the order they are done.
 
-            sample = os.path.basename(file).removesuffix("_Seg1Ev2.JDX")
-            all_data[sample] = _ms_neg(file, all_data[sample])
+    :param file_list: List of all files in a specific folder
+    :type file_list: list
+    :param workers: Amount of processes to read the samples with
+    :type workers: int
+    :param uv_dtype: The type for the UV intensities. np.float32 uses half the memory
+    :type uv_dtype: type
+    :return: The sample name, the data for the sample, or None if it could not be read, and a list of problems with
+        the files for the sample
+    :rtype: (str, dict or None, list)
+    """
+    samples = _sample_files(file_list)
+    jobs = [(sample, files, row_id, uv_dtype) for row_id, (sample, files) in enumerate(samples.items(), start=1)]
+
+    if workers <= 1:
+        for job in jobs:
+            yield _sample_data(*job)
+        return
+
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Only a few samples are read ahead, so the finished samples are not all kept in memory
+        pending = {pool.submit(_sample_data, *job) for job in islice(jobs, workers * 2)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                for job in islice(jobs, 1):
+                    pending.add(pool.submit(_sample_data, *job))
+
+
+def _file_handler(file_list, workers=1, uv_dtype=np.float64):
+    """
+    Goes through the full list of files and folders, and sends the files for each sample to the data handlers.
+    The files are matched per sample from the file names before they are read, so the samples can be read at the
+    same time.
 
-    for file in file_list:
-        # ms positive files
-        if file.endswith('Ev1.JDX'):
-            sample = os.path.basename(file).removesuffix("_Seg1Ev1.JDX")
-            all_data[sample] = _ms_post(file, all_data[sample])
+    :param file_list: List of all files in a specific folder
+    :type file_list: list
+    :param workers: Amount of processes to read the samples with
+    :type workers: int
+    :param uv_dtype: The type for the UV intensities. np.float32 uses half the memory
+    :type uv_dtype: type
+    :return: The data for each sample, in the same order as the UV files, and a dict with the samples that have
+        problems with their files, with a list of the problems
+    :rtype: (dict, dict)
+    """
+    samples = {}
+    report = {}
+    for sample, sample_data, problems in stream_samples(file_list, workers, uv_dtype):
+        if problems:
+            report[sample] = problems
+        if sample_data is not None:
+            samples[sample_data["row_id"]] = sample_data
 
-    return all_data
+    all_data = {}
+    for row_id in sorted(samples):
+        all_data[samples[row_id]["sample"]] = samples[row_id]
+    return all_data, report
 
 
-def dm_controller(file_list):
+def dm_controller(file_list, workers=1, uv_dtype=np.float64):
     """
     access point for transforming raw data into a usefull formate
 
     :param file_list: list of all the UV and MS data files
     :type file_list: list
+    :param workers: Amount of processes to read the samples with
+    :type workers: int
+    :param uv_dtype: The type for the UV intensities. np.float32 uses half the memory
+    :type uv_dtype: type
     :return:
         - all_data: Dict of all data
-        - batch_dic: Dict of bach/plate with samples/compounds
-        - uv_tensor, ms_pos_tensor, ms_neg_tensor: tensors for UV and MS data.
-        - sample_date: date for the samples
+        - report: Dict of samples with missing or mismatched files, with a list of the problems for each
     :rtype:
         - dict
         - dict
-        - dict
-        - dict
-        - dict
-        - str
     """
-    all_data = _file_handler(file_list)
-
-
-    return all_data
+    return _file_handler(file_list, workers, uv_dtype)
 
 
 if __name__ == "__main__":
@@ -315,7 +378,7 @@ if __name__ == "__main__":
     database = "SCore.db"
     file_list = get_file_list(path)
 
-    test = DataMining()
-
-    all_data, batch_dic, uv_tensor, ms_pos_tensor, ms_neg_tensor = test.dm_controller(path)
+    all_data, report = dm_controller(file_list, os.cpu_count())
+    for sample, problems in report.items():
+        print(sample, problems)
 
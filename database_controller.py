@@ -1,6 +1,12 @@
 from chem_operators import ChemOperators
 
 from database_handler import DataBaseFunctions
+from descriptor_store import descriptor_row, descriptor_store_from_config
+from fingerprint_store import FingerprintStore
+from lsh_index import index_from_config
+from origin_resolver import OriginResolver
+from similarity_engine import SimilarityEngine
+from structure_index import StructureIndex, duplicates_from_config
 from sdf_handler import SDFReader
 from csv_handler import CSVReader
 from random import sample
@@ -20,7 +26,17 @@ class FetchData:
         self.config = config
         self.dbf = DataBaseFunctions(config)
         self.dbf.create_connection()
+        self.stats = self.dbf.statistics
         self.co = ChemOperators()
+        self.fp_store = FingerprintStore(self.dbf, config["Tables"].get("compound_fingerprint_table",
+                                                                        fallback="compound_fingerprint"))
+        self.origins = OriginResolver(self.dbf, config["Tables"].get("compound_source", fallback="origin"))
+        self.descriptors = descriptor_store_from_config(self.dbf, config)
+        self.lsh_index = index_from_config(config)
+        self.similarity = SimilarityEngine(self.fp_store,
+                                           config.getint("Structure_search", "chunk_size", fallback=65536),
+                                           config.getint("Structure_search", "workers", fallback=1),
+                                           self.lsh_index)
         self.database = config["Database"]["database"]
 
     def __str__(self):
@@ -31,8 +47,23 @@ class FetchData:
         :rtype: dict
         """
 
+    def __enter__(self):
+        self.dbf.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.dbf.__exit__(exc_type, exc_val, exc_tb)
+
+    def close(self):
+        """
+        Closes the connection to the database
+
+        :return: The connection is closed
+        """
+        self.dbf.close_connection()
+
     def get_number_of_rows(self, table):
-        return self.dbf.number_of_rows(table)
+        return self.stats.count(table)
 
     @staticmethod
     def _list_generator(sample_amount, compound_list_temp):
@@ -150,9 +181,11 @@ class FetchData:
         return plate_list
 
     def sub_structure_search(self, search_limiter, smiles, threshold,
-                             methode="sub_structure_general", table="compound_main"):
+                             methode="sub_structure_general", table="compound_main", top_k=None, morgan_values=None):
         """
-        Structure search controller. Controls witch function to use and what table to look into
+        Structure search controller. Controls witch function to use and what table to look into.
+        Only the compound_ids that fits the search_limiter are found first, and they are scored all at once by the
+        similarity engine, with the fingerprints from the fingerprint store. The full rows are only found for the hits.
 
         :param smiles: The smiles codes that needs to be compared
         :type smiles: str
@@ -164,18 +197,75 @@ class FetchData:
         :type methode: str
         :param table: What table to find the data
         :type table: str
+        :param top_k: Only keep the top_k most similar compounds. All compounds over the threshold if None
+        :type top_k: int or None
+        :param morgan_values: Morgan search values (radius, n_bits, chirality and features). Only used for morgan
+        :type morgan_values: dict or None
         :return: Rows of data from the Database with compound that fits the sub structure search criteria.
+            The rows are sorted with the most similar compound first.
         :rtype: dict
         """
-        if table == "compound_main":
-            rows = self.dbf.return_table_data(table, search_limiter)
-        elif table == "join_main_mp":
-            rows = self.dbf.join_table_controller(search_limiter)
+        if table == "join_main_mp":
+            compound_column = f"{self.config['Tables']['compound_main']}.compound_id"
+        else:
+            compound_column = "compound_id"
+        # The engine finds the smiles codes itself, for the compounds that needs a new fingerprint
+        candidates = dict.fromkeys(row[0] for row in self.data_stream(table, search_limiter, [compound_column]))
+        hits = self.similarity.search(smiles, methode, threshold, params=morgan_values, candidates=candidates,
+                                      top_k=top_k)
+        if not hits:
+            return {}
+
+        hit_search = dict(search_limiter)
+        hit_search["structure_hits"] = {"value": [compound for compound, _ in hits], "operator": "IN",
+                                        "target_column": "compound_id"}
+        rows = self.data_search(table, hit_search, self.search_columns(table))
+
+        matches = {}
+        for compound, score in hits:
+            matches[compound] = rows[compound]
+            matches[compound]["match_score"] = score
+        return matches
+
+    def search_columns(self, table, exclude=("png",)):
+        """
+        Gets the columns for a search, without the columns that are not needed. The "png" column is the biggest
+        column in compound_main, and most searches do not need it.
+
+        :param table: The table, or "join_main_mp" for compound_main joined with compound_mp
+        :type table: str
+        :param exclude: Columns to leave out
+        :type exclude: tuple or list
+        :return: A list of columns
+        :rtype: list
+        """
+        if table == "join_main_mp":
+            columns = []
+            for join_table in [self.config["Tables"]["compound_main"], self.config["Tables"]["compound_mp_table"]]:
+                columns += [f"{join_table}.{clm}" for clm in self.dbf.table_columns(join_table) if clm not in exclude]
+            return columns
 
-        rows = self.co.structure_search(methode, threshold, rows, smiles)
-        return rows
+        return [clm for clm in self.dbf.table_columns(table) if clm not in exclude]
+
+    def data_stream(self, table, search_limiter, columns=None):
+        """
+        Streams the rows from the database one at the time, instead of getting them all at once
+
+        :param table: What table to look into.
+        :type table: str
+        :param search_limiter: A dict over values to search for in the db
+        :type search_limiter: dict or None
+        :param columns: The columns to get. All columns if None
+        :type columns: list or None
+        :return: The rows from the Database
+        :rtype: sqlite3.Row
+        """
+        if table == "join_main_mp":
+            return self.dbf.stream_join(search_limiter, columns)
+        else:
+            return self.dbf.stream_table_data(table, search_limiter, columns)
 
-    def data_search(self, table, search_limiter):
+    def data_search(self, table, search_limiter, columns=None):
         """
         Gets a list of all compounds in the database
 
@@ -183,14 +273,15 @@ class FetchData:
         :type search_limiter: dict or int
         :param table: What table to look into.
         :type table: str
+        :param columns: The columns to get. All columns if None
+        :type columns: list or None
         :return: rows of data from the Database
         :rtype: dict
         """
-
-        if table == "join_main_mp":
-            rows = self.dbf.join_table_controller(search_limiter)
-        else:
-            rows = self.dbf.return_table_data(table, search_limiter)
+        rows = {}
+        for row in self.data_stream(table, search_limiter, columns):
+            # Same as DataBaseFunctions._row_creator, if two columns have the same name, the last one is used.
+            rows[row[0]] = dict(zip(row.keys(), row))
 
         return rows
 
@@ -205,16 +296,14 @@ class FetchData:
         :return: the rows for the compounds
         :rtype: dict
         """
-        rows = {}
-        for compound_id in compound_list:
-            temp_dict = self.dbf.records_to_rows(table, compound_id, "compound_id")
-            for key, value in temp_dict.items():
-                rows[key] = value
-
-        return rows
+        search_limiter = {"compound_id": {"value": compound_list,
+                                          "operator": "IN",
+                                          "target_column": "compound_id",
+                                          "use": True}}
+        return self.dbf.return_table_data(table, search_limiter)
 
     def list_limiter(self, sample_amount, table, sub_search, sub_search_methode, smiles,
-                     threshold, ignore_active, plated_compounds, search_limiter):
+                     threshold, ignore_active, plated_compounds, search_limiter, morgan_values=None):
         """
         Limits the list of compounds based on different criteria.
 
@@ -234,8 +323,11 @@ class FetchData:
         :type ignore_active: bool
         :param plated_compounds: list of compounds in MotherPlates
         :type plated_compounds: list or None
-        :param search_limiter: A dict over values to search for in the db
+        :param search_limiter: A dict over values to search for in the db. Can have a search_limiter for the
+            descriptor table, ex: {"mw": {"value": [200, 500], "operator": "BETWEEN", "target_column": "mw"}}
         :type search_limiter: dict
+        :param morgan_values: Morgan search values, if sub_search_methode is morgan
+        :type morgan_values: dict or None
         :return: all_the_things is a list containing the following:
             - limited_compound_list: A list of compounds
             - warnings: A dict of warnings for compounds that are close to being empty
@@ -264,14 +356,19 @@ class FetchData:
             if not compound_search["origin_id"]["value"]:
                 return None
 
+        descriptor_search = search_limiter.get(self.descriptors.table)
+        if descriptor_search and any(search.get("use", True) for search in descriptor_search.values()):
+            compound_search["descriptors"] = self.descriptors.exists_search(descriptor_search)
+
         if sub_search:
-            rows = self.sub_structure_search(compound_search, smiles, threshold, sub_search_methode, table)
+            rows = self.sub_structure_search(compound_search, smiles, threshold, sub_search_methode, table,
+                                             morgan_values=morgan_values)
         else:
             if table == "join_main_mp":
                 temp_table = "compound_mp"
             else:
                 temp_table = table
-            rows = self.data_search(temp_table, compound_search)
+            rows = self.data_search(temp_table, compound_search, self.search_columns(temp_table))
         if compound_search["volume"]["use"]:
             warnings = self._liquid_warning(rows, compound_search["volume"]["value"])
         else:
@@ -330,11 +427,22 @@ class AddData:
         """
         self.database = config["Database"]["database"]
         self.dbf = DataBaseFunctions(config)
-        fd = FetchData(config)
-        self.sdf_r = SDFReader(config, fd, self.dbf)
+        self.fd = FetchData(config)
+        self.sdf_r = SDFReader(config, self.fd, self.dbf)
         self.csv_r = CSVReader()
         self.xml_r = XMLReader()
         self.co = ChemOperators()
+        self.fp_store = FingerprintStore(self.dbf, config["Tables"].get("compound_fingerprint_table",
+                                                                        fallback="compound_fingerprint"))
+        self.fp_types = [fp_type.strip() for fp_type in
+                         config.get("Fingerprints", "precompute", fallback="").split(",") if fp_type.strip()]
+        self.lsh_index = self.fd.lsh_index
+        self.structures = StructureIndex(self.dbf, config["Tables"].get("compound_structure_table",
+                                                                        fallback="compound_structure"),
+                                         alias_table=config["Tables"].get("compound_alias_table",
+                                                                          fallback="compound_alias"))
+        self.descriptors = descriptor_store_from_config(self.dbf, config)
+        self.duplicates = duplicates_from_config(config)
 
     def __str__(self):
         """
@@ -343,6 +451,59 @@ class AddData:
         :return: Data added to the database
         """
 
+    def __enter__(self):
+        self.dbf.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.dbf.__exit__(exc_type, exc_val, exc_tb)
+
+    def close(self):
+        """
+        Closes the connection to the database
+
+        :return: The connection is closed
+        """
+        self.dbf.close_connection()
+
+    @staticmethod
+    def _add_to_report(report, table, table_report):
+        """
+        Adds the report from a bulk insert to the report for the whole import
+
+        :param report: The report for the whole import. Keys are tables, values are amount added and errors
+        :type report: dict
+        :param table: The table the data was added to
+        :type table: str
+        :param table_report: The report from DataBaseFunctions.bulk_insert
+        :type table_report: dict
+        :return: The updated report
+        :rtype: dict
+        """
+        report.setdefault(table, {"added": 0, "errors": []})
+        report[table]["added"] += table_report["added"]
+        report[table]["errors"] += table_report["errors"]
+        return report
+
+    def _merge_reports(self, report, stage_report):
+        """
+        Adds the report from one part of an import, to the report for the whole import
+
+        :param report: The report for the whole import
+        :type report: dict
+        :param stage_report: The report from one part of the import, ex: from compound_main. Keys are tables, with
+            amount added and errors, or lists like "duplicates" and "aliases"
+        :type stage_report: dict
+        :return: The updated report
+        :rtype: dict
+        """
+        for key, value in stage_report.items():
+            if isinstance(value, list):
+                report.setdefault(key, []).extend(value)
+            else:
+                self._add_to_report(report, key, value)
+        return report
+
     @staticmethod
     def _key_name_chang(temp_data):
         """
@@ -412,32 +573,26 @@ class AddData:
         return {value: dict_wrong_order[value] for value in key_order}
 
     @staticmethod
-    def _exp_dict_creator(compound_data, exp_count, exp_type, responsible):
+    def _exp_dict_creator(compound_data, exp_type, responsible):
         """
         Generates experiments enteries.
         Have not been tested!!!
+        The exp_id is left empty, so the database gives the experiment a new id, when it is added.
 
         :param compound_data: The data for the compounds that needs to be added to the table
         :type compound_data: dict
-        :param exp_count: The experiment counter, to make sure that each experiment have its own row
-        :type exp_count: int
         :param exp_type: What type of experiment the data is from.
         :type exp_type: str
         :param responsible: The person that ran the experiment
         :type responsible: str
-        :return:
-            - experiment_dict: A dict of the experimental data
-            - exp_count: The count for the experimental data
-        :rtype:
-            - dict
-            - int
+        :return: A dict of the experimental data
+        :rtype: dict
         """
         for data in compound_data:
             time_date = compound_data[data]["time_date"][0]
             break
-        exp_count += 1
-        experiment_dict = {"exp_id": exp_count, "type": exp_type, "responsible": responsible, "date": time_date}
-        return experiment_dict, exp_count
+        experiment_dict = {"exp_id": None, "type": exp_type, "responsible": responsible, "date": time_date}
+        return experiment_dict
 
     @staticmethod
     def _purity_unpacker(compound_data, exp_count):
@@ -474,30 +629,81 @@ class AddData:
 
         return compound_data
 
-    def compound_main(self, file_list, table="compound_main"):
+    def compound_main(self, file_list, table="compound_main", progress=None):
         """
-        Adds data to the main table.
+        Adds data to the main table, and makes fingerprints for the new compounds, for the fingerprint types in the
+        config file. The new compounds are also added to the LSH index, if it is used, and to the descriptor table,
+        with the descriptors calculated when the SDF file is read.
+        The SDF files are read in batches, and each batch is added before the next one is read.
+        Each batch is checked against the structure index, with one search, before it is added. Compounds with a
+        structure that is already in the database, or earlier in the batch, are handled as set in the config file:
+        "skip" leaves them out, "merge" adds their volume to the compound with the same structure, and "add" adds them
+        as new compounds. All duplicates are listed in the report under "duplicates".
+        Duplicates that are left out, or merged, are saved as aliases for the compound with the same structure, so a
+        MotherPlate that uses their compound_id is added to that compound instead, see mother_plate.
 
         :param file_list: list of sdf_file that contains compound and compound information
         :type file_list: list
         :param table: table to add the data. Should always be "compound_main"
         :type table: str
-        :return: Compounds added to the main table.
+        :param progress: Called with the file, the amount of compounds read from it, and the amount of the file read,
+            from 0 to 1
+        :type progress: function or None
+        :return: A report over compounds added to the main table, and compounds that could not be added.
+        :rtype: dict
         """
+        report = {}
         for sdf_file in file_list:
-            data = self.sdf_r.run(sdf_file)
-
-            for compounds in data:
-                temp_compounds_data = self._key_name_chang(data[compounds])
-                temp_compounds_data["png"] = self.co.png_string(temp_compounds_data["smiles"])
-                temp_compounds_data = self._re_ordering_dict(temp_compounds_data, table)
-                self.dbf.add_records_controller(table, temp_compounds_data)
+            file_progress = None
+            if progress is not None:
+                def file_progress(compound_count, fraction, sdf_file=sdf_file):
+                    progress(sdf_file, compound_count, fraction)
+
+            for data, read_errors in self.sdf_r.stream(sdf_file, file_progress):
+                self._add_to_report(report, table, {"added": 0, "errors": read_errors})
+
+                data = [self._key_name_chang(compound) for compound in data]
+                new_compounds, duplicates = self.structures.check(data)
+                for duplicate in duplicates:
+                    duplicate["action"] = self.duplicates
+                report.setdefault("duplicates", []).extend(duplicates)
+
+                compound_rows = []
+                for compound in data if self.duplicates == "add" else new_compounds:
+                    # The pictures are drawn by the DepictionService when they are shown
+                    compound["png"] = None
+                    compound_rows.append(self._re_ordering_dict(compound, table))
+
+                table_report = self.dbf.bulk_insert(table, compound_rows)
+                self._add_to_report(report, table, table_report)
+
+                failed = {error["data"]["compound_id"] for error in table_report["errors"]}
+                compounds = {row["compound_id"]: row["smiles"] for row in compound_rows
+                             if row["compound_id"] not in failed}
+                self._add_to_report(report, self.structures.table, self.structures.add(
+                    [compound for compound in new_compounds if compound["compound_id"] in compounds]))
+                self._add_to_report(report, self.descriptors.table, self.descriptors.add(
+                    [descriptor_row(compound["compound_id"], compound["descriptors"])
+                     for compound in data if compound["compound_id"] in compounds]))
+                if self.duplicates == "merge":
+                    self.structures.merge(duplicates, {compound["compound_id"]: compound["volume"]
+                                                       for compound in data})
+                if self.duplicates != "add":
+                    self._add_to_report(report, self.structures.alias_table, self.structures.add_aliases(duplicates))
+                for fp_type in self.fp_types:
+                    self._add_to_report(report, self.fp_store.table, self.fp_store.add(compounds, fp_type))
+                    if self.lsh_index is not None and fp_type in self.lsh_index.fp_types:
+                        self.lsh_index.add_from_store(self.fp_store, fp_type, compound_ids=compounds)
+
+        return report
 
     def mother_plate(self, file_list, file_type, plate_table_name="mp_plates", destination_table="compound_mp",
                      source_table="compound_main", clm_id="compound_id"):
         """
         Reads a CSV file, Adds the data to "compound_mp" Table. Update the volume of "compound_main" table
         Adds the plates to "mp_plates" with locations.
+        Compound_ids for duplicates that was not added to "compound_main", are changed to the compound with the same
+        structure. The changes are listed in the report under "aliases".
 
         :param file_list: list of files that contains csv_files with the data that needs to be added.
         :type file_list: list
@@ -511,22 +717,44 @@ class AddData:
         :type source_table: str
         :param clm_id: The name of the compound-ID coloumn, should always be "compound_id"
         :type clm_id: str
-        :return: Adds MotherPlates to the database and updated the main database with new volumes
+        :return: A report over what have been added, and what could not be added.
+            Adds MotherPlates to the database and updated the main database with new volumes
+        :rtype: dict
         """
+        report = {}
         for csv_file in file_list:
             data_dict, plates_dict = self.csv_r.csv_r_controller(csv_file, file_type)
-            for plate in plates_dict:
-                self.dbf.add_records_controller(plate_table_name, plates_dict[plate])
+            self._add_to_report(report, plate_table_name,
+                                self.dbf.bulk_insert(plate_table_name, plates_dict.values()))
+
+            aliases = self.structures.resolve_aliases(data_dict[transferee]["compound_id"] for transferee in data_dict)
             for transferee in data_dict:
+                compound_id = data_dict[transferee]["compound_id"]
+                if compound_id in aliases:
+                    report.setdefault("aliases", []).append({"row": transferee, "compound_id": compound_id,
+                                                             "used": aliases[compound_id]})
+                    data_dict[transferee]["compound_id"] = aliases[compound_id]
+
+            transferees = list(data_dict)
+            transferee_rows = []
+            for transferee in transferees:
                 new_dict = self._popper(destination_table, data_dict[transferee])
-                new_dict = self._re_ordering_dict(new_dict, destination_table)
+                transferee_rows.append(self._re_ordering_dict(new_dict, destination_table))
+            table_report = self.dbf.bulk_insert(destination_table, transferee_rows)
+            self._add_to_report(report, destination_table, table_report)
+
+            # Only transferees that have been added takes volume from the source, so a file that is added again does
+            # not subtract the volume twice
+            failed = self.dbf.failed_rows(transferees, table_report)
+            transfers = {transferee: {clm_id: data_dict[transferee]["compound_id"],
+                                      "volume": data_dict[transferee]["Volume"]}
+                         for transferee in transferees if transferee not in failed}
+            self.dbf.update_volumes(source_table, transfers, [clm_id])
 
-                self.dbf.add_records_controller(destination_table, new_dict)
-                self.dbf.update_vol(source_table, data_dict[transferee]["Volume"],
-                                    data_dict[transferee]["compound_id"], clm_id)
+        return report
 
     def daughter_plate(self, file_list, plate_table_name="dp_plates",
-                       destination_table="compound_dp", source_table="compound_mp", clm_id="rowid"):
+                       destination_table="compound_dp", source_table="compound_mp", clm_id="compound_id"):
         """
         Locates all files in a folder with data from the Echo.
         Adds the data to "compound_dp" Table.
@@ -541,37 +769,54 @@ class AddData:
         :type destination_table: str
         :param source_table: Where the compounds are coming from, should always be "compound_mp".
         :type source_table: str
-        :param clm_id: Header for clm where row_id is located for updating the right value.
+        :param clm_id: Header for the compound-ID clm in the source table
         :type clm_id: str
-        :return: Added data to the database and updates volumes.
+        :return: A report over what have been added, and what could not be added.
+            Added data to the database and updates volumes.
+        :rtype: dict
         """
-
+        report = {}
         data_dict, plates_dict = self.xml_r.xml_controller(file_list)
 
-        for plate in plates_dict:
-            self.dbf.add_records_controller(plate_table_name, plates_dict[plate])
+        self._add_to_report(report, plate_table_name, self.dbf.bulk_insert(plate_table_name, plates_dict.values()))
 
-        # Find compound_ID based on source_plate_barcode and source_well from source_table. and add it to the data_dict
-        for transferee in data_dict:
-            row_data = self.dbf.find_data(source_table, data_dict[transferee]["SourceBarcode"],
-                                          data_dict[transferee]["SourceWell"], "mp_barcode", "mp_well")
-            data_dict[transferee]["compoundID"] = row_data[0][1]
+        # The source of each transferee is the well in the MotherPlate, so the same compound can be in the same
+        # MotherPlate multiple times, and the same well can be used multiple times in the same run.
+        key_columns = ["mp_barcode", "mp_well"]
+        transfers = {transferee: {"mp_barcode": data_dict[transferee]["SourceBarcode"],
+                                  "mp_well": data_dict[transferee]["SourceWell"],
+                                  "volume": data_dict[transferee]["Volume"]} for transferee in data_dict}
 
-            # re-arrange the order to make it fit to the database setup
-            new_dict = self._re_ordering_dict(data_dict[transferee], destination_table)
+        with self.dbf.transaction():
+            self.dbf.load_volume_ledger(transfers, key_columns)
+
+            # Find compound_ID for all transferees based on source_plate_barcode and source_well from source_table.
+            compound_ids = self.dbf.resolve_volume_ledger(source_table, key_columns, clm_id)
+            transferees = []
+            transferee_rows = []
+            for transferee in data_dict:
+                try:
+                    data_dict[transferee]["compound_id"] = compound_ids[transferee]
+                except KeyError:
+                    report.setdefault(destination_table, {"added": 0, "errors": []})
+                    report[destination_table]["errors"].append(
+                        {"row": transferee, "data": data_dict[transferee], "error": "Source well not in the database"})
+                    continue
+
+                # re-arrange the order to make it fit to the database setup
+                transferees.append(transferee)
+                transferee_rows.append(self._re_ordering_dict(data_dict[transferee], destination_table))
 
             # Adding data to the database
-            self.dbf.add_records_controller(destination_table, new_dict)
+            table_report = self.dbf.bulk_insert(destination_table, transferee_rows)
+            self._add_to_report(report, destination_table, table_report)
 
-            # Finding row_id for making sure that it is the right data that gets updated...
-            # This will fail with multiple copies of the same compounds in the same MotherPlate... ARG!!!!!
-            row = self.dbf.find_data(source_table, data_dict[transferee]["SourceBarcode"],
-                                     data_dict[transferee]["compoundID"], "mp_barcode", "compound_id")
-            row_id = row[0][0]
+            # Update the volume for all transferees in one go. Transferees that could not be added are taken out of
+            # the ledger first, so a file that is added again does not subtract the volume twice
+            self.dbf.remove_from_volume_ledger(self.dbf.failed_rows(transferees, table_report))
+            self.dbf.apply_volume_ledger(source_table, key_columns)
 
-            # Update the volume based on row_id.
-            self.dbf.update_vol(source_table, data_dict[transferee]["Volume"],
-                                row_id, clm_id)
+        return report
 
     def purity_data(self, file_list, responsible="PHCH", exp_type="purity", experiment_tabel="experiment",
                     destination_table="purity"):
@@ -590,25 +835,29 @@ class AddData:
         :type experiment_tabel: str
         :param destination_table: The table where the data goes, should always be purity
         :type destination_table: str
-        :return: Adds purity data to the database
+        :return: A report over what have been added, and what could not be added.
+            Adds purity data to the database
+        :rtype: dict
         """
+        report = {}
         for compound_data in file_list:
-            # Get numbers of rows from the experiment database.
-            exp_count = self.dbf.number_of_rows(experiment_tabel)
             # Get a dict for the experiment, to make it fit into the table layout for the experimental table.
-            experiment_dict, exp_count = self._exp_dict_creator(compound_data, exp_count, exp_type, responsible)
-            # add data to the experimental table.
-            self.dbf.add_records_controller(experiment_tabel, experiment_dict)
+            experiment_dict = self._exp_dict_creator(compound_data, exp_type, responsible)
+            # add data to the experimental table, the database gives the experiment its id.
+            exp_id = self.dbf.add_records_controller(experiment_tabel, experiment_dict)
             # unpack the purity data to single values, and add the last columns for the data to fit with the table
-            compound_data = self._purity_unpacker(compound_data, exp_count)
+            compound_data = self._purity_unpacker(compound_data, exp_id)
             # loop over each compound, removed unnecessary keys, re-order the dict to fit with the table
             # add data to the table
+            purity_rows = []
             for compound in compound_data:
                 new_dict = self._popper(destination_table, compound_data[compound])
-                new_dict = self._re_ordering_dict(new_dict, destination_table)
-                self.dbf.add_records_controller(destination_table, new_dict)
+                purity_rows.append(self._re_ordering_dict(new_dict, destination_table))
+            self._add_to_report(report, destination_table, self.dbf.bulk_insert(destination_table, purity_rows))
         move_files(file_list)
 
+        return report
+
     def auto_controller(self, folder, file_type):
         """
         HAVE NOT BEEN TESTED!!! IS NOT WORKING!!!!!!
@@ -618,25 +867,30 @@ class AddData:
         :type folder: str
         :param file_type:
         :type file_type: str
-        :return: Updates the database with data and moves files out of pending folder! ?
+        :return: A report over what have been added, and what could not be added.
+            Updates the database with data and moves files out of pending folder! ?
+        :rtype: dict
         """
         compound_list, mp_list, dp_list, purity_list, bio_list, full_file_list = file_list_distributor(folder)
         lc_h = LCMSHandler()
+        report = {}
         if compound_list:
-            self.compound_main(compound_list)
+            self._merge_reports(report, self.compound_main(compound_list))
         if mp_list:
-            self.mother_plate(mp_list, file_type)
+            self._merge_reports(report, self.mother_plate(mp_list, file_type))
         if dp_list:
-            self.daughter_plate(dp_list)
+            self._merge_reports(report, self.daughter_plate(dp_list))
         if purity_list:
             # using default values!!
             compound_info = lc_h.lc_controller(purity_list, False, 254, "all", 2500, 2.5, 0.25, "pos", 50000000)
-            self.purity_data(compound_info)
+            self._merge_reports(report, self.purity_data(compound_info))
         if bio_list:
             pass
         move_files(full_file_list)
 
-    def add_controller(self, table, data, file_type=None):
+        return report
+
+    def add_controller(self, table, data, file_type=None, progress=None):
         """
         Main access point to adding data to the Database.
 
@@ -646,28 +900,36 @@ class AddData:
         :type data: str
         :param file_type: What kind of file it is
         :type file_type: str
-        :return: Update the database with new values
+        :param progress: Progress callback for compound imports, see compound_main
+        :type progress: function or None
+        :return: A report over what have been added, and what could not be added, per table.
+            Update the database with new values
+        :rtype: dict
         """
         table_list = ["lc_experiment", "bio_experiment", "lc_raw"]
-        if table == "auto":
-            self.auto_controller(data, file_type)
-        elif table == "purity_data":
-            self.purity_data(data)
-        elif table in table_list:
-            self.dbf.add_records_controller(table, data)
+        report = {}
+        with self.dbf, self.dbf.bulk_load():
+            if table == "auto":
+                report = self.auto_controller(data, file_type)
+            elif table == "purity_data":
+                report = self.purity_data(data)
+            elif table in table_list:
+                self.dbf.add_records_controller(table, data)
 
-        else:
-            file_list = get_file_list(data)
-
-            if table == "compound_main":
-                self.compound_main(file_list)
-            elif table == "compound_mp":
-                self.mother_plate(file_list, file_type)
-            elif table == "compound_dp":
-                self.daughter_plate(file_list)
-            elif table == "location_table":
-                pass
-            move_files(file_list)
+            else:
+                file_list = get_file_list(data)
+
+                if table == "compound_main":
+                    report = self.compound_main(file_list, progress=progress)
+                elif table == "compound_mp":
+                    report = self.mother_plate(file_list, file_type)
+                elif table == "compound_dp":
+                    report = self.daughter_plate(file_list)
+                elif table == "location_table":
+                    pass
+                move_files(file_list)
+
+        return report
 
 
 
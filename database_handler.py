@@ -1,4 +1,116 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import count, islice
+
+from query_builder import QueryBuilder
+from table_statistics import TableStatistics
+
+
+class ConnectionManager:
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def __str__(self):
+        """
+        Keeps one warm connection per database per thread, so all the classes working on the same database shares it,
+        instead of opening a new connection for every call.
+        """
+
+    def _thread_connections(self):
+        """
+        Gets the connections for the current thread
+
+        :return: A dict with database as key and the connection as value
+        :rtype: dict
+        """
+        try:
+            return self._local.connections
+        except AttributeError:
+            self._local.connections = {}
+            return self._local.connections
+
+    @staticmethod
+    def _open(database, settings):
+        """
+        Opens a new connection to the database, and sets it up
+
+        :param database: Path to the database
+        :type database: str
+        :param settings: Settings for the connection, see DataBaseFunctions.connection_settings
+        :type settings: dict
+        :return: A connection to the database
+        :rtype: sqlite3.Connection
+        """
+        conn = sqlite3.connect(database, timeout=settings["busy_timeout"] / 1000,
+                               cached_statements=settings["cached_statements"])
+        conn.execute("PRAGMA foreign_keys = 1")
+        for pragma, value in settings["pragmas"].items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def get(self, database, settings):
+        """
+        Gets the connection for the database in the current thread. Opens one if there is none
+
+        :param database: Path to the database
+        :type database: str
+        :param settings: Settings for the connection, only used if a new connection is opened
+        :type settings: dict
+        :return: A connection to the database
+        :rtype: sqlite3.Connection
+        """
+        connections = self._thread_connections()
+        try:
+            return connections[database]
+        except KeyError:
+            conn = self._open(database, settings)
+            connections[database] = conn
+            with self._lock:
+                self._connections.append(conn)
+            return conn
+
+    def is_open(self, database):
+        """
+        Checks if the current thread have an open connection to the database
+
+        :param database: Path to the database
+        :type database: str
+        :return: True if there is an open connection
+        :rtype: bool
+        """
+        return database in self._thread_connections()
+
+    def close(self, database):
+        """
+        Commits and closes the connection to the database for the current thread
+
+        :param database: Path to the database
+        :type database: str
+        :return: The connection is closed
+        """
+        conn = self._thread_connections().pop(database, None)
+        if conn is not None:
+            with self._lock:
+                self._connections.remove(conn)
+            conn.commit()
+            conn.close()
+
+    def close_all(self):
+        """
+        Closes all connections for the current thread. Connections from other threads needs to be closed in their own
+        thread, as sqlite3 do not allow using a connection across threads.
+
+        :return: All connections for the thread are closed
+        """
+        for database in list(self._thread_connections()):
+            self.close(database)
+
+
+connection_manager = ConnectionManager()
+_savepoint_counter = count()
 
 
 class DataBaseFunctions:
@@ -6,10 +118,58 @@ class DataBaseFunctions:
         self.conn = None
         self.cursor = None
         self.database = config["Database"]["database"]
+        self.chunk_size = config["Database"].getint("bulk_chunk_size", fallback=1000)
+        self.fetch_batch_size = config["Database"].getint("fetch_batch_size", fallback=500)
+        self.connection_settings = self._connection_settings(config)
+        self.query_builder = QueryBuilder(self, config["Database"].getint("in_list_limit", fallback=100))
+        self._session_owners = []
+        self.statistics = TableStatistics(self)
 
     def __str__(self):
         """Control all database function, as sqlite3 is terrible for writing to and from"""
 
+    @staticmethod
+    def _connection_settings(config):
+        """
+        Gets the performance profile for the connection from the config file.
+        WAL journal mode lets searches keep reading while an import is writing to the database.
+
+        :param config: The config handler, with all the default information in the config file.
+        :type config: configparser.ConfigParser
+        :return: The settings for the connection
+        :rtype: dict
+        """
+        db_config = config["Database"]
+        return {
+            "cached_statements": db_config.getint("statement_cache_size", fallback=256),
+            "busy_timeout": db_config.getint("busy_timeout", fallback=5000),
+            "bulk_synchronous": db_config.get("bulk_synchronous", fallback="NORMAL"),
+            "pragmas": {
+                "journal_mode": db_config.get("journal_mode", fallback="WAL"),
+                "synchronous": db_config.get("synchronous", fallback="FULL"),
+                "cache_size": db_config.getint("cache_size", fallback=-65536),
+                "mmap_size": db_config.getint("mmap_size", fallback=268435456),
+                "temp_store": db_config.get("temp_store", fallback="MEMORY"),
+            }
+        }
+
+    def __enter__(self):
+        """
+        Starts a session on the database. All calls inside the session reuses the same connection.
+        If the session opened the connection, it will be closed again when the session ends.
+        """
+        self._session_owners.append(not connection_manager.is_open(self.database))
+        self.create_connection()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        if self._session_owners.pop():
+            self.close_connection()
+
     @staticmethod
     def _list_columns(data):
         """
@@ -70,7 +230,8 @@ class DataBaseFunctions:
         :type layout: str
         :param data: List of values that needs to be added
         :type data: list
-        :return: Data added to a table
+        :return: The rowid of the new row
+        :rtype: int
         """
         # try:
         self.cursor.execute(layout, data)
@@ -79,7 +240,9 @@ class DataBaseFunctions:
             #print("ERROR") # NEEDS TO WRITE REPORT OVER ERRORS TO SEE WHY DATA WAS NOT ADDED!!!
             # EITHER DUE TO DUPLICATES OR MISSING REFERENCE(FOREIGN KEY)
         self.conn.commit()
+        row_id = self.cursor.lastrowid
         self.cursor.close()
+        return row_id
 
     def add_records_controller(self, table_name, data):
         """
@@ -87,16 +250,162 @@ class DataBaseFunctions:
 
         :param table_name: Name of the table where the data needs to be added
         :type table_name: str
-        :param data: The data, in dicts form, that needs to be added to the database
+        :param data: The data, in dicts form, that needs to be added to the database. Set the id to None, to get a
+            new id from the database.
         :type data: dict
-        :return: Data added to the database
+        :return: The rowid of the new row. For tables with an INTEGER PRIMARY KEY, this is the id
+        :rtype: int
         """
         self.create_connection()
         list_columns = self._list_columns(data)
         place_holder = self._add_place_holders(list_columns)
         layout = self._add_layout(table_name, place_holder)
         data_layout = self._data_layout(data, list_columns)
-        self._add_data_to_table(layout, data_layout)
+        self.statistics.invalidate(table_name)
+        return self._add_data_to_table(layout, data_layout)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs everything inside the with-block as one transaction. If anything fails, all of it is rolled back.
+        Can be nested, the inner blocks becomes savepoints in the outer transaction.
+        Nothing inside the block should commit, as that would end the transaction.
+
+        :return: The connection to use inside the transaction
+        :rtype: sqlite3.Connection
+        """
+        self.create_connection()
+        conn = self.conn
+        outer = not conn.in_transaction
+        savepoint = f"dbf_savepoint_{next(_savepoint_counter)}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield conn
+        except BaseException:
+            # Statistics read inside the transaction can be for rows that are rolled back
+            self.statistics.invalidate()
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            conn.execute(f"RELEASE {savepoint}")
+            if outer and conn.in_transaction:
+                conn.commit()
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        Runs everything inside the with-block with the synchronous setting for bulk loads (bulk_synchronous in the
+        config file). It is set back to the normal setting after.
+        SQLite can not change the setting inside a transaction, so if a transaction is already open, the block runs
+        with the normal setting. A transaction opened inside the block is committed when the block ends, or rolled
+        back if it fails, before the setting is changed back.
+
+        :return: The connection to use for the bulk load
+        :rtype: sqlite3.Connection
+        """
+        self.create_connection()
+        conn = self.conn
+        changed = not conn.in_transaction
+        if changed:
+            conn.execute(f"PRAGMA synchronous = {self.connection_settings['bulk_synchronous']}")
+        try:
+            yield conn
+        except BaseException:
+            if changed and conn.in_transaction:
+                self.statistics.invalidate()
+                conn.rollback()
+            raise
+        else:
+            if changed and conn.in_transaction:
+                conn.commit()
+        finally:
+            if changed and not conn.in_transaction:
+                conn.execute(f"PRAGMA synchronous = {self.connection_settings['pragmas']['synchronous']}")
+
+    @staticmethod
+    def _chunks(rows, chunk_size):
+        """
+        Splits rows into chunks
+
+        :param rows: The rows that needs to be split
+        :type rows: iter
+        :param chunk_size: Max amount of rows per chunk
+        :type chunk_size: int
+        :return: The row number of the first row in the chunk, and the chunk
+        :rtype: (int, list)
+        """
+        rows = iter(rows)
+        row_number = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield row_number, chunk
+            row_number += len(chunk)
+
+    def _insert_single_rows(self, layout, chunk, data, row_number, report):
+        """
+        Adds the rows from a chunk one at the time, to find the rows that can not be added.
+
+        :param layout: String with table name, and "?" for each value that needs to be added
+        :type layout: str
+        :param chunk: The rows in dict form
+        :type chunk: list
+        :param data: The rows as lists of values, in the same order as chunk
+        :type data: list
+        :param row_number: The row number of the first row in the chunk
+        :type row_number: int
+        :param report: The report over added rows and errors
+        :type report: dict
+        :return: The rows that can be added are added, and the rest are added to the report
+        """
+        cursor = self.conn.cursor()
+        for index, values in enumerate(data):
+            try:
+                cursor.execute(layout, values)
+            except sqlite3.IntegrityError as error:
+                # EITHER DUE TO DUPLICATES OR MISSING REFERENCE(FOREIGN KEY)
+                report["errors"].append({"row": row_number + index, "data": chunk[index], "error": str(error)})
+            else:
+                report["added"] += 1
+        cursor.close()
+
+    def bulk_insert(self, table_name, rows, chunk_size=None):
+        """
+        Adds many rows to a table in one transaction. The rows are added in chunks with executemany.
+        If a chunk fails on a row, that chunk is added one row at the time, and the failing rows are reported.
+        All rows needs to have the same keys, in the same order as the table.
+        Any other error than an IntegrityError, will roll back all rows.
+
+        :param table_name: Name of the table where the data needs to be added
+        :type table_name: str
+        :param rows: The data, as dicts, that needs to be added
+        :type rows: iter
+        :param chunk_size: Amount of rows per executemany. Defaults to bulk_chunk_size from the config
+        :type chunk_size: int or None
+        :return: A report with amount of rows added, and a list of rows that failed and why
+        :rtype: dict
+        """
+        chunk_size = chunk_size or self.chunk_size
+        report = {"added": 0, "errors": []}
+        layout = None
+        self.statistics.invalidate(table_name)
+        with self.transaction():
+            for row_number, chunk in self._chunks(rows, chunk_size):
+                if layout is None:
+                    list_columns = self._list_columns(chunk[0])
+                    layout = self._add_layout(table_name, self._add_place_holders(list_columns))
+                data = [self._data_layout(row, list_columns) for row in chunk]
+                try:
+                    with self.transaction():
+                        self.conn.executemany(layout, data)
+                except sqlite3.IntegrityError:
+                    self._insert_single_rows(layout, chunk, data, row_number, report)
+                else:
+                    report["added"] += len(chunk)
+
+        return report
 
     def update_vol(self, source_table, vol, barcode_source, row_id):
         """
@@ -112,8 +421,119 @@ class DataBaseFunctions:
         :type row_id: str
         :return: An updated database
         """
-        table = f"UPDATE {source_table} SET volume = volume - {vol} WHERE {row_id} = {barcode_source} "
-        self.submit_update(table)
+        table = f"UPDATE {source_table} SET volume = volume - ? WHERE {row_id} = ?"
+        self.submit_update(table, [vol, barcode_source])
+
+    def load_volume_ledger(self, transfers, key_columns):
+        """
+        Loads a run of transferees into the temp table "volume_ledger", so they can be handled in one go,
+        instead of one transferee at the time.
+        The ledger lives on the connection, and is replaced every time a new run is loaded.
+
+        :param transfers: The transferees. Key is the name of the transferee, value is a dict with a value for each
+            key_column and the "volume" that have been taken.
+        :type transfers: dict
+        :param key_columns: The columns in the source table that finds the source of the transferee.
+            ex: ["mp_barcode", "mp_well"]
+        :type key_columns: list
+        :return: The temp table "volume_ledger" with all the transferees
+        """
+        columns = ", ".join(key_columns)
+        place_holders = self._add_place_holders(key_columns + ["transfer", "volume"])
+        data = [[transfers[transfer][clm] for clm in key_columns] + [transfer, transfers[transfer]["volume"]]
+                for transfer in transfers]
+
+        self.create_connection()
+        self.conn.execute("DROP TABLE IF EXISTS temp.volume_ledger")
+        self.conn.execute(f"CREATE TEMP TABLE volume_ledger ({columns}, transfer TEXT, volume REAL)")
+        self.conn.executemany(f"INSERT INTO temp.volume_ledger ({columns}, transfer, volume) VALUES({place_holders})",
+                              data)
+
+    def resolve_volume_ledger(self, source_table, key_columns, target_column):
+        """
+        Finds a value from the source row of each transferee in the ledger, with one join.
+
+        :param source_table: The table the transferees are coming from
+        :type source_table: str
+        :param key_columns: The columns used to find the source row, same as for load_volume_ledger
+        :type key_columns: list
+        :param target_column: The column in the source table with the value that is needed, ex: "compound_id"
+        :type target_column: str
+        :return: A dict with the name of the transferee as key, and the value from the source row.
+            Transferees without a source row are not in the dict
+        :rtype: dict
+        """
+        join_on = " AND ".join(f"source.{clm} = ledger.{clm}" for clm in key_columns)
+        find = f"SELECT ledger.transfer, source.{target_column} FROM temp.volume_ledger AS ledger " \
+               f"JOIN {source_table} AS source ON {join_on}"
+        return {transfer: value for transfer, value in self.fetch(find)}
+
+    def remove_from_volume_ledger(self, transfers):
+        """
+        Removes transferees from the ledger, so their volume is not subtracted. Used for transferees that could not be
+        added to the destination table.
+
+        :param transfers: The names of the transferees
+        :type transfers: iter
+        :return: The transferees are removed from the temp table "volume_ledger"
+        """
+        self.create_connection()
+        self.conn.executemany("DELETE FROM temp.volume_ledger WHERE transfer = ?",
+                              [[transfer] for transfer in transfers])
+
+    def apply_volume_ledger(self, source_table, key_columns):
+        """
+        Subtract the volume of all transferees in the ledger from the source table, with one update.
+        Transferees from the same source are summed first, so multiple transferees from the same well in one run are
+        all subtracted.
+        Does not commit, so it can be part of a transaction.
+
+        :param source_table: The table the transferees are coming from
+        :type source_table: str
+        :param key_columns: The columns used to find the source row, same as for load_volume_ledger
+        :type key_columns: list
+        :return: Amount of rows in the source table that have been updated
+        :rtype: int
+        """
+        self.statistics.invalidate(source_table)
+        columns = ", ".join(key_columns)
+        where = " AND ".join(f"{source_table}.{clm} = ledger.{clm}" for clm in key_columns)
+        update = f"UPDATE {source_table} SET volume = {source_table}.volume - ledger.volume " \
+                 f"FROM (SELECT {columns}, SUM(volume) AS volume FROM temp.volume_ledger GROUP BY {columns}) " \
+                 f"AS ledger WHERE {where}"
+        self.create_connection()
+        return self.conn.execute(update).rowcount
+
+    def update_volumes(self, source_table, transfers, key_columns):
+        """
+        Updates volumes in the database for a whole run of transferees, in one transaction
+
+        :param source_table: Where the compounds came from
+        :type source_table: str
+        :param transfers: The transferees, see load_volume_ledger
+        :type transfers: dict
+        :param key_columns: The columns in the source table that finds the source of the transferee
+        :type key_columns: list
+        :return: Amount of rows in the source table that have been updated
+        :rtype: int
+        """
+        with self.transaction():
+            self.load_volume_ledger(transfers, key_columns)
+            return self.apply_volume_ledger(source_table, key_columns)
+
+    @staticmethod
+    def failed_rows(names, report):
+        """
+        Finds the rows that bulk_insert could not add
+
+        :param names: The name for each row, in the same order as the rows given to bulk_insert
+        :type names: list
+        :param report: The report from bulk_insert
+        :type report: dict
+        :return: The names of the rows that failed
+        :rtype: set
+        """
+        return {names[error["row"]] for error in report["errors"]}
 
     def find_data(self, table, barcode, id_number, barcode_name, id_name):
         """
@@ -132,8 +552,8 @@ class DataBaseFunctions:
         :return: Data from the database
         :rtype: dict
         """
-        find = f"SELECT rowid, * FROM '{table}' WHERE {barcode_name} = '{barcode}' AND {id_name} = '{id_number}'"
-        return self.fetch(find)
+        find = f"SELECT rowid, * FROM '{table}' WHERE {barcode_name} = ? AND {id_name} = ?"
+        return self.fetch(find, [barcode, id_number])
 
     def find_plates(self, table, barcode, barcode_name):
         """
@@ -148,9 +568,9 @@ class DataBaseFunctions:
         :return: Data from the database
         :rtype: dict
         """
-        find = f"SELECT rowid, * FROM '{table}' WHERE {barcode_name} = '{barcode}' "
+        find = f"SELECT rowid, * FROM '{table}' WHERE {barcode_name} = ?"
 
-        return self.fetch(find)
+        return self.fetch(find, [barcode])
 
     def delete_records(self):
         pass
@@ -195,32 +615,37 @@ class DataBaseFunctions:
     #     table = self.generate_table_layout(table_name, columns)
     #     self.submit_update(table)
 
-    def fetch(self, data):
+    def fetch(self, data, params=()):
         """
         Create a connection to the database, execute the search and gets data out of  the database
 
         :param data: The data the user is looking for
         :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: list or tuple
         :return: all records that fits the data
         :rtype: dict
         """
         self.create_connection()
-        self.cursor.execute(data)
+        self.cursor.execute(data, params)
         records = self.cursor.fetchall()
         self.cursor.close()
         return records
 
-    def submit_update(self, data):
+    def submit_update(self, data, params=()):
         """
         Connect to the database, Updates the database and closes the connection
 
         :param data: Data that needs  to be updated
         :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: list or tuple
         :return: commits updates to the database
         """
+        self.statistics.invalidate()
         self.create_connection()
         try:
-            self.cursor.execute(data)
+            self.cursor.execute(data, params)
         except sqlite3.IntegrityError:
             pass
         self.conn.commit()
@@ -228,16 +653,26 @@ class DataBaseFunctions:
 
     def create_connection(self):
         """
-        Create a connection to the database
+        Gets the shared connection to the database, and a new cursor for it.
+        The connection is only opened the first time, after that the same connection is reused
 
         :return: A connection to the database
         :
         """
-        self.conn = sqlite3.connect(self.database)
-        self.conn.execute("PRAGMA foreign_keys = 1")
+        self.conn = connection_manager.get(self.database, self.connection_settings)
         self.cursor = self.conn.cursor()
         # return self.conn
 
+    def close_connection(self):
+        """
+        Closes the shared connection to the database for this thread
+
+        :return: The connection is closed
+        """
+        connection_manager.close(self.database)
+        self.conn = None
+        self.cursor = None
+
     def list_of_all_tables(self):
         """
         Gets a list of all the tables in the database
@@ -257,10 +692,7 @@ class DataBaseFunctions:
         :return: number of rows in table.
         :rtype: int
         """
-        number = f"SELECT COUNT(*) from {table}"
-        self.create_connection()
-        self.cursor.execute(number)
-        return self.cursor.fetchone()[0]
+        return self.statistics.count(table)
 
     def join_table_controller_old(self, search_limiter, table_1="compound_main", table_2="compound_mp",
                               shared_data="compound_id"):
@@ -289,74 +721,30 @@ class DataBaseFunctions:
         """
         Joins two tables together to create a new temp table
 
-        :param min_volume: Minimum volume needed for a compound
-        :type min_volume: int
-        :param table_1: Table 1 of 2 for joining together
-        :type table_1: str
-        :param table_2: Table 2 of 2 for joining together
-        :type table_2: str
-        :param shared_data: The data they share
-        :type shared_data: str
+        :param search_limiter: A dict with the two tables as keys, with a search_limiter for each, and "shared_data"
+            for the column the two tables shares
+        :type search_limiter: dict
         :return: Rows of data where the two tables matches.
         :rtype: dict
         """
-        selector_1 = ""
-        selector_2 = ""
-        binder = ""
-        for index, values in enumerate(search_limiter):
-            if index == 0:
-                table_1 = values
-                selector_1 = self._where_clause_writer(search_limiter[values], values)
-            if index == 1:
-                table_2 = values
-                selector_2 = self._where_clause_writer(search_limiter[values], values)
-            shared_data = search_limiter["shared_data"]
+        sql_join, params = self.query_builder.join(search_limiter)
+        return self._search_rows(sql_join, params)
 
-        if selector_1 and selector_2:
-            binder = "AND"
-
-
-        sql_join = f"SELECT * FROM {table_1} JOIN {table_2} ON {table_1}.{shared_data} = {table_2}.{shared_data} " \
-                   f"{selector_1} {binder} {selector_2}"
-
-        print(sql_join)
-        return self._row_creator(sql_join)
-
-    @staticmethod
-    def _where_clause_writer(search_limiter, join_table=None):
-
-        if join_table:
-            table = f"{join_table}."
-        else:
-            table = ""
-
-        if search_limiter:
-            final_text = "WHERE"
-            for conditions in search_limiter:
-                if search_limiter[conditions]["use"]:
-                    if search_limiter[conditions]["value"]:
-                        if search_limiter[conditions]['operator'] == "IN":
-                            target_string = "("
-                            for values in search_limiter[conditions]['value']:
-                                target_string += f"'{values}'"
-                                target_string += ","
-                            target_string = target_string.removesuffix(",")
-                            target_string += ")"
-
-                            final_text += f" {table}{search_limiter[conditions]['target_column']} {search_limiter[conditions]['operator']} " \
-                                          f"{target_string}"
-                        else:
-                            final_text += f" '{search_limiter[conditions]['value']}' {search_limiter[conditions]['operator']} " \
-                                          f"{search_limiter[conditions]['target_column']}"
-                        final_text += f" AND"
-
-            final_text = final_text.removesuffix(" AND")
-            final_text = final_text.removesuffix("WHERE")
-
-        else:
-            final_text = ""
+    def _search_rows(self, data, params):
+        """
+        Gets the rows for a search from the query builder, and removes the temp tables used for the search
 
-        return final_text
+        :param data: The search
+        :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: list
+        :return: Rows of data from the database
+        :rtype: dict
+        """
+        try:
+            return self._row_creator(data, params)
+        finally:
+            self.query_builder.drop_temp_tables()
 
     def return_table_data(self, table, search_limiter):
         """
@@ -370,9 +758,8 @@ class DataBaseFunctions:
         :rtype: dict
         """
 
-        selector = self._where_clause_writer(search_limiter)
-        temp_table = f"SELECT * FROM {table} {selector}"
-        return self._row_creator(temp_table)
+        temp_table, params = self.query_builder.select(table, search_limiter)
+        return self._search_rows(temp_table, params)
 
     def records_to_rows(self, table, data, clm_header):
         """
@@ -387,21 +774,115 @@ class DataBaseFunctions:
         :return: the row for the data
         :rtype: dict
         """
-        temp_table = f"SELECT * FROM {table} WHERE {clm_header} = {data}"
-        return self._row_creator(temp_table)
+        temp_table = f"SELECT * FROM {table} WHERE {clm_header} = ?"
+        return self._row_creator(temp_table, [data])
+
+    def table_columns(self, table):
+        """
+        Gets the names of the columns in a table
+
+        :param table: Table name
+        :type table: str
+        :return: List of the column names, in the same order as the table
+        :rtype: list
+        """
+        return [clm[1] for clm in self.fetch(f"PRAGMA table_info({table})")]
+
+    def iter_rows(self, data, params=(), batch_size=None):
+        """
+        Gets data from the database one row at the time. The rows are fetched from the database in batches, so only
+        one batch is in memory at the time, no matter how many rows the search finds.
+
+        :param data: The search
+        :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: list or tuple
+        :param batch_size: Amount of rows fetched at the time. Defaults to fetch_batch_size from the config
+        :type batch_size: int or None
+        :return: The rows. Values can be found by index or by column name
+        :rtype: sqlite3.Row
+        """
+        self.create_connection()
+        cursor = self.conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        try:
+            cursor.execute(data, params)
+            while True:
+                records = cursor.fetchmany(batch_size or self.fetch_batch_size)
+                if not records:
+                    break
+                for record in records:
+                    yield record
+        finally:
+            cursor.close()
+
+    def _stream_search(self, data, params):
+        """
+        Streams the rows for a search from the query builder, and removes the temp tables used for the search, when
+        all rows have been read.
+
+        :param data: The search
+        :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: list
+        :return: The rows
+        :rtype: sqlite3.Row
+        """
+        records = self.iter_rows(data, params)
+        try:
+            for record in records:
+                yield record
+        finally:
+            # The cursor needs to be closed before the temp tables it reads from can be dropped
+            records.close()
+            self.query_builder.drop_temp_tables()
+
+    def stream_table_data(self, table, search_limiter, columns=None):
+        """
+        Streams the rows from a table, that fits the search_limiter
+
+        :param table: Table the data needs  to be pulled from
+        :type table: str
+        :param search_limiter: A dict over values to search for in the db
+        :type search_limiter: dict or None
+        :param columns: The columns to get. Use this to leave out columns that are not needed, like "png".
+            All columns if None
+        :type columns: list or None
+        :return: The rows
+        :rtype: sqlite3.Row
+        """
+        temp_table, params = self.query_builder.select(table, search_limiter, columns)
+        return self._stream_search(temp_table, params)
+
+    def stream_join(self, search_limiter, columns=None):
+        """
+        Streams the rows from two tables joined together, see join_table_controller
+
+        :param search_limiter: A dict with the two tables as keys, with a search_limiter for each, and "shared_data"
+            for the column the two tables shares
+        :type search_limiter: dict
+        :param columns: The columns to get, with table names in front, ex: "compound_mp.volume". All columns if None
+        :type columns: list or None
+        :return: The rows
+        :rtype: sqlite3.Row
+        """
+        sql_join, params = self.query_builder.join(search_limiter, columns)
+        return self._stream_search(sql_join, params)
 
-    def _row_creator(self, data):
+    def _row_creator(self, data, params=()):
         """
         Gets data from the database based on criteria
 
         :param data: Data that needs to be found.
         :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: list or tuple
         :return: Rows of data from the database
         :rtype: dict
         """
         rows = {}
         self.create_connection()
-        self.cursor.execute(data)
+        self.cursor.execute(data, params)
         records = self.cursor.fetchall()
         headers = self.cursor.description
         for data in records:
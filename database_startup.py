@@ -1,9 +1,51 @@
 import configparser
+import threading
 
 import table_layouts
 from table_layouts import *
 from database_handler import DataBaseFunctions
 from config_writer import ConfigWriter
+from structure_index import StructureIndex
+from descriptor_store import descriptor_store_from_config
+
+
+def _fix_bio_experiment(conn):
+    """
+    The first layout for bio_experiment was missing commas, so raw_data and responsible was not made as columns.
+    Re-creates the table with the right columns, and moves the data over.
+
+    :param conn: Connection to the database
+    :type conn: sqlite3.Connection
+    :return: bio_experiment with all columns
+    """
+    columns = [clm[1] for clm in conn.execute("PRAGMA table_info(bio_experiment)")]
+    if not columns or "raw_data" in columns:
+        return
+
+    conn.execute("ALTER TABLE bio_experiment RENAME TO bio_experiment_old")
+    conn.execute(bio_experiment_table)
+    conn.execute("INSERT INTO bio_experiment (exp_id, assay_name, plate_layout, date) "
+                 "SELECT exp_id, assay_name, plate_layout, date FROM bio_experiment_old")
+    conn.execute("DROP TABLE bio_experiment_old")
+
+
+# Each migration is a version number, a description and a list of steps. A step is either a SQL string or a function
+# that takes the connection. New migrations needs to be added to the end, with a higher version number.
+# Migrations only changes the layout of the database. Data for new tables is added by DatabaseSetUp.backfill, as it can
+# take a long time on a large database.
+schema_migrations = [
+    (1, "Fix bio_experiment columns", [_fix_bio_experiment]),
+    (2, "Indexes for searches", [index_compound_main_ac, index_compound_mp_well, index_compound_mp_compound,
+                                 index_compound_dp_barcode, index_compound_dp_compound, index_mp_plates_date,
+                                 index_dp_plates_date, index_lc_experiment_date, index_lc_raw_batch, index_origin,
+                                 index_purity_compound, index_bio_experiment_date]),
+    (3, "Fingerprint store", [compound_fingerprint_table]),
+    (4, "Structure index for duplicates", [compound_structure_table]),
+    (5, "Descriptor table for range searches", [compound_descriptor_table, index_descriptor_mw, index_descriptor_clogp,
+                                                index_descriptor_hbd, index_descriptor_hba, index_descriptor_tpsa,
+                                                index_descriptor_rot_bonds]),
+    (6, "Aliases for duplicates that are not added", [compound_alias_table]),
+]
 
 
 class DatabaseSetUp:
@@ -42,7 +84,7 @@ class DatabaseSetUp:
         tables = []
 
         for index, method in enumerate(dir(table_layouts)):
-            if index > 7:
+            if index > 7 and eval(method).split()[1] == "TABLE":
                 temp_str = eval(method)
                 temp_str = temp_str.split(" ")
                 temp_str = temp_str[6].strip("\n").strip("(")
@@ -52,9 +94,90 @@ class DatabaseSetUp:
         self.cw.run(simple_setting_ditch, "simple_settings", True)
         return tables
 
+    @staticmethod
+    def _schema_version(dbf):
+        """
+        Gets the schema version of the database
+
+        :param dbf: The database functions for the database
+        :type dbf: DataBaseFunctions
+        :return: The version of the latest migration that have been applied to the database
+        :rtype: int
+        """
+        return dbf.fetch("PRAGMA user_version")[0][0]
+
+    def migrate(self, dbf=None):
+        """
+        Applies all migrations that the database is missing, in order. Each migration is applied in its own
+        transaction, together with the new schema version, so a failed migration leaves the database at the last
+        version that worked.
+
+        :param dbf: The database functions for the database. Makes a new one if None
+        :type dbf: DataBaseFunctions or None
+        :return: A list of the migrations that have been applied
+        :rtype: list
+        """
+        if dbf is None:
+            dbf = DataBaseFunctions(self.config)
+        applied = []
+        with dbf:
+            current_version = self._schema_version(dbf)
+            for version, description, steps in schema_migrations:
+                if version <= current_version:
+                    continue
+                with dbf.transaction() as conn:
+                    for step in steps:
+                        if callable(step):
+                            step(conn)
+                        else:
+                            conn.execute(step)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(description)
+
+        return applied
+
+    def backfill(self, dbf=None):
+        """
+        Adds the structures and descriptors for compounds that are missing them, ex: compounds that was in the
+        database before the tables was made. The descriptors are calculated with the amount of workers from the config
+        file.
+
+        :param dbf: The database functions for the database. Makes a new one if None
+        :type dbf: DataBaseFunctions or None
+        :return: A dict with the tables as keys, and the amount of rows added as values
+        :rtype: dict
+        """
+        if dbf is None:
+            dbf = DataBaseFunctions(self.config)
+        structures = StructureIndex(dbf, self.config["Tables"].get("compound_structure_table",
+                                                                   fallback="compound_structure"),
+                                    self.config["Tables"].get("compound_main", fallback="compound_main"))
+        descriptors = descriptor_store_from_config(dbf, self.config)
+        with dbf:
+            return {structures.table: structures.backfill(), descriptors.table: descriptors.backfill()}
+
+    def backfill_in_background(self, callback=None):
+        """
+        Runs backfill in a background thread, with its own connection to the database, so the GUI is not blocked
+        while it runs.
+
+        :param callback: Called with the report from backfill, when it is done
+        :type callback: function or None
+        :return: The thread
+        :rtype: threading.Thread
+        """
+        def _backfill():
+            report = self.backfill()
+            if callback is not None:
+                callback(report)
+
+        thread = threading.Thread(target=_backfill, daemon=True)
+        thread.start()
+        return thread
+
     def controller(self):
         """
-        Create all tables from table_layouts.py in the main database.
+        Create all tables from table_layouts.py in the main database, and migrate it to the newest version.
 
         :return: A Database with tables
         """
@@ -62,12 +185,10 @@ class DatabaseSetUp:
         tables = self._fetch_default_tables()
         dbf = DataBaseFunctions(self.config)
 
-        conn = dbf.create_connection()
-        if conn is not None:
+        with dbf:
             for table in tables:
                 dbf.submit_update(eval(table))
-        else:
-            print("Error! cannot create the database connection. - IN DATABASE STARTUP")
+            self.migrate(dbf)
 
 
 if __name__ == "__main__":
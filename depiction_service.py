@@ -0,0 +1,197 @@
+import configparser
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from chem_operators import ChemOperators
+
+
+class DepictionService:
+    """
+    :param folder: The folder for the saved pictures
+    :type folder: str
+    :param size: The default size of the pictures
+    :type size: (int, int)
+    :param memory_items: Max amount of pictures kept in memory
+    :type memory_items: int
+    """
+    def __init__(self, folder, size=(250, 100), memory_items=1024):
+        self.folder = folder
+        self.size = tuple(size)
+        self.memory_items = memory_items
+        self.co = ChemOperators()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._prewarm_generation = 0
+
+    def __str__(self):
+        """
+        Draws the compounds when they are shown, instead of saving a png for every compound in the database.
+        Pictures are kept in memory for the last used compounds, and saved in a folder with the hash of the smiles
+        code and size as the file name, so a compound is only drawn once, and the same compound in two rows shares the
+        picture.
+        """
+
+    def key(self, smiles, size=None):
+        """
+        Makes the key for a picture. The key is the same for the same smiles code and size
+
+        :param smiles: Smiles code for the compound
+        :type smiles: str
+        :param size: The size of the picture. The default size if None
+        :type size: (int, int) or None
+        :return: The key
+        :rtype: str
+        """
+        size = tuple(size or self.size)
+        return hashlib.sha256(f"{smiles}|{size[0]}x{size[1]}".encode()).hexdigest()
+
+    def _path(self, key):
+        """
+        Gets the file for a picture. The files are split into sub folders, to keep the folders small
+
+        :param key: The key for the picture
+        :type key: str
+        :return: The path to the file
+        :rtype: str
+        """
+        return os.path.join(self.folder, key[:2], f"{key}.png")
+
+    def _remember(self, key, png):
+        """
+        Adds a picture to the memory, and removes the least used pictures if there are too many
+
+        :param key: The key for the picture
+        :type key: str
+        :param png: The picture
+        :type png: bytes
+        :return: The picture is in memory
+        """
+        with self._lock:
+            self._memory[key] = png
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _save(self, key, png):
+        """
+        Saves a picture in the folder. The picture is written to a temp file first, so other threads never reads a
+        half written file
+
+        :param key: The key for the picture
+        :type key: str
+        :param png: The picture
+        :type png: bytes
+        :return: The picture is saved
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(file_handle, "wb") as f:
+                f.write(png)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def png(self, smiles, size=None):
+        """
+        Gets the picture for a compound, from memory, from the folder, or by drawing it
+
+        :param smiles: Smiles code for the compound
+        :type smiles: str
+        :param size: The size of the picture. The default size if None
+        :type size: (int, int) or None
+        :return: A png in string formate, or an empty string if the smiles code can not be read
+        :rtype: bytes or str
+        """
+        if not smiles:
+            return ""
+        key = self.key(smiles, size)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        try:
+            with open(self._path(key), "rb") as f:
+                png = f.read()
+        except OSError:
+            if self.co.get_mol(smiles) is None:
+                return ""
+            png = self.co.png_string(smiles, size or self.size)
+            self._save(key, png)
+
+        self._remember(key, png)
+        return png
+
+    def prewarm(self, compounds, size=None, callback=None):
+        """
+        Draws pictures in a background thread, so they are ready when they are shown.
+        Starting a new prewarm stops the one before it.
+
+        :param compounds: A dict with compound_id as keys and smiles codes as values, in the order they are shown
+        :type compounds: dict
+        :param size: The size of the pictures. The default size if None
+        :type size: (int, int) or None
+        :param callback: Called with the compound_id and the picture, each time a picture is ready
+        :type callback: function or None
+        :return: The thread
+        :rtype: threading.Thread
+        """
+        with self._lock:
+            self._prewarm_generation += 1
+            generation = self._prewarm_generation
+
+        def _prewarm():
+            for compound_id, smiles in compounds.items():
+                if self._prewarm_generation != generation:
+                    return
+                png = self.png(smiles, size)
+                if callback is not None and png:
+                    callback(compound_id, png)
+
+        thread = threading.Thread(target=_prewarm, daemon=True)
+        thread.start()
+        return thread
+
+    def cancel_prewarm(self):
+        """
+        Stops the prewarm that is running, after the picture it is drawing
+
+        :return: The prewarm is stopped
+        """
+        with self._lock:
+            self._prewarm_generation += 1
+
+
+def depiction_from_config(config):
+    """
+    Makes the depiction service from the settings in the config file
+
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :return: The depiction service
+    :rtype: DepictionService
+    """
+    folder = config.get("Depiction", "folder", fallback="")
+    if not folder:
+        folder = f"{config.get('Database', 'database', fallback='SCore.db')}.depictions"
+    size = (config.getint("Depiction", "size_x", fallback=250), config.getint("Depiction", "size_y", fallback=100))
+    return DepictionService(folder, size, config.getint("Depiction", "memory_items", fallback=1024))
+
+
+if __name__ == "__main__":
+    import time
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    ds = depiction_from_config(config)
+    smiles = "CC(=O)Oc1ccccc1C(=O)O"
+    for source in ["drawn", "memory"]:
+        start = time.perf_counter()
+        ds.png(smiles)
+        print(source, f"{(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,188 @@
+import configparser
+from concurrent.futures import ProcessPoolExecutor
+
+from rdkit import Chem
+from rdkit.Chem import Crippen, Descriptors, rdMolDescriptors
+
+
+# The descriptors in the descriptor table, with the name shown in the GUI. The order is the order of the columns
+descriptor_names = {
+    "mw": "MW",
+    "clogp": "cLogP",
+    "hbd": "HBD",
+    "hba": "HBA",
+    "tpsa": "TPSA",
+    "rot_bonds": "Rot. bonds",
+}
+
+
+def descriptors(mol):
+    """
+    Calculates the descriptors for a compound
+
+    :param mol: The compound
+    :type mol: Chem.Mol
+    :return: A dict with the descriptor names as keys and the values as values, in the same order as the columns
+        in the descriptor table. None if the compound is missing
+    :rtype: dict or None
+    """
+    if mol is None:
+        return None
+    return {"mw": Descriptors.MolWt(mol),
+            "clogp": Crippen.MolLogP(mol),
+            "hbd": rdMolDescriptors.CalcNumHBD(mol),
+            "hba": rdMolDescriptors.CalcNumHBA(mol),
+            "tpsa": rdMolDescriptors.CalcTPSA(mol),
+            "rot_bonds": rdMolDescriptors.CalcNumRotatableBonds(mol)}
+
+
+def descriptor_row(compound_id, values):
+    """
+    Makes the row for the descriptor table. Compounds without descriptors gets a row without values, so the
+    descriptors are not calculated again, and the compound is left out of range searches.
+
+    :param compound_id: The compound
+    :type compound_id: int
+    :param values: The descriptors, from descriptors
+    :type values: dict or None
+    :return: The row, with compound_id and a value for each descriptor, in the order of the columns
+    :rtype: dict
+    """
+    return {"compound_id": compound_id, **(values or dict.fromkeys(descriptor_names))}
+
+
+def _descriptor_rows(compounds):
+    """
+    Calculates the descriptors for a list of compounds. Runs in the worker processes.
+    Compounds where the smiles code is missing or can not be read gets a row without values.
+
+    :param compounds: A list of compound_id and smiles code pairs
+    :type compounds: list
+    :return: The rows for the descriptor table
+    :rtype: list
+    """
+    return [descriptor_row(compound_id, descriptors(Chem.MolFromSmiles(smiles)) if smiles else None)
+            for compound_id, smiles in compounds]
+
+
+class DescriptorStore:
+    """
+    :param dbf: The database functions
+    :type dbf: database_handler.DataBaseFunctions
+    :param table: The table with the descriptors
+    :type table: str
+    :param compound_table: The table with the compounds
+    :type compound_table: str
+    :param workers: Amount of processes used to calculate descriptors
+    :type workers: int
+    """
+    def __init__(self, dbf, table="compound_descriptor", compound_table="compound_main", workers=1):
+        self.dbf = dbf
+        self.table = table
+        self.compound_table = compound_table
+        self.workers = workers
+
+    def __str__(self):
+        """
+        Saves descriptors (MW, cLogP, HBD, HBA, TPSA and rotatable bonds) for the compounds in the database, so
+        compounds can be picked on them with a search in the database, instead of calculating them for every compound.
+        Each descriptor column has an index, so range searches only reads the rows that fits.
+        Compounds where the smiles code can not be read have a row without values, so they are only tried once.
+        The descriptors are added when the compounds are imported, searches never calculates them.
+        """
+
+    def add(self, rows):
+        """
+        Adds descriptors to the database
+
+        :param rows: The rows, with compound_id and a value for each descriptor, in the order of the columns
+        :type rows: list
+        :return: A report with amount of rows added, and a list of the ones that failed and why
+        :rtype: dict
+        """
+        return self.dbf.bulk_insert(self.table, rows)
+
+    def calculate(self, compounds):
+        """
+        Calculates the descriptors for compounds. The compounds are split between processes if there is more than one
+        worker.
+
+        :param compounds: A list of compound_id and smiles code pairs
+        :type compounds: list
+        :return: The rows for the descriptor table
+        :rtype: list
+        """
+        if self.workers <= 1 or len(compounds) < self.workers * 2:
+            return _descriptor_rows(compounds)
+
+        chunk_size = -(-len(compounds) // (self.workers * 4))
+        chunks = [compounds[start:start + chunk_size] for start in range(0, len(compounds), chunk_size)]
+        rows = []
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for chunk_rows in pool.map(_descriptor_rows, chunks):
+                rows += chunk_rows
+        return rows
+
+    def missing(self):
+        """
+        Checks if there are compounds without descriptors, from the row counts of the two tables
+
+        :return: True if there are fewer rows in the descriptor table than in the compound table
+        :rtype: bool
+        """
+        return self.dbf.statistics.count(self.table) < self.dbf.statistics.count(self.compound_table)
+
+    def backfill(self):
+        """
+        Calculates descriptors for all compounds in the database that do not have them
+
+        :return: Amount of rows added
+        :rtype: int
+        """
+        missing = f"SELECT compound_id, smiles FROM {self.compound_table} WHERE compound_id NOT IN " \
+                  f"(SELECT compound_id FROM {self.table})"
+        compounds = [tuple(compound) for compound in self.dbf.fetch(missing)]
+        return self.add(self.calculate(compounds))["added"]
+
+    def exists_search(self, search_limiter):
+        """
+        Makes a search for the compound table, that only finds compounds with descriptors that fits the
+        search_limiter. The descriptor table is searched in the same SQL as the compound table, with "EXISTS".
+
+        :param search_limiter: A dict over values to search for in the descriptor table, ex:
+            {"mw": {"value": [200, 500], "operator": "BETWEEN", "target_column": "mw"}}
+        :type search_limiter: dict
+        :return: The search, to add to the search_limiter for the compound table
+        :rtype: dict
+        """
+        return {"value": search_limiter,
+                "operator": "EXISTS",
+                "target_column": "compound_id",
+                "table": self.table}
+
+
+def descriptor_store_from_config(dbf, config):
+    """
+    Makes the descriptor store from the settings in the config file
+
+    :param dbf: The database functions
+    :type dbf: database_handler.DataBaseFunctions
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :return: The descriptor store
+    :rtype: DescriptorStore
+    """
+    return DescriptorStore(dbf, config["Tables"].get("compound_descriptor_table", fallback="compound_descriptor"),
+                           config["Tables"].get("compound_main", fallback="compound_main"),
+                           config.getint("Descriptors", "workers", fallback=1))
+
+
+if __name__ == "__main__":
+    from database_handler import DataBaseFunctions
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    dbf = DataBaseFunctions(config)
+    ds = descriptor_store_from_config(dbf, config)
+    with dbf:
+        print("descriptors added", ds.backfill())
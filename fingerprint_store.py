@@ -0,0 +1,206 @@
+import configparser
+
+import numpy as np
+from rdkit import DataStructs
+
+from chem_operators import ChemOperators
+
+
+class FingerprintStore:
+    """
+    :param dbf: The database functions
+    :type dbf: database_handler.DataBaseFunctions
+    :param table: The table with the fingerprints
+    :type table: str
+    :param compound_table: The table with the compounds
+    :type compound_table: str
+    """
+    def __init__(self, dbf, table="compound_fingerprint", compound_table="compound_main"):
+        self.dbf = dbf
+        self.table = table
+        self.compound_table = compound_table
+        self.co = ChemOperators()
+
+    def __str__(self):
+        """
+        Saves fingerprints for the compounds in the database, so they only needs to be made once.
+        Each fingerprint is saved per compound_id, fingerprint type and the settings for the fingerprint, so the same
+        compound can have fingerprints with different settings.
+        Bit vectors are saved as packed bits, atom pairs (dice) are saved in the RDKit binary formate.
+        """
+
+    @staticmethod
+    def params_key(params):
+        """
+        Makes a string from the fingerprint settings, that is the same for the same settings
+
+        :param params: The settings for the fingerprint
+        :type params: dict
+        :return: The settings as a string, ex: "chirality=False;features=False;n_bits=2048;radius=2", or "default"
+            for fingerprints without settings
+        :rtype: str
+        """
+        if not params:
+            return "default"
+        return ";".join(f"{key}={params[key]}" for key in sorted(params))
+
+    @staticmethod
+    def to_blob(fp):
+        """
+        Makes a fingerprint ready to be saved in the database
+
+        :param fp: The fingerprint
+        :type fp: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        :return:
+            - The fingerprint in binary formate
+            - The number of bits for bit vectors, None for other fingerprints
+        :rtype:
+            - bytes
+            - int or None
+        """
+        if isinstance(fp, DataStructs.ExplicitBitVect):
+            bits = np.zeros(fp.GetNumBits(), dtype=np.uint8)
+            DataStructs.ConvertToNumpyArray(fp, bits)
+            return np.packbits(bits).tobytes(), fp.GetNumBits()
+        return fp.ToBinary(), None
+
+    @staticmethod
+    def from_blob(blob, n_bits):
+        """
+        Makes a fingerprint from the database ready to be used by RDKit
+
+        :param blob: The fingerprint in binary formate
+        :type blob: bytes
+        :param n_bits: The number of bits for bit vectors, None for other fingerprints
+        :type n_bits: int or None
+        :return: The fingerprint
+        :rtype: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        """
+        if n_bits is None:
+            return DataStructs.IntSparseIntVect(blob)
+
+        bits = np.unpackbits(np.frombuffer(blob, dtype=np.uint8), count=n_bits)
+        fp = DataStructs.ExplicitBitVect(n_bits)
+        fp.SetBitsFromList(np.flatnonzero(bits).tolist())
+        return fp
+
+    def _fingerprint_rows(self, compounds, methode, params):
+        """
+        Makes the fingerprints for the compounds, as rows for the fingerprint table.
+        Compounds where the smiles code is missing or can not be read are left out.
+
+        :param compounds: A dict with compound_id as keys and smiles codes as values
+        :type compounds: dict
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params: The full settings for the fingerprint
+        :type params: dict
+        :return: A dict with the compound_id as keys and the fingerprint as values, and the rows for the table
+        :rtype: (dict, list)
+        """
+        params_key = self.params_key(params)
+        fingerprints = {}
+        rows = []
+        for compound_id, smiles in compounds.items():
+            if smiles is None:
+                continue
+            mol = self.co.get_mol(smiles)
+            if mol is None:
+                continue
+            fp = self.co.fingerprint(mol, methode, params)
+            blob, n_bits = self.to_blob(fp)
+            fingerprints[compound_id] = fp
+            rows.append({"fp_type": methode, "fp_params": params_key, "compound_id": compound_id, "n_bits": n_bits,
+                         "fingerprint": blob})
+        return fingerprints, rows
+
+    def add(self, compounds, methode, params=None):
+        """
+        Makes fingerprints for the compounds and adds them to the database
+
+        :param compounds: A dict with compound_id as keys and smiles codes as values
+        :type compounds: dict
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params: The settings for the fingerprint. Default settings are used for the missing ones
+        :type params: dict or None
+        :return: A report with amount of fingerprints added, and a list of the ones that failed and why
+        :rtype: dict
+        """
+        params = self.co.fingerprint_params(methode, params)
+        _, rows = self._fingerprint_rows(compounds, methode, params)
+        return self.dbf.bulk_insert(self.table, rows)
+
+    def load(self, compounds, methode, params=None, fill_missing=True):
+        """
+        Gets the fingerprints for the compounds from the database.
+        Compounds without a fingerprint gets one made, and added to the database, if fill_missing is True.
+
+        :param compounds: A dict with compound_id as keys and smiles codes as values
+        :type compounds: dict
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params: The settings for the fingerprint. Default settings are used for the missing ones
+        :type params: dict or None
+        :param fill_missing: If fingerprints that are not in the database should be made
+        :type fill_missing: bool
+        :return: A dict with compound_id as keys and the fingerprints as values
+        :rtype: dict
+        """
+        params = self.co.fingerprint_params(methode, params)
+        search_limiter = {
+            "fp_type": {"value": methode, "operator": "=", "target_column": "fp_type"},
+            "fp_params": {"value": self.params_key(params), "operator": "=", "target_column": "fp_params"},
+            "compound_id": {"value": list(compounds), "operator": "IN", "target_column": "compound_id"},
+        }
+        fingerprints = {}
+        if compounds:
+            for row in self.dbf.stream_table_data(self.table, search_limiter, ["compound_id", "n_bits", "fingerprint"]):
+                fingerprints[row["compound_id"]] = self.from_blob(row["fingerprint"], row["n_bits"])
+
+        missing = {compound_id: smiles for compound_id, smiles in compounds.items()
+                   if compound_id not in fingerprints}
+        if fill_missing and missing:
+            new_fingerprints, rows = self._fingerprint_rows(missing, methode, params)
+            self.dbf.bulk_insert(self.table, rows)
+            fingerprints.update(new_fingerprints)
+
+        return fingerprints
+
+    def backfill(self, methode, params=None, batch_size=None):
+        """
+        Makes fingerprints for all compounds in the database that do not have one
+
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params: The settings for the fingerprint. Default settings are used for the missing ones
+        :type params: dict or None
+        :param batch_size: Amount of compounds per insert. Defaults to bulk_chunk_size from the config
+        :type batch_size: int or None
+        :return: Amount of fingerprints added
+        :rtype: int
+        """
+        params = self.co.fingerprint_params(methode, params)
+        batch_size = batch_size or self.dbf.chunk_size
+        missing = f"SELECT compound_id, smiles FROM {self.compound_table} WHERE compound_id NOT IN " \
+                  f"(SELECT compound_id FROM {self.table} WHERE fp_type = ? AND fp_params = ?)"
+        compounds = self.dbf.fetch(missing, [methode, self.params_key(params)])
+
+        added = 0
+        for start in range(0, len(compounds), batch_size):
+            batch = dict(compounds[start:start + batch_size])
+            _, rows = self._fingerprint_rows(batch, methode, params)
+            added += self.dbf.bulk_insert(self.table, rows)["added"]
+        return added
+
+
+if __name__ == "__main__":
+    from database_handler import DataBaseFunctions
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    dbf = DataBaseFunctions(config)
+    fps = FingerprintStore(dbf, config["Tables"]["compound_fingerprint_table"], config["Tables"]["compound_main"])
+    with dbf:
+        for fp_type in config["Fingerprints"]["precompute"].split(","):
+            print(fp_type.strip(), fps.backfill(fp_type.strip()))
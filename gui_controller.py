@@ -12,6 +12,8 @@ from gui_popup import matrix_popup
 from gui_help_info_controller import help_info_controller
 from config_writer import ConfigWriter
 from database_startup import DatabaseSetUp
+from depiction_service import depiction_from_config
+from descriptor_store import descriptor_names
 from visualization import *
 
 
@@ -29,6 +31,11 @@ def main(config):
     try:
         if os.path.exists(config["Database"]["database"]):
             db_active = True
+            # Brings databases made with older versions up to date, with new indexes and fixes
+            database_setup = DatabaseSetUp(config, config["Database"]["database"])
+            database_setup.migrate()
+            # Structures and descriptors for compounds from before the tables was made, are added in the background
+            database_setup.backfill_in_background()
         else:
             cw.delete_all_info("Database")
             db_active = False
@@ -62,9 +69,15 @@ def main(config):
             "positive": config["plate_colouring"]["positive"],
             "negative": config["plate_colouring"]["negative"],
             "empty": config["plate_colouring"]["empty"]
+        },
+        "Structure_search": {
+            "workers": config["Structure_search"]["workers"],
+            "chunk_size": config["Structure_search"]["chunk_size"]
         }
     }
     #   WINDOW 1 - SEARCH   #
+    depictions = depiction_from_config(config)
+    depiction_page = config.getint("Depiction", "prewarm", fallback=100)
     ac_use = False
     origin_use = False
     transferee_volume = None
@@ -524,14 +537,7 @@ def main(config):
 
         #   WINDOW 1 - SEARCH     ###
         if event == "-SEARCH_AC-":
-            ac = values["-SEARCH_AC-"]
-            origin_values = []
-            if ac:
-                for acs in ac:
-                    acs = acs.casefold()
-                    for values in config[f"database_specific_{acs}"]:
-                        origin_values.append(config[f"database_specific_{acs}"][values])
-            window["-SEARCH_ORIGIN-"].update(values=origin_values)
+            window["-SEARCH_ORIGIN-"].update(values=origin_list(config, values["-SEARCH_AC-"]))
 
         if event == "-SUB_SEARCH_METHOD-":
             if values["-SUB_SEARCH_METHOD-"] == "morgan":
@@ -661,6 +667,7 @@ def main(config):
             if reports:
                 bio_final_report_setup, bio_plate_report_setup, ms_settings, simple_settings = reports
                 set_colours(window, reports)
+                set_structure_search_settings(config, simple_settings)
 
         if event == "-BIO_ANALYSE_TYPE-":
             sg.popup("This functions does nothing ATM ")
@@ -777,10 +784,14 @@ def main(config):
         if event == "-PURITY_DATA_IMPORT-":
             folder = values["-PURITY_DATA_IMPORT_FOLDER-"]
             add_to_database = values["-PURITY_DATA_ADD_TO_DATABASE-"]
-            purity_data, samples = import_ms_data(folder, add_to_database, config)
+            purity_table, samples, file_report, purity_data = import_ms_data(folder, add_to_database, config)
+            if file_report:
+                sg.popup_scrolled("\n".join(f"{sample}: {', '.join(problems)}"
+                                             for sample, problems in file_report.items()),
+                                  title="Samples with missing files")
 
             window["-PURITY_INFO_SAMPLE_BOX-"].update(values=samples)
-            window["-PURITY_INFO_SAMPLE_TABLE-"].update(values=purity_data)
+            window["-PURITY_INFO_SAMPLE_TABLE-"].update(values=purity_table)
 
         if event == "-PURITY_INFO_SAMPLE_BOX-":
             samples = values["-PURITY_INFO_SAMPLE_BOX-"]
@@ -1038,7 +1049,8 @@ def main(config):
             if not values["-UPDATE_FOLDER-"]:
                 sg.popup_error("Please select a folder containing compound data")
             else:
-                update_database(values["-UPDATE_FOLDER-"], "compound_main", None, config)
+                update_database(values["-UPDATE_FOLDER-"], "compound_main", None, config, import_progress)
+                sg.one_line_progress_meter_cancel("-IMPORT_PROGRESS-")
                 config_update(config)
                 window.close()
                 window = gl.full_layout()
@@ -1133,6 +1145,12 @@ def main(config):
 
 
         #     WINDOW TABLES - COMPOUND TABLE      ###
+        if event == "-TREE_DB_DEPICTION-":
+            compound_id = values[event]
+            if compound_id in window["-TREE_DB-"].TreeData.tree_dict:
+                window["-TREE_DB-"].update(key=compound_id,
+                                           icon=depictions.png(compound_data[compound_id]["smiles"]))
+
         if event == "-TREE_DB-":
             try:
                 temp_id = window.Element("-TREE_DB-").SelectedRows[0]
@@ -1142,20 +1160,13 @@ def main(config):
             window["-COMPOUND_INFO_ID-"].update(value=compound_data[temp_id]["compound_id"])
             window["-COMPOUND_INFO_SMILES-"].update(value=compound_data[temp_id]["smiles"])
             window["-COMPOUND_INFO_MP_VOLUME-"].update(value=compound_data[temp_id]["volume"])
-            window["-COMPOUND_INFO_PIC-"].update(data=compound_data[temp_id]["png"])
+            window["-COMPOUND_INFO_PIC-"].update(data=depictions.png(compound_data[temp_id]["smiles"]))
             window["-COMPOUND_INFO_ORIGIN_ID-"].update(value=compound_data[temp_id]["origin_id"])
             window["-COMPOUND_INFO_CONCENTRATION-"].update(value=compound_data[temp_id]["concentration"])
 
-            search_limiter_origin = {"academic_commercial": {"value": values["-SEARCH_AC-"],
-                                                      "operator": "IN",
-                                                      "target_column": "ac",
-                                                      "use": ac_use}, "vendor_center": {"value": values["-SEARCH_ORIGIN-"],
-                                                "operator": "IN",
-                                                "target_column": "origin",
-                                                "use": origin_use}}
-            all_data_origin, _ = grab_table_data(config, "origin", search_limiter_origin)
-            window["-COMPOUND_INFO_AC-"].update(value=all_data_origin[0][1])
-            window["-COMPOUND_INFO_ORIGIN-"].update(value=all_data_origin[0][2])
+            compound_ac, compound_origin_name = compound_origin(config, compound_data[temp_id]["ac_id"])
+            window["-COMPOUND_INFO_AC-"].update(value=compound_ac)
+            window["-COMPOUND_INFO_ORIGIN-"].update(value=compound_origin_name)
 
             compound_id = compound_data[temp_id]["compound_id"]
             table_data = update_plate_table(compound_id, config)
@@ -1176,11 +1187,17 @@ def main(config):
                 elif values["-SEARCH_PLATE_PRODUCTION-"] == "Mother Plates":
                     table = config["Tables"]["compound_main"]
                 current_table_data = values["-SEARCH_PLATE_PRODUCTION-"]
+                descriptor_limits = {f"-SEARCH_DESCRIPTOR_{limit.upper()}_{descriptor.upper()}-":
+                                     f"{limit} {descriptor_names[descriptor]}"
+                                     for descriptor in descriptor_names for limit in ["Min", "Max"]}
+                invalid_limits = invalid_numbers(values, descriptor_limits)
 
                 if values["-SEARCH_PLATE_AMOUNT-"] == "" and not values["-SEARCH_PLATE_AMOUNT_ALL-"]:
                     sg.popup_error("Please fill out plate amount")
                 elif not values["-SEARCH_TRANS_VOL-"] and not values["-SEARCH_IGNORE_VOLUME-"]:
                     sg.popup_error("Please specify transferee amount")
+                elif invalid_limits:
+                    sg.popup_error(f"Descriptor limits needs to be numbers: {', '.join(invalid_limits)}")
                 else:
                     if not values["-SEARCH_PLATE_AMOUNT_ALL-"]:
                         mp_amount = int(values["-SEARCH_PLATE_AMOUNT-"])
@@ -1197,6 +1214,13 @@ def main(config):
                     sub_search_methode = values["-SUB_SEARCH_METHOD-"]
                     threshold = float(values["-SUB_SEARCH_THRESHOLD-"])
                     source_table = table
+                    if sub_search_methode == "morgan":
+                        morgan_values = {"radius": values["-SUB_SEARCH_MORGAN_RANGE-"],
+                                         "n_bits": values["-SUB_SEARCH_MORGAN_BITS-"],
+                                         "chirality": values["-SUB_SEARCH_MORGAN_CHIRALITY-"],
+                                         "features": values["-SUB_SEARCH_MORGAN_FEATURES-"]}
+                    else:
+                        morgan_values = None
 
                     if values["-SEARCH_AC-"]:
                         ac_use = True
@@ -1208,6 +1232,15 @@ def main(config):
                     else:
                         origin_use = False
 
+                    descriptor_search = {}
+                    for descriptor in descriptor_names:
+                        limits = [values[f"-SEARCH_DESCRIPTOR_MIN_{descriptor.upper()}-"],
+                                  values[f"-SEARCH_DESCRIPTOR_MAX_{descriptor.upper()}-"]]
+                        descriptor_search[descriptor] = {"value": [float(limit) if limit else None for limit in limits],
+                                                         "operator": "BETWEEN",
+                                                         "target_column": descriptor,
+                                                         "use": any(limits)}
+
                     samples_per_plate = int(values["-SEARCH_PLATE_LAYOUT_SAMPLE_AMOUNT-"])
                     search_limiter = {
                         config["Tables"]["compound_source"]: {"academic_commercial": {"value": values["-SEARCH_AC-"],
@@ -1226,6 +1259,7 @@ def main(config):
                                                                        "operator": "<",
                                                                        "target_column": "volume",
                                                                        "use": not values["-SEARCH_IGNORE_VOLUME-"]}},
+                        config["Tables"]["compound_descriptor_table"]: descriptor_search,
                         "join_tables": {config["Tables"]["compound_main"]: {},
                                         config["Tables"]["compound_mp_table"]: {
                                              "compound_id": {"value": "",
@@ -1236,11 +1270,18 @@ def main(config):
                     }
 
                     table_data = table_update_tree(mp_amount, samples_per_plate, ignore_active, sub_search, smiles,
-                                                   sub_search_methode, threshold, source_table, search_limiter, config)
+                                                   sub_search_methode, threshold, source_table, search_limiter, config,
+                                                   morgan_values)
                     if table_data:
                         treedata, all_data, compound_data, counter = table_data
                         window['-TREE_DB-'].image_dict.clear()
                         window["-TREE_DB-"].update(treedata)
+                        # Draws the pictures for the first rows in the background, and adds them to the tree as they
+                        # are ready
+                        first_page = {compound_id: compound_data[compound_id]["smiles"]
+                                      for compound_id in list(compound_data)[:depiction_page]}
+                        depictions.prewarm(first_page, callback=lambda compound_id, _:
+                                           window.write_event_value("-TREE_DB_DEPICTION-", compound_id))
                         window["-C_TABLE_COUNT-"].update(f"Compounds: {counter}")
                         window["-C_TABLE_REFRESH-"].update(text="Clear Table")
                         compound_table_clear = True
@@ -1254,6 +1295,7 @@ def main(config):
                     #     sg.Popup("Fill in missing data")
 
             elif compound_table_clear:
+                depictions.cancel_prewarm()
                 window['-TREE_DB-'].image_dict.clear()
                 treedata = sg.TreeData()
                 window['-TREE_DB-'].update(treedata)
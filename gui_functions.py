@@ -1,6 +1,7 @@
+import os
+
 import PySimpleGUI as sg
 import configparser
-from datetime import date
 
 from csv_handler import CSVWriter, CSVConverter, CSVReader
 from lc_data_handler import LCMSHandler
@@ -11,12 +12,12 @@ from bio_report_setup import bio_final_report_controller
 from bio_date_handler import BIOAnalyser
 from info import matrix_header
 from json_handler import dict_writer, dict_reader
-from pickle_handler import df_writer
+from raw_data_store import raw_data_store_from_config
 from heatmap import Heatmap
 from config_writer import ConfigWriter
 from plate_formatting import plate_layout_to_well_ditc, daughter_plate_generator, plate_layout_re_formate
 from excel_handler import export_plate_layout
-from data_miner import dm_controller
+from data_miner import stream_samples
 
 
 def config_update(config):
@@ -71,8 +72,29 @@ def amount_samples(plate_amount, samples_per_plate=384):
         return None
 
 
+def invalid_numbers(values, keys):
+    """
+    Finds the input fields that have text that is not a number. Empty fields are fine.
+
+    :param values: The values from the GUI
+    :type values: dict
+    :param keys: The keys for the input fields, with the name to show for the field as values
+    :type keys: dict
+    :return: The names for the fields that are not numbers
+    :rtype: list
+    """
+    invalid = []
+    for key in keys:
+        if values[key]:
+            try:
+                float(values[key])
+            except ValueError:
+                invalid.append(keys[key])
+    return invalid
+
+
 def _compound_list(config, mp_amount, samples_per_plate, ignore_active, sub_search, smiles,
-                   sub_search_methode, threshold, source_table, fd, search_limiter):
+                   sub_search_methode, threshold, source_table, fd, search_limiter, morgan_values=None):
     """
     Generate list of compounds, based on number of motherplates only, or by sub_structure search.
     Generate comPOUND file for fecthing tubes from the comPOUND freezer.
@@ -97,6 +119,8 @@ def _compound_list(config, mp_amount, samples_per_plate, ignore_active, sub_sear
     :type source_table: str
     :param search_limiter: A dict over values to search for in the db
     :type search_limiter: dict
+    :param morgan_values: Morgan search values (radius, n_bits, chirality and features), for morgan searches
+    :type morgan_values: dict or None
     :return:
         - compound_list: A list of compounds
         - liquid_warning_list: A warning for compounds that are close to zero
@@ -114,13 +138,13 @@ def _compound_list(config, mp_amount, samples_per_plate, ignore_active, sub_sear
 
     # Gets a list of compounds, based on search criteria
     items = fd.list_limiter(sample_amount, source_table, sub_search, sub_search_methode, smiles,
-                            threshold, ignore_active, plated_compounds, search_limiter)
+                            threshold, ignore_active, plated_compounds, search_limiter, morgan_values)
 
     return items
 
 
 def table_update_tree(mp_amount, samples_per_plate, ignore_active, sub_search, smiles, sub_search_methode,
-                      threshold, source_table, search_limiter, config):
+                      threshold, source_table, search_limiter, config, morgan_values=None):
     """
     Updates the compound table with compounds depending on search criteria
 
@@ -143,6 +167,8 @@ def table_update_tree(mp_amount, samples_per_plate, ignore_active, sub_search, s
     :type config: configparser.ConfigParser
     :param search_limiter: A dict over values to search for in the db
     :type search_limiter: dict
+    :param morgan_values: Morgan search values (radius, n_bits, chirality and features), for morgan searches
+    :type morgan_values: dict or None
     :return:
         - treedata: The data for the "tree" table
         - all_data: A dict over all the data
@@ -155,59 +181,52 @@ def table_update_tree(mp_amount, samples_per_plate, ignore_active, sub_search, s
         - int
     """
 
-    fd = FetchData(config)
-    all_data = {}
-    all_data_headlines = ["compound_list", "liquid_warning_list", "row_data", "mp_data", "mp_mapping", "plate_count"]
+    with FetchData(config) as fd:
+        all_data = {}
+        all_data_headlines = ["compound_list", "liquid_warning_list", "row_data", "mp_data", "mp_mapping", "plate_count"]
 
-    temp_all_data = _compound_list(config, mp_amount, samples_per_plate, ignore_active, sub_search, smiles,
-                                   sub_search_methode, threshold, source_table, fd, search_limiter)
+        temp_all_data = _compound_list(config, mp_amount, samples_per_plate, ignore_active, sub_search, smiles,
+                                       sub_search_methode, threshold, source_table, fd, search_limiter,
+                                       morgan_values)
 
-    if not temp_all_data:
-        return None
-    else:
-        for índex, values in enumerate(temp_all_data):
-            all_data[all_data_headlines[índex]] = values
-
-        # if source_table == "join_main_mp":
-        #     rows = fd.list_to_rows(all_data["compound_list"], source_table)
-        # elif source_table == config["Tables"]["compound_main"]:
-        #     rows = fd.list_to_rows(all_data["compound_list"], source_table)
-
-        if source_table == "join_main_mp":
-            search_limiter["join_tables"][config["Tables"]["compound_mp_table"]]["compound_id"]["value"] = \
-                all_data["compound_list"]
-            search_limiter["join_tables"][config["Tables"]["compound_mp_table"]]["compound_id"]["use"] = True
-            search_limiter_tree = search_limiter["join_tables"]
-
-        elif source_table == config["Tables"]["compound_main"]:
-            search_limiter_tree = {source_table: {"value": all_data["compound_list"],
-                                                  "operator": "IN",
-                                                  "target_column": "compound_id",
-                                                  "use": True}}
-        rows = {}
-
-        temp_dict = fd.data_search(source_table, search_limiter_tree)
-        for key, value in temp_dict.items():
-            rows[key] = value
-
-        counter = 0
-        treedata = sg.TreeData()
-
-        for compound_id in rows:
-
-            temp_list = []
-            for key in rows[compound_id]:
-                if key == "png":
-                    temp_png = rows[compound_id][key]
-                else:
-                    temp_list.append(rows[compound_id][key])
-            counter += 1
-            if counter < 100:
-                treedata.Insert("", compound_id, "", temp_list, icon=temp_png)
-            else:
+        if not temp_all_data:
+            return None
+        else:
+            for índex, values in enumerate(temp_all_data):
+                all_data[all_data_headlines[índex]] = values
+
+            # if source_table == "join_main_mp":
+            #     rows = fd.list_to_rows(all_data["compound_list"], source_table)
+            # elif source_table == config["Tables"]["compound_main"]:
+            #     rows = fd.list_to_rows(all_data["compound_list"], source_table)
+
+            if source_table == "join_main_mp":
+                search_limiter["join_tables"][config["Tables"]["compound_mp_table"]]["compound_id"]["value"] = \
+                    all_data["compound_list"]
+                search_limiter["join_tables"][config["Tables"]["compound_mp_table"]]["compound_id"]["use"] = True
+                search_limiter_tree = search_limiter["join_tables"]
+
+            elif source_table == config["Tables"]["compound_main"]:
+                search_limiter_tree = {source_table: {"value": all_data["compound_list"],
+                                                      "operator": "IN",
+                                                      "target_column": "compound_id",
+                                                      "use": True}}
+            rows = {}
+
+            # The pictures are drawn by the DepictionService when the rows are shown, so the png column is not needed
+            temp_dict = fd.data_search(source_table, search_limiter_tree, fd.search_columns(source_table))
+            for key, value in temp_dict.items():
+                rows[key] = value
+
+            counter = 0
+            treedata = sg.TreeData()
+
+            for compound_id in rows:
+                temp_list = list(rows[compound_id].values())
+                counter += 1
                 treedata.Insert("", compound_id, "", temp_list, icon="")
 
-        return treedata, all_data, rows, counter
+            return treedata, all_data, rows, counter
 
 
 def compound_export(folder, compound_list):
@@ -237,10 +256,10 @@ def compound_counter(config, table):
     :rtype: int
     """
     fd = FetchData(config)
-    return len(fd.data_search(table, None))
+    return fd.stats.count(table)
 
 
-def update_database(data, table, file_type, config):
+def update_database(data, table, file_type, config, progress=None):
     """
     Update the database with data. Both for adding data to the different tables, but updating tables with new values
 
@@ -253,11 +272,31 @@ def update_database(data, table, file_type, config):
     :type table: str
     :param config: The config handler, with all the default information in the config file.
     :type config: configparser.ConfigParser
-    :return: Updated database with values
+    :param progress: Progress callback for compound imports, see AddData.compound_main
+    :type progress: function or None
+    :return: A report over what have been added, and what could not be added, per table.
+        Updated database with values
+    :rtype: dict
     """
 
     ad_db = AddData(config)
-    ad_db.add_controller(table, data, file_type)
+    return ad_db.add_controller(table, data, file_type, progress)
+
+
+def import_progress(sdf_file, compound_count, fraction):
+    """
+    Shows the progress of a compound import in a progress meter
+
+    :param sdf_file: The file being imported
+    :type sdf_file: str
+    :param compound_count: Amount of compounds read from the file
+    :type compound_count: int
+    :param fraction: The amount of the file that have been read, from 0 to 1
+    :type fraction: float
+    :return: A progress meter
+    """
+    sg.one_line_progress_meter("Compound import", int(fraction * 100), 100, os.path.basename(sdf_file),
+                               f"Compounds: {compound_count}", key="-IMPORT_PROGRESS-", orientation="h")
 
 
 def purity_handler(folder, uv_one, uv_same_wavelength, wavelength, uv_threshold, rt_solvent_peak, ms_delta, ms_mode,
@@ -550,10 +589,10 @@ def bio_experiment_to_database(assay_name, plate_data, plate_layout, date, respo
     table_name = "bio_experiment"
 
     raw_data = f"{assay_name}_{date}"
-    exp_id = fd.get_number_of_rows(table_name) + 1
 
+    # exp_id is set by the database
     data_dict = {
-        "exp_id": exp_id,
+        "exp_id": None,
         "assay_name": assay_name,
         "raw_data": raw_data,
         "plate_layout": plate_layout,
@@ -565,21 +604,48 @@ def bio_experiment_to_database(assay_name, plate_data, plate_layout, date, respo
     update_database(data_dict, table_name, None, config)
 
 
-def grab_table_data(config, table_name, search_limiter):
+def origin_list(config, ac):
+    """
+    Gets the names of the origins for the origin list in the search
+
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :param ac: The selected values, Academic and/or Commercial
+    :type ac: list
+    :return: The names of the origins
+    :rtype: list
+    """
+    if not ac:
+        return []
+    fd = FetchData(config)
+    return fd.origins.origins(ac)
+
+
+def compound_origin(config, ac_id):
+    """
+    Finds the origin for a compound
+
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :param ac_id: The ac_id for the compound
+    :type ac_id: int
+    :return: Academic or Commercial, and the name of the origin
+    :rtype: (str, str)
+    """
     fd = FetchData(config)
+    return fd.origins.origin(ac_id)
 
-    rows = fd.data_search(table_name, search_limiter)
+
+def grab_table_data(config, table_name, search_limiter):
+    fd = FetchData(config)
 
     all_data = []
     headlines = []
 
-    for row in rows:
-        temp_data = []
-        for data in rows[row]:
-            headlines.append(data)
-            temp_data.append(rows[row][data])
-
-        all_data.append(temp_data)
+    for row in fd.data_stream(table_name, search_limiter):
+        if not headlines:
+            headlines = row.keys()
+        all_data.append(list(row))
 
     return all_data, headlines
 
@@ -802,6 +868,23 @@ def update_plate_table(compound_id, config):
     return plate_data
 
 
+def set_structure_search_settings(config, simple_settings):
+    """
+    Update the structure search settings in the config, after changes in the settings. The settings are used for the
+    next search. Values that are not whole numbers are ignored.
+
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :param simple_settings: The simple settings from the menu
+    :type simple_settings: dict
+    :return: The config is updated
+    """
+    for setting, value in simple_settings["Structure_search"].items():
+        value = str(value).strip()
+        if value.isdigit():
+            config["Structure_search"][setting] = value
+
+
 def set_colours(window, reports):
     """
     Update all the input colour fields with new colours, after changes in the settings.
@@ -866,9 +949,73 @@ def plate_layout_to_excel(well_dict, name, folder):
 
 
 def import_ms_data(folder, add_to_database, config):
+    """
+    Reads the UV and MS data in a folder, one sample at the time. Each sample is written to the raw data store as soon
+    as it is read, and the data is not kept in memory. The purity tab gets the samples from the store, per batch, as
+    memory mapped data, so only the parts that are plotted or integrated are read from the disk.
 
+    :param folder: The folder with the UV and MS files
+    :type folder: str
+    :param add_to_database: If the batches and the samples should be added to the database
+    :type add_to_database: bool
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :return:
+        - table_data: A row for each sample, for the sample table
+        - samples: The sample names
+        - file_report: Dict of samples with missing or mismatched files, with a list of the problems for each
+        - purity_data: The data for each sample, with the UV and MS data memory mapped from the store
+    :rtype:
+        - list
+        - list
+        - dict
+        - dict
+    """
     file_list = get_file_list(folder)
-    purity_data = dm_controller(file_list)
+    uv_dtype = "float32" if config.getboolean("LC_import", "uv_float32", fallback=False) else "float64"
+    raw_data_store = raw_data_store_from_config(config)
+    # Removes files from samples that was written again while they were open, the last time data was imported
+    raw_data_store.clean_up()
+
+    file_report = {}
+    sample_info = {}
+    batches = []
+    for sample, sample_data, problems in stream_samples(file_list, config.getint("LC_import", "workers", fallback=1),
+                                                        uv_dtype):
+        if problems:
+            file_report[sample] = problems
+        if sample_data is None:
+            continue
+
+        # makes sure that only new batches are added to the database
+        if sample_data["batch"] not in batches:
+            if add_to_database:
+                update_database({"batch": sample_data["batch"], "date": sample_data["date"]}, "lc_experiment", None,
+                                config)
+            batches.append(sample_data["batch"])
+
+        # Writes UV and MS data to a separated file per sample, in the raw data store
+        sample_data["file_name"] = raw_data_store.write(sample_data["sample"], sample_data["batch"], sample_data)
+        if add_to_database:
+            update_database({"row_id": sample_data["row_id"],
+                             "compound_id": sample_data["compound_id"] or None,
+                             "sample": sample_data["sample"],
+                             "batch": sample_data["batch"],
+                             "method": sample_data["method"],
+                             "file_name": sample_data["file_name"],
+                             "date": sample_data["date"]}, "lc_raw", None, config)
+
+        # Only the information about the sample is kept, the UV and MS data is opened from the store
+        sample_info[sample_data["row_id"]] = sample_data
+        for part in ["uv", "ms_pos", "ms_neg"]:
+            sample_data[part] = None
+
+    raw_samples = {batch: raw_data_store.open_batch(batch) for batch in batches}
+    purity_data = {}
+    for row_id in sorted(sample_info):
+        raw_sample = raw_samples[sample_info[row_id]["batch"]][sample_info[row_id]["sample"]]
+        purity_data[sample_info[row_id]["sample"]] = {key: raw_sample[key] if key in raw_sample.keys() else value
+                                                      for key, value in sample_info[row_id].items()}
 
     samples = []
     table_data = []
@@ -879,46 +1026,8 @@ def import_ms_data(folder, add_to_database, config):
             temp_data.append(purity_data[sample][data])
         table_data.append(temp_data)
 
-    if add_to_database:
-        batch_dict = {}
-        today = date.today()
-        today = today.strftime("%m_%Y")
-        path = f"{config['folders']['main_output_folder']}/purity_data_{today}"
-        batch_list = []
-        for samples in purity_data:
-
-            batch_dict[purity_data[samples]["batch"]] = {"batch": purity_data[samples]["batch"],
-                                                         "date": purity_data[samples]["date"]}
-
-            for batch in batch_dict:
-                # makes sure that only new batches are added to the database
-                if batch not in batch_list:
-                    update_database(batch_dict[batch], "lc_experiment", None, config)
-                    batch_list.append(batch)
-
-
-            temp_file_date = {}
-            temp_file_date[f"{purity_data[samples]['sample']}_{purity_data[samples]['batch']}"] = {
-                "uv": purity_data[samples]["uv"],
-                "ms_neg": purity_data[samples]["ms_neg"],
-                "ms_pos": purity_data[samples]["ms_pos"]}
-
-            # Writes UV and MS data to a separated file. Name based on sample_batch.
-            df_writer(path, temp_file_date)
-            temp_data_ditc = {"row_id": purity_data[samples]["row_id"],
-                              "sample": purity_data[samples]["sample"],
-                              "batch": purity_data[samples]["batch"],
-                              "method": purity_data[samples]["method"],
-                              "file_name": path,
-                              "date": purity_data[samples]["date"]}
-
-            update_database(temp_data_ditc, "lc_raw", None, config)
-
-            # Makes a dict of batches, for adding to the batch database
-
-
+    return table_data, samples, file_report, purity_data
 
-    return table_data, samples
 
 def purity_plotting(method, samples):
     ...
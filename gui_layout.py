@@ -1,5 +1,6 @@
 import PySimpleGUI as sg
 from info import matrix_header
+from descriptor_store import descriptor_names
 
 
 class GUILayout:
@@ -90,13 +91,23 @@ class GUILayout:
                 [sg.Checkbox(text="chirality", key="-SUB_SEARCH_MORGAN_CHIRALITY-", visible=False),
                  sg.Checkbox(text="Features", key="-SUB_SEARCH_MORGAN_FEATURES-", visible=False)],
                 [sg.Text("n bits", key="-SUB_SEARCH_BITS_TEXT-", size=self.standard_size, visible=False),
-                 sg.InputText(key="-SUB_SEARCH_MORGAN_BITS-", size=self.standard_size, visible=False)],
+                 sg.InputText(key="-SUB_SEARCH_MORGAN_BITS-", default_text=2048, size=self.standard_size,
+                              visible=False)],
                 [sg.Text("bound range", key="-SUB_SEARCH_BOUND_TEXT-", size=self.standard_size, visible=False),
-                 sg.InputText(key="-SUB_SEARCH_MORGAN_RANGE-", size=self.standard_size, visible=False)],
+                 sg.InputText(key="-SUB_SEARCH_MORGAN_RANGE-", default_text=2, size=self.standard_size,
+                              visible=False)],
             ])
         ]])
 
-        layout = [sg.vtop([col_1,  col_sub_search]),
+        col_descriptors = sg.Frame("Descriptors", [[
+            sg.Column([[sg.T("", size=10), sg.T("Min", size=8), sg.T("Max", size=8)]] +
+                      [[sg.T(name, size=10),
+                        sg.InputText(key=f"-SEARCH_DESCRIPTOR_MIN_{descriptor.upper()}-", size=8),
+                        sg.InputText(key=f"-SEARCH_DESCRIPTOR_MAX_{descriptor.upper()}-", size=8)]
+                       for descriptor, name in descriptor_names.items()])
+        ]])
+
+        layout = [sg.vtop([col_1,  col_sub_search, col_descriptors]),
                   [sg.Checkbox("All compounds", key="-SEARCH_ALL_COMPOUNDS-", enable_events=True),
                    # sg.Checkbox("All Non-plated Compounds", key="-SEACH_ALL_NON_PLATED-", enable_events=True)
                    ]]
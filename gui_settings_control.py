@@ -293,6 +293,10 @@ class GUISettingsController:
                 "positive": values["-PLATE_LAYOUT_COLOUR_POSITIVE_TARGET-"],
                 "negative": values["-PLATE_LAYOUT_COLOUR_NEGATIVE_TARGET-"],
                 "empty": values["-PLATE_LAYOUT_COLOUR_EMPTY_TARGET-"]
+            },
+            "Structure_search": {
+                "workers": values["-STRUCTURE_SEARCH_WORKERS-"],
+                "chunk_size": values["-STRUCTURE_SEARCH_CHUNK_SIZE-"]
             }
         }
         reports = bio_final_report_setup, bio_plate_report_setup, ms_settings, simple_settings
@@ -328,6 +332,9 @@ class GUISettingsController:
                 elif values["-TAB_GROUPS-"] == "Plate Layout":
                     report_name = "simple_settings"
                     report_counter = 3
+                elif values["-TAB_GROUPS-"] == "Structure Search":
+                    report_name = "simple_settings"
+                    report_counter = 3
 
             if event == "-BIO_SETTINGS_OK-":
                 reports = self._set_reports(values)
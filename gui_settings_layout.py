@@ -1447,6 +1447,28 @@ class GUISettingsLayout:
         layout = [[col_colours]]
         return layout
 
+    def structure_search(self):
+        """
+
+        :return: A layout for the structure search settings
+        :rtype: list
+        """
+        col_performance = sg.Frame("Performance", [[
+            sg.Column([
+                [sg.T("Workers", size=12),
+                 sg.InputText(key="-STRUCTURE_SEARCH_WORKERS-", size=8,
+                              default_text=self.config["Structure_search"]["workers"]),
+                 sg.T("Processes used for the search. 1 = no extra processes, 0 = all cores")],
+                [sg.T("Chunk size", size=12),
+                 sg.InputText(key="-STRUCTURE_SEARCH_CHUNK_SIZE-", size=8,
+                              default_text=self.config["Structure_search"]["chunk_size"]),
+                 sg.T("Compounds each worker scores at the time")]
+            ])
+        ]])
+
+        layout = [[col_performance]]
+        return layout
+
     def tab_groups(self):
         """
 
@@ -1458,14 +1480,16 @@ class GUISettingsLayout:
         sg.set_options(font=("Courier New", 10))
         # text_width = 50
         #
-        headings = ["Bio Plate Report", "Bio Final Report", "MS Ions", "Plate Layout"]
+        headings = ["Bio Plate Report", "Bio Final Report", "MS Ions", "Plate Layout", "Structure Search"]
         text_width = max(map(len, headings))
         tab_plate_report = sg.Tab("Bio Plate Report".center(text_width), self.settings_bio_plate_report(), expand_x=True, expand_y=True)
         tab_full_report = sg.Tab("Bio Final Report".center(text_width), self.settings_bio_final_report(), expand_x=True, expand_y=True)
         tab_ion = sg.Tab("MS Ions".center(text_width), self.purity_ions(), expand_x=True, expand_y=True)
         tab_plate_layout = sg.Tab("Plate Layout".center(text_width), self.plate_layout(), expand_x=True, expand_y=True)
+        tab_structure_search = sg.Tab("Structure Search".center(text_width), self.structure_search(), expand_x=True,
+                                      expand_y=True)
 
-        tab_group_tables = [tab_plate_report, tab_full_report, tab_ion, tab_plate_layout]
+        tab_group_tables = [tab_plate_report, tab_full_report, tab_ion, tab_plate_layout, tab_structure_search]
 
         buttons = [sg.B("Ok", key="-BIO_SETTINGS_OK-"), sg.B("Cancel", key="-CANCEL-"),
                    sg.B("set Default", key="-SETTINGS_DEFAULT-"),
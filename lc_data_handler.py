@@ -138,9 +138,9 @@ class LCMSHandler:
         :type data: dict
         :param batch_dict: A dict with keys as batch/plates values as a list of samples/compounds per batch/plate
         :type batch_dict: dict
-        :param ms_pos_tensor: The tensor for ms_data in positive mode
+        :param ms_pos_tensor: The ms_data in positive mode for each sample, as SparseSpectrum
         :type ms_pos_tensor: dict
-        :param ms_neg_tensor: The tensor for ms_data in negative mode
+        :param ms_neg_tensor: The ms_data in negative mode for each sample, as SparseSpectrum
         :type ms_neg_tensor: dict
         :param mz_delta: The raw ms-data in tensor form
         :type mz_delta: float
@@ -156,27 +156,19 @@ class LCMSHandler:
         :rtype: dict
         """
 
-        temp_ms_pos_tensor = []
-        temp_ms_neg_tensor = []
-        for batch in batch_dict:
-            for sample in batch_dict[batch]:
-                temp_ms_pos_tensor.append(ms_pos_tensor[sample])
-                temp_ms_neg_tensor.append(ms_neg_tensor[sample])
-        temp_ms_pos_tensor = np.array(temp_ms_pos_tensor)
-        temp_ms_neg_tensor = np.array(temp_ms_neg_tensor)
-
+        # The spectra are kept sparse, and each sample is searched in its own spectrum
         if ms_mode:
-            temp_ms_tensor = temp_ms_pos_tensor
+            temp_ms_tensor = ms_pos_tensor
             temp_ms_mode = "pos"
         else:
-            temp_ms_tensor = temp_ms_neg_tensor
+            temp_ms_tensor = ms_neg_tensor
             temp_ms_mode = "neg"
 
         mass_hit = {}
         for batch in batch_dict:
             for sample in batch_dict[batch]:
                 peak_hit = self.lc_ms.mass_search(batch, sample, compound_info[sample]["mass"], mz_delta, temp_ms_mode,
-                                                  uv_peak_information, temp_ms_tensor, mz_threshold, data)
+                                                  uv_peak_information, temp_ms_tensor[sample], mz_threshold, data)
 
                 if not peak_hit:
                     mass_hit[sample] = "No Hits"
@@ -69,8 +69,8 @@ class MassSearching:
         :type ms_mode: str
         :param peak_information: Information from the uv date.
         :type peak_information: dict
-        :param ms_tensor: The raw ms-data in tensor form
-        :type ms_tensor: dict
+        :param ms_tensor: The raw ms-data for the sample, in the ion mode from ms_mode
+        :type ms_tensor: ms_spectrum.SparseSpectrum
         :param mz_threshold: The minimum amount of signal before the data is being recognised as a peak.
         :type mz_threshold: float
         :param data: All the data for all the compounds
@@ -86,9 +86,6 @@ class MassSearching:
         peak_table = peak_information[batch][sample]
         peak_table_t = np.transpose(peak_table)
 
-        for index, _ in enumerate(ms_tensor):
-            ms_data_sample = ms_tensor[index]
-
         # Loop over all peaks in sample s
         for i in peak_table_t:
             # Find UV RT's (converted to seconds)
@@ -111,12 +108,9 @@ class MassSearching:
                 ms_peak_start_rt_index = [i for i, x in enumerate(ms_neg_rt == ms_peak_start_rt) if x][0]
                 ms_peak_end_rt_index = [i for i, x in enumerate(ms_neg_rt == ms_peak_end_rt) if x][0]
 
-            x_temp = ms_data_sample[ms_peak_start_rt_index:ms_peak_end_rt_index+1]
-            x_sum = np.sum(x_temp, axis=0)
-            idx = []
-            for index, _ in enumerate(x_sum):
-                if x_sum[index] > mz_threshold:
-                    idx.append(index)
+            # Sums the scans in the peak, only using the peaks in the sparse data
+            x_sum = ms_tensor.sum_scans(ms_peak_start_rt_index, ms_peak_end_rt_index+1)
+            idx = np.flatnonzero(x_sum > mz_threshold)
 
             mz_max_values = np.array(ms_mz[idx])
             mz_aduct, ions = self.aduct_search(ms_mode)
@@ -44,7 +44,8 @@ class Integration:
         :rtype: pandas.core.frame.DataFrame
         """
 
-        uv_tensor = np.array(uv_tensor)
+        # No copy, so memory mapped data is only read where it is used
+        uv_tensor = np.asarray(uv_tensor)
         uv_threshold = uv_threshold
 
         # Save both slope values and the corresponding retentions times
@@ -0,0 +1,380 @@
+import configparser
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+from rdkit import DataStructs
+
+
+# MinHash values are made with (a * x + b) % _prime, so all values fits in 64 bits without overflow
+_prime = np.uint64((1 << 31) - 1)
+# Max amount of fingerprint elements hashed at the time, to keep the memory use down
+_hash_chunk_elements = 65536
+
+
+def fingerprint_elements(fp):
+    """
+    Gets the elements of a fingerprint, as the set that the MinHash is made from.
+    For bit vectors it is the bits that are set, for sparse fingerprints (atom pairs) it is the keys that are set.
+
+    :param fp: The fingerprint
+    :type fp: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+    :return: The elements
+    :rtype: numpy.ndarray
+    """
+    if isinstance(fp, DataStructs.ExplicitBitVect):
+        return np.array(list(fp.GetOnBits()), dtype=np.uint64)
+    return np.fromiter(fp.GetNonzeroElements().keys(), dtype=np.uint64)
+
+
+def blob_elements(blob, n_bits):
+    """
+    Gets the elements of a fingerprint from the fingerprint store, without making an RDKit fingerprint for bit vectors
+
+    :param blob: The fingerprint in binary formate, see FingerprintStore.to_blob
+    :type blob: bytes
+    :param n_bits: The number of bits for bit vectors, None for other fingerprints
+    :type n_bits: int or None
+    :return: The elements, see fingerprint_elements
+    :rtype: numpy.ndarray
+    """
+    if n_bits is None:
+        return fingerprint_elements(DataStructs.IntSparseIntVect(blob))
+    return np.flatnonzero(np.unpackbits(np.frombuffer(blob, dtype=np.uint8), count=n_bits)).astype(np.uint64)
+
+
+def minhash_signatures(element_lists, a, b):
+    """
+    Makes the MinHash signatures for a list of fingerprints. The chance that two signatures have the same value at a
+    position, is the Jaccard similarity of the two sets of elements, which for bit vectors is the tanimoto score.
+
+    :param element_lists: The elements for each fingerprint, see fingerprint_elements
+    :type element_lists: list
+    :param a: The multiplier for each hash function
+    :type a: numpy.ndarray
+    :param b: The offset for each hash function
+    :type b: numpy.ndarray
+    :return: One row per fingerprint, with the min hash for each hash function
+    :rtype: numpy.ndarray
+    """
+    signatures = np.full((len(element_lists), len(a)), _prime, dtype=np.uint64)
+    lengths = np.array([len(elements) for elements in element_lists], dtype=np.int64)
+    filled = np.flatnonzero(lengths)
+
+    start = 0
+    while start < len(filled):
+        # Takes as many fingerprints as fits in one chunk, but always at least one
+        stop = start + max(1, np.searchsorted(np.cumsum(lengths[filled[start:]]), _hash_chunk_elements, side="right"))
+        rows = filled[start:stop]
+        elements = np.concatenate([element_lists[row] for row in rows]) % _prime
+        offsets = np.concatenate(([0], np.cumsum(lengths[rows])[:-1]))
+        hashes = (elements[:, None] * a + b) % _prime
+        signatures[rows] = np.minimum.reduceat(hashes, offsets, axis=0)
+        start = stop
+    return signatures
+
+
+def band_keys(signatures, bands, rows, mix):
+    """
+    Splits the signatures into bands, and hashes each band to one bucket key.
+    Two fingerprints ends in the same bucket for a band, if all values in the band are the same.
+
+    :param signatures: The MinHash signatures, see minhash_signatures
+    :type signatures: numpy.ndarray
+    :param bands: Amount of bands
+    :type bands: int
+    :param rows: Amount of values per band
+    :type rows: int
+    :param mix: A random odd multiplier for each value in a band
+    :type mix: numpy.ndarray
+    :return: One row per fingerprint, with the bucket key for each band
+    :rtype: numpy.ndarray
+    """
+    with np.errstate(over="ignore"):
+        keys = (signatures.reshape(len(signatures), bands, rows) * mix).sum(axis=2, dtype=np.uint64)
+    # sqlite3 only have signed 64-bit integers
+    return keys.view(np.int64)
+
+
+class LSHIndex:
+    """
+    :param path: The file for the index
+    :type path: str
+    :param bands: Amount of bands per fingerprint. More bands finds more compounds, but gives more false candidates
+    :type bands: int
+    :param rows: Amount of MinHash values per band. More rows gives fewer false candidates, but misses more compounds
+    :type rows: int
+    :param fp_types: The fingerprint types the index is used for. Atom pairs (dice) can be used, but a Dice score is
+        higher than the Jaccard similarity the MinHash is made for, so more compounds are missed close to the threshold
+    :type fp_types: list or tuple
+    :param min_threshold: The index is only used for searches with this threshold or higher
+    :type min_threshold: int or float
+    :param min_compounds: The index is only used when there are this many fingerprints or more. Below that a full
+        search is fast enough
+    :type min_compounds: int
+    :param seed: Seed for the hash functions. The index is made again if it changes
+    :type seed: int
+    """
+    def __init__(self, path, bands=32, rows=4, fp_types=("morgan",), min_threshold=50, min_compounds=100000,
+                 seed=1):
+        self.path = path
+        self.bands = bands
+        self.rows = rows
+        self.fp_types = tuple(fp_types)
+        self.min_threshold = min_threshold
+        self.min_compounds = min_compounds
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _prime, bands * rows, dtype=np.uint64)
+        self.b = rng.integers(0, _prime, bands * rows, dtype=np.uint64)
+        self.mix = rng.integers(1, 1 << 62, rows, dtype=np.uint64) | np.uint64(1)
+        self._set_up()
+
+    def __str__(self):
+        """
+        An approximate index over the fingerprints in the fingerprint store, for finding similar compounds without
+        scoring all compounds.
+        Each fingerprint gets a MinHash signature, that is split into bands, and the compound is saved in a bucket for
+        each band. Compounds that shares a bucket with the search are candidates, and only those are scored by the
+        similarity engine, so the final scores and threshold are exact, but compounds can be missed close to the
+        threshold.
+        The index is saved in its own SQLite file next to the database, and is updated when compounds are added.
+        """
+
+    def _connect(self):
+        """
+        Connects to the index file
+
+        :return: The connection
+        :rtype: sqlite3.Connection
+        """
+        return sqlite3.connect(self.path)
+
+    def _set_up(self):
+        """
+        Makes the tables for the index. If the index was made with other settings, it is emptied, and filled again
+        by sync.
+
+        :return: The index file is ready
+        """
+        settings = {"bands": str(self.bands), "rows": str(self.rows), "seed": str(self.seed)}
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS lsh_settings (name TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS lsh_bucket (fp_type TEXT, fp_params TEXT, band INTEGER, "
+                         "bucket INTEGER, compound_id INTEGER, "
+                         "PRIMARY KEY (fp_type, fp_params, band, bucket, compound_id)) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS lsh_bucket_compound ON lsh_bucket (fp_type, fp_params, "
+                         "compound_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS lsh_compound (fp_type TEXT, fp_params TEXT, compound_id INTEGER, "
+                         "PRIMARY KEY (fp_type, fp_params, compound_id)) WITHOUT ROWID")
+
+            if dict(conn.execute("SELECT name, value FROM lsh_settings")) != settings:
+                conn.execute("DELETE FROM lsh_bucket")
+                conn.execute("DELETE FROM lsh_compound")
+                conn.execute("DELETE FROM lsh_settings")
+                conn.executemany("INSERT INTO lsh_settings VALUES(?, ?)", settings.items())
+
+    def usable(self, methode, threshold):
+        """
+        Checks if the index can be used for a search
+
+        :param methode: What fingerprint type to use
+        :type methode: str
+        :param threshold: Minimum similarity score, from 0 to 100
+        :type threshold: int or float
+        :return: True if the index should be used
+        :rtype: bool
+        """
+        return methode in self.fp_types and threshold >= self.min_threshold
+
+    def count(self, methode, params_key):
+        """
+        Counts the compounds in the index for a fingerprint type
+
+        :param methode: What fingerprint type to use
+        :type methode: str
+        :param params_key: The settings for the fingerprint, see FingerprintStore.params_key
+        :type params_key: str
+        :return: Amount of compounds
+        :rtype: int
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM lsh_compound WHERE fp_type = ? AND fp_params = ?",
+                                [methode, params_key]).fetchone()[0]
+
+    def add(self, methode, params_key, compound_ids, element_lists):
+        """
+        Adds compounds to the index. Compounds that are already in the index are replaced.
+
+        :param methode: What fingerprint type to use
+        :type methode: str
+        :param params_key: The settings for the fingerprint, see FingerprintStore.params_key
+        :type params_key: str
+        :param compound_ids: The compound_ids
+        :type compound_ids: list
+        :param element_lists: The elements of the fingerprint for each compound, see fingerprint_elements
+        :type element_lists: list
+        :return: Amount of compounds added
+        :rtype: int
+        """
+        if not compound_ids:
+            return 0
+        keys = band_keys(minhash_signatures(element_lists, self.a, self.b), self.bands, self.rows, self.mix)
+        bands = range(self.bands)
+        with closing(self._connect()) as conn, conn:
+            self._remove(conn, methode, params_key, compound_ids)
+            conn.executemany("INSERT INTO lsh_compound VALUES(?, ?, ?)",
+                             ((methode, params_key, compound_id) for compound_id in compound_ids))
+            conn.executemany("INSERT OR IGNORE INTO lsh_bucket VALUES(?, ?, ?, ?, ?)",
+                             ((methode, params_key, band, int(bucket), compound_id)
+                              for compound_id, compound_keys in zip(compound_ids, keys.tolist())
+                              for band, bucket in zip(bands, compound_keys)))
+        return len(compound_ids)
+
+    @staticmethod
+    def _remove(conn, methode, params_key, compound_ids):
+        """
+        Removes compounds from the index
+
+        :param conn: Connection to the index file
+        :type conn: sqlite3.Connection
+        :param methode: What fingerprint type to use
+        :type methode: str
+        :param params_key: The settings for the fingerprint, see FingerprintStore.params_key
+        :type params_key: str
+        :param compound_ids: The compound_ids
+        :type compound_ids: list or set
+        :return: The compounds are removed
+        """
+        rows = [(methode, params_key, compound_id) for compound_id in compound_ids]
+        conn.executemany("DELETE FROM lsh_bucket WHERE fp_type = ? AND fp_params = ? AND compound_id = ?", rows)
+        conn.executemany("DELETE FROM lsh_compound WHERE fp_type = ? AND fp_params = ? AND compound_id = ?", rows)
+
+    def add_from_store(self, fp_store, methode, params=None, compound_ids=None):
+        """
+        Adds compounds to the index, with the fingerprints from the fingerprint store
+
+        :param fp_store: The fingerprint store
+        :type fp_store: fingerprint_store.FingerprintStore
+        :param methode: What fingerprint type to use
+        :type methode: str
+        :param params: The settings for the fingerprint. Default settings are used for the missing ones
+        :type params: dict or None
+        :param compound_ids: The compounds to add. All compounds in the fingerprint store if None
+        :type compound_ids: list or set or None
+        :return: Amount of compounds added
+        :rtype: int
+        """
+        params_key = fp_store.params_key(fp_store.co.fingerprint_params(methode, params))
+        search_limiter = {
+            "fp_type": {"value": methode, "operator": "=", "target_column": "fp_type"},
+            "fp_params": {"value": params_key, "operator": "=", "target_column": "fp_params"},
+        }
+        if compound_ids is not None:
+            if not compound_ids:
+                return 0
+            search_limiter["compound_id"] = {"value": list(compound_ids), "operator": "IN",
+                                             "target_column": "compound_id"}
+
+        added = 0
+        batch_ids = []
+        batch_elements = []
+        for row in fp_store.dbf.stream_table_data(fp_store.table, search_limiter,
+                                                  ["compound_id", "n_bits", "fingerprint"]):
+            batch_ids.append(row["compound_id"])
+            batch_elements.append(blob_elements(row["fingerprint"], row["n_bits"]))
+            if len(batch_ids) == fp_store.dbf.chunk_size:
+                added += self.add(methode, params_key, batch_ids, batch_elements)
+                batch_ids = []
+                batch_elements = []
+        return added + self.add(methode, params_key, batch_ids, batch_elements)
+
+    def sync(self, fp_store, methode, params=None):
+        """
+        Makes the index match the fingerprint store, if the amount of compounds are not the same.
+        Compounds that are missing are added, and compounds that are no longer in the fingerprint store are removed.
+
+        :param fp_store: The fingerprint store
+        :type fp_store: fingerprint_store.FingerprintStore
+        :param methode: What fingerprint type to use
+        :type methode: str
+        :param params: The settings for the fingerprint. Default settings are used for the missing ones
+        :type params: dict or None
+        :return: Amount of compounds added
+        :rtype: int
+        """
+        params_key = fp_store.params_key(fp_store.co.fingerprint_params(methode, params))
+        stored = fp_store.dbf.statistics.count(fp_store.table, {
+            "fp_type": {"value": methode, "operator": "=", "target_column": "fp_type"},
+            "fp_params": {"value": params_key, "operator": "=", "target_column": "fp_params"},
+        })
+        if stored == self.count(methode, params_key):
+            return 0
+
+        stored_ids = {row[0] for row in fp_store.dbf.fetch(
+            f"SELECT compound_id FROM {fp_store.table} WHERE fp_type = ? AND fp_params = ?", [methode, params_key])}
+        with closing(self._connect()) as conn, conn:
+            indexed_ids = {row[0] for row in conn.execute(
+                "SELECT compound_id FROM lsh_compound WHERE fp_type = ? AND fp_params = ?", [methode, params_key])}
+            self._remove(conn, methode, params_key, indexed_ids - stored_ids)
+        return self.add_from_store(fp_store, methode, params, stored_ids - indexed_ids)
+
+    def query(self, fp, methode, params_key):
+        """
+        Finds the candidates for a search. The candidates are the compounds that shares at least one bucket with the
+        fingerprint.
+
+        :param fp: The fingerprint for the search
+        :type fp: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        :param methode: What fingerprint type to use
+        :type methode: str
+        :param params_key: The settings for the fingerprint, see FingerprintStore.params_key
+        :type params_key: str
+        :return: The compound_ids for the candidates
+        :rtype: list
+        """
+        signature = minhash_signatures([fingerprint_elements(fp)], self.a, self.b)
+        keys = band_keys(signature, self.bands, self.rows, self.mix)[0].tolist()
+        data = " UNION ".join(["SELECT compound_id FROM lsh_bucket WHERE fp_type = ? AND fp_params = ? AND band = ? "
+                               "AND bucket = ?"] * self.bands)
+        params = []
+        for band, bucket in enumerate(keys):
+            params += [methode, params_key, band, bucket]
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute(data, params)]
+
+
+def index_from_config(config):
+    """
+    Makes the LSH index from the settings in the config file
+
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :return: The index, or None if it is turned off
+    :rtype: LSHIndex or None
+    """
+    if not config.getboolean("Structure_search", "lsh_index", fallback=False):
+        return None
+    fp_types = [fp_type.strip() for fp_type in
+                config.get("Structure_search", "lsh_types", fallback="morgan").split(",") if fp_type.strip()]
+    return LSHIndex(f"{config['Database']['database']}.lsh",
+                    config.getint("Structure_search", "lsh_bands", fallback=32),
+                    config.getint("Structure_search", "lsh_rows", fallback=4),
+                    fp_types,
+                    config.getfloat("Structure_search", "lsh_min_threshold", fallback=50),
+                    config.getint("Structure_search", "lsh_min_compounds", fallback=100000))
+
+
+if __name__ == "__main__":
+    from database_handler import DataBaseFunctions
+    from fingerprint_store import FingerprintStore
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    dbf = DataBaseFunctions(config)
+    fps = FingerprintStore(dbf, config["Tables"]["compound_fingerprint_table"], config["Tables"]["compound_main"])
+    lsh = index_from_config(config) or LSHIndex(f"{config['Database']['database']}.lsh")
+    with dbf:
+        for fp_type in lsh.fp_types:
+            print(fp_type, lsh.sync(fps, fp_type))
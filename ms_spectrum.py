@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+
+class SparseSpectrum:
+    """
+    :param indptr: Where the peaks for each scan starts in indices and values. Scan n has the peaks from indptr[n] to
+        indptr[n + 1]
+    :type indptr: np.ndarray
+    :param indices: The column in mz_values for each peak, sorted per scan
+    :type indices: np.ndarray
+    :param values: The intensity for each peak
+    :type values: np.ndarray
+    :param retention_times: The retention time for each scan
+    :type retention_times: list or np.ndarray
+    :param mz_values: The m/z-values for the columns
+    :type mz_values: np.ndarray
+    """
+    def __init__(self, indptr, indices, values, retention_times, mz_values):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.index = pd.Index(np.asarray(retention_times, dtype=np.float64))
+        self.columns = pd.Index(np.asarray(mz_values, dtype=np.float64))
+
+    def __str__(self):
+        """
+        MS data for one sample in one ion mode, with only the peaks saved, per scan (CSR layout), instead of a dense
+        matrix with a column for every m/z-value.
+        Has index (retention times) and columns (m/z-values) like the DataFrame it replaces, and is only made dense
+        when it is plotted.
+        """
+
+    def __repr__(self):
+        return f"SparseSpectrum({len(self)} scans, {self.nnz} peaks)"
+
+    def __len__(self):
+        return len(self.index)
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.toarray()
+        if dtype is not None:
+            return dense.astype(dtype)
+        return dense
+
+    @classmethod
+    def from_peaks(cls, rows, columns, values, retention_times, mz_values):
+        """
+        Makes the spectrum from a list of peaks, in the order they are in the file.
+        If a scan has the same m/z-value more than once, the last one is used, the same as when writing the peaks
+        into a dense matrix.
+
+        :param rows: The scan for each peak
+        :type rows: np.ndarray
+        :param columns: The column in mz_values for each peak
+        :type columns: np.ndarray
+        :param values: The intensity for each peak
+        :type values: np.ndarray
+        :param retention_times: The retention time for each scan
+        :type retention_times: list
+        :param mz_values: The m/z-values for the columns
+        :type mz_values: np.ndarray
+        :return: The spectrum
+        :rtype: SparseSpectrum
+        """
+        keys = np.asarray(rows, dtype=np.int64) * len(mz_values) + columns
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        order = order[last]
+
+        peak_counts = np.bincount(np.asarray(rows)[order], minlength=len(retention_times))
+        indptr = np.concatenate(([0], np.cumsum(peak_counts)))
+        return cls(indptr, np.asarray(columns)[order], np.asarray(values)[order], retention_times, mz_values)
+
+    @classmethod
+    def from_frame(cls, df_ms):
+        """
+        Makes the spectrum from a dense DataFrame, as the MS data was saved before it was kept sparse
+
+        :param df_ms: The MS intensities, with m/z-values (columns) and retention times (rows)
+        :type df_ms: pd.DataFrame
+        :return: The spectrum
+        :rtype: SparseSpectrum
+        """
+        dense = df_ms.to_numpy(dtype=np.float64)
+        rows, columns = np.nonzero(dense)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(dense)))))
+        return cls(indptr, columns, dense[rows, columns], df_ms.index, df_ms.columns)
+
+    @property
+    def shape(self):
+        """
+        :return: Amount of scans and m/z-values, the same as the shape of the dense matrix
+        :rtype: (int, int)
+        """
+        return len(self.index), len(self.columns)
+
+    @property
+    def nnz(self):
+        """
+        :return: Amount of peaks
+        :rtype: int
+        """
+        return len(self.values)
+
+    def _scan_rows(self):
+        """
+        :return: The scan for each peak
+        :rtype: np.ndarray
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def toarray(self):
+        """
+        Makes the dense matrix, with a row per scan and a column per m/z-value
+
+        :return: The intensities
+        :rtype: np.ndarray
+        """
+        dense = np.zeros(self.shape)
+        dense[self._scan_rows(), self.indices] = self.values
+        return dense
+
+    def to_frame(self):
+        """
+        Makes the same DataFrame as the data was read into before the data was kept sparse
+
+        :return: The MS intensities, with m/z-values (columns) and retention times (rows)
+        :rtype: pd.DataFrame
+        """
+        df_ms = pd.DataFrame(self.toarray())
+        df_ms.columns = self.columns
+        df_ms.index = self.index
+        return df_ms
+
+    def scan(self, scan):
+        """
+        Gets the spectrum for one scan
+
+        :param scan: The row number of the scan
+        :type scan: int
+        :return: The intensity for each m/z-value
+        :rtype: np.ndarray
+        """
+        start, end = self.indptr[scan], self.indptr[scan + 1]
+        spectrum = np.zeros(len(self.columns))
+        spectrum[self.indices[start:end]] = self.values[start:end]
+        return spectrum
+
+    def sum_scans(self, start=0, stop=None):
+        """
+        Sums the scans from start to stop, per m/z-value. Same as np.sum(dense[start:stop], axis=0)
+
+        :param start: The first scan
+        :type start: int
+        :param stop: The scan after the last scan. The last scan if None
+        :type stop: int or None
+        :return: The summed intensity for each m/z-value
+        :rtype: np.ndarray
+        """
+        scans = np.arange(len(self))[start:stop]
+        if not len(scans):
+            return np.zeros(len(self.columns))
+        first, last = self.indptr[scans[0]], self.indptr[scans[-1] + 1]
+        return np.bincount(self.indices[first:last], weights=self.values[first:last], minlength=len(self.columns))
+
+    def sum_mz(self, start=0, stop=None):
+        """
+        Sums the m/z-values from column start to stop, per scan. Same as np.sum(dense[:, start:stop], axis=1)
+
+        :param start: The first column
+        :type start: int
+        :param stop: The column after the last column. All the columns after start if None
+        :type stop: int or None
+        :return: The summed intensity for each scan
+        :rtype: np.ndarray
+        """
+        stop = len(self.columns) if stop is None else stop
+        inside = (self.indices >= start) & (self.indices < stop)
+        return np.bincount(self._scan_rows()[inside], weights=self.values[inside], minlength=len(self))
+
+    def mz_trace(self, column):
+        """
+        Gets the intensity for one m/z-value in all the scans. Same as dense[:, column]
+
+        :param column: The column for the m/z-value
+        :type column: int
+        :return: The intensity for each scan
+        :rtype: np.ndarray
+        """
+        return self.sum_mz(column, column + 1)
@@ -0,0 +1,118 @@
+import threading
+
+
+# The origins per database, shared by all OriginResolvers, so the GUI and the imports use the same cache
+_origin_cache = {}
+_cache_lock = threading.Lock()
+
+
+class OriginResolver:
+    """
+    :param dbf: The database functions
+    :type dbf: database_handler.DataBaseFunctions
+    :param table: The table with the origins
+    :type table: str
+    """
+    def __init__(self, dbf, table="origin"):
+        self.dbf = dbf
+        self.table = table
+
+    def __str__(self):
+        """
+        Keeps the origin table in memory, to find the ac_id for an origin, and the origin for an ac_id, without
+        searching the database for every compound.
+        The table is loaded with one search, and loaded again if the amount of rows in the table changes.
+        New origins are added in one transaction, and gets their ac_id from the database.
+        """
+
+    def _origins(self):
+        """
+        Gets the origins from the cache, or loads them from the database if the cache is missing or out of date
+
+        :return: A dict with (ac, origin) as keys and ac_id as values, and a dict with ac_id as keys and (ac, origin)
+            as values
+        :rtype: (dict, dict)
+        """
+        cache_key = (self.dbf.database, self.table)
+        row_count = self.dbf.statistics.count(self.table)
+        with _cache_lock:
+            cached = _origin_cache.get(cache_key)
+        if cached and len(cached[1]) == row_count:
+            return cached
+
+        by_origin = {}
+        by_id = {}
+        for ac_id, ac, origin in self.dbf.fetch(f"SELECT ac_id, ac, origin FROM {self.table}"):
+            by_origin[(ac, origin)] = ac_id
+            by_id[ac_id] = (ac, origin)
+
+        with _cache_lock:
+            _origin_cache[cache_key] = (by_origin, by_id)
+        return by_origin, by_id
+
+    def resolve(self, origins):
+        """
+        Finds the ac_id for each origin. Origins that are not in the database are added, all in one transaction.
+
+        :param origins: The (ac, origin) pairs, ex: ("Commercial", "Enamine")
+        :type origins: iter
+        :return: A dict with (ac, origin) as keys and ac_id as values
+        :rtype: dict
+        """
+        origins = set(origins)
+        by_origin, by_id = self._origins()
+        missing = [origin for origin in origins if origin not in by_origin]
+
+        if missing:
+            added = {}
+            with self.dbf.transaction() as conn:
+                for ac, origin in missing:
+                    cursor = conn.execute(f"INSERT INTO {self.table} (ac, origin) VALUES(?, ?)", [ac, origin])
+                    added[(ac, origin)] = cursor.lastrowid
+            self.dbf.statistics.invalidate(self.table)
+
+            with _cache_lock:
+                by_origin.update(added)
+                by_id.update({ac_id: origin for origin, ac_id in added.items()})
+
+        return {origin: by_origin[origin] for origin in origins}
+
+    def ac_id(self, ac, origin):
+        """
+        Finds the ac_id for one origin. The origin is added if it is not in the database
+
+        :param ac: Academic or Commercial
+        :type ac: str
+        :param origin: The name of the vendor or academic center
+        :type origin: str
+        :return: The ac_id
+        :rtype: int
+        """
+        return self.resolve([(ac, origin)])[(ac, origin)]
+
+    def origin(self, ac_id):
+        """
+        Finds the origin for an ac_id
+
+        :param ac_id: The ac_id
+        :type ac_id: int
+        :return: Academic or Commercial, and the name of the origin. (None, None) if the ac_id is not in the database
+        :rtype: (str, str)
+        """
+        _, by_id = self._origins()
+        return by_id.get(ac_id, (None, None))
+
+    def origins(self, ac=None):
+        """
+        Gets the names of the origins
+
+        :param ac: Only the origins for these, ex: ["Academic", "Commercial"]. All origins if None
+        :type ac: list or None
+        :return: The names of the origins, sorted
+        :rtype: list
+        """
+        by_origin, _ = self._origins()
+        if ac is not None:
+            ac = {value.casefold() for value in ac}
+        return sorted({origin for origin_ac, origin in by_origin
+                       if ac is None or (origin_ac or "").casefold() in ac})
@@ -26,6 +26,23 @@ def guard(file_path, data):
         return True
 
 
+def df_iterator(file_path):
+    """
+    Reads the data in the file, one dump at the time, without keeping the data that have been read in memory
+
+    :param file_path: The file with the data
+    :type file_path: str
+    :return: The data for each dump, in the order they were added to the file
+    :rtype: dict
+    """
+    with open(file_path, "rb") as handle:
+        while True:
+            try:
+                yield pickle.load(handle)
+            except EOFError:
+                return
+
+
 def df_reader(file_path, samples):
     with open(file_path, "rb") as handle:
 
@@ -0,0 +1,249 @@
+from itertools import count
+
+
+_temp_table_counter = count()
+
+
+class QueryBuilder:
+    """
+    :param dbf: The database functions, used for making temp tables for large "IN" searches
+    :type dbf: database_handler.DataBaseFunctions
+    :param in_list_limit: Max amount of values in an "IN" search before the values are put in a temp table instead
+    :type in_list_limit: int
+    """
+    operators = ["=", "!=", "<>", "<", ">", "<=", ">=", "IN", "LIKE", "BETWEEN", "EXISTS"]
+
+    def __init__(self, dbf, in_list_limit=100):
+        self.dbf = dbf
+        self.in_list_limit = in_list_limit
+        self.temp_tables = []
+
+    def __str__(self):
+        """
+        Writes SQL for the search_limiter dicts. All values are added as "?" placeholders with a list of parameters,
+        so sqlite3 can reuse the statements, instead of values being written into the SQL.
+
+        The search_limiter dict have the search name as key, and a dict as value with:
+            - "value": The value to search for. A list for "IN", and [low, high] for "BETWEEN", where one of them can
+              be None for a search with only a lower or upper limit
+            - "operator": How to compare. The value is on the left side, ex: value < column
+            - "target_column": The column to compare with
+            - "use": If the search should be used. Defaults to True
+            - "table": Only for "EXISTS". The table to look in, where "value" is a search_limiter for that table and
+              "target_column" the column that is the same in both tables
+        """
+
+    def _in_values(self, values):
+        """
+        Makes the SQL for an "IN" search. Large lists are put in a temp table, to keep the SQL short and the same for
+        every search.
+
+        :param values: The values to search for
+        :type values: list or set
+        :return: The SQL to go after "IN", and the parameters for it
+        :rtype: (str, list)
+        """
+        values = list(values)
+        if len(values) <= self.in_list_limit:
+            return f"({self.dbf._add_place_holders(values)})", values
+
+        table_name = f"query_values_{next(_temp_table_counter)}"
+        with self.dbf.transaction() as conn:
+            conn.execute(f"CREATE TEMP TABLE {table_name} (value PRIMARY KEY) WITHOUT ROWID")
+            conn.executemany(f"INSERT OR IGNORE INTO temp.{table_name} VALUES(?)", [[value] for value in values])
+        self.temp_tables.append(table_name)
+        return f"(SELECT value FROM temp.{table_name})", []
+
+    @staticmethod
+    def _between(column, values):
+        """
+        Makes the SQL for a "BETWEEN" search. If one of the limits is missing, only the other one is used
+
+        :param column: The column to compare with
+        :type column: str
+        :param values: The lower and upper limit. Both limits are included
+        :type values: list or tuple
+        :return: The condition and the parameters for it, or None if both limits are missing
+        :rtype: (str, list) or None
+        """
+        low, high = [None if value == "" else value for value in values]
+        if low is not None and high is not None:
+            return f"{column} BETWEEN ? AND ?", [low, high]
+        if low is not None:
+            return f"? <= {column}", [low]
+        if high is not None:
+            return f"? >= {column}", [high]
+        return None
+
+    def _exists(self, column, search_values):
+        """
+        Makes the SQL for an "EXISTS" search, that only finds rows that have a row in another table that fits the
+        search_limiter for that table
+
+        :param column: The column to compare with, with the table name in front
+        :type column: str
+        :param search_values: The search, with the table to look in under "table"
+        :type search_values: dict
+        :return: The condition and the parameters for it
+        :rtype: (str, list)
+        """
+        exists_table = search_values["table"]
+        conditions, params = self.conditions(search_values["value"], exists_table)
+        conditions.insert(0, f"{exists_table}.{search_values['target_column']} = {column}")
+        return f"EXISTS (SELECT 1 FROM {exists_table} {self._where(conditions)})", params
+
+    def search_tables(self, search_limiter):
+        """
+        Finds the other tables a search_limiter looks in, with "EXISTS" searches
+
+        :param search_limiter: A dict over values to search for in the db
+        :type search_limiter: dict or None
+        :return: The table names
+        :rtype: list
+        """
+        tables = []
+        for search_values in (search_limiter or {}).values():
+            if search_values.get("operator") == "EXISTS" and search_values.get("use", True):
+                tables.append(search_values["table"])
+                tables += self.search_tables(search_values["value"])
+        return tables
+
+    def conditions(self, search_limiter, join_table=None, outer_table=None):
+        """
+        Makes a list of conditions from a search_limiter
+
+        :param search_limiter: A dict over values to search for in the db
+        :type search_limiter: dict or None
+        :param join_table: The table name to put in front of the column names, when tables are joined
+        :type join_table: str or None
+        :param outer_table: The table that is searched, when it is not joined. Used for "EXISTS" searches, where the
+            column needs the table name in front
+        :type outer_table: str or None
+        :return: A list of conditions and the parameters for them
+        :rtype: (list, list)
+        """
+        if join_table:
+            table = f"{join_table}."
+        else:
+            table = ""
+
+        conditions = []
+        params = []
+        if not search_limiter:
+            return conditions, params
+
+        for search in search_limiter:
+            search_values = search_limiter[search]
+            if not search_values.get("use", True) or not search_values["value"]:
+                continue
+
+            operator = search_values["operator"]
+            if operator not in self.operators:
+                raise ValueError(f"Unknown operator: {operator}")
+
+            column = f"{table}{search_values['target_column']}"
+            if operator == "IN":
+                in_sql, in_params = self._in_values(search_values["value"])
+                conditions.append(f"{column} IN {in_sql}")
+                params += in_params
+            elif operator == "EXISTS":
+                exists = self._exists(f"{join_table or outer_table}.{search_values['target_column']}",
+                                      search_values)
+                conditions.append(exists[0])
+                params += exists[1]
+            elif operator == "BETWEEN":
+                between = self._between(column, search_values["value"])
+                if between is not None:
+                    conditions.append(between[0])
+                    params += between[1]
+            else:
+                conditions.append(f"? {operator} {column}")
+                params.append(search_values["value"])
+
+        return conditions, params
+
+    @staticmethod
+    def _where(conditions):
+        """
+        Makes the WHERE part of the SQL
+
+        :param conditions: List of conditions
+        :type conditions: list
+        :return: The WHERE clause, or an empty string if there are no conditions
+        :rtype: str
+        """
+        if conditions:
+            return "WHERE " + " AND ".join(conditions)
+        return ""
+
+    def where_clause(self, search_limiter, join_table=None, outer_table=None):
+        """
+        Makes the WHERE clause for a search_limiter
+
+        :param search_limiter: A dict over values to search for in the db
+        :type search_limiter: dict or None
+        :param join_table: The table name to put in front of the column names, when tables are joined
+        :type join_table: str or None
+        :param outer_table: The table that is searched, when it is not joined, see conditions
+        :type outer_table: str or None
+        :return: The WHERE clause and the parameters for it
+        :rtype: (str, list)
+        """
+        conditions, params = self.conditions(search_limiter, join_table, outer_table)
+        return self._where(conditions), params
+
+    def select(self, table, search_limiter, columns=None):
+        """
+        Makes a SELECT for a single table
+
+        :param table: The table to get data from
+        :type table: str
+        :param search_limiter: A dict over values to search for in the db
+        :type search_limiter: dict or None
+        :param columns: The columns to get. All columns if None
+        :type columns: list or None
+        :return: The SQL and the parameters for it
+        :rtype: (str, list)
+        """
+        selected = ", ".join(columns) if columns else "*"
+        where, params = self.where_clause(search_limiter, outer_table=table)
+        return f"SELECT {selected} FROM {table} {where}".strip(), params
+
+    def join(self, search_limiter, columns=None):
+        """
+        Makes a SELECT that joins two tables. The search_limiter have the two tables as the first two keys, with a
+        search_limiter for each table, and "shared_data" for the column the tables are joined on.
+
+        :param search_limiter: A dict with a search_limiter per table
+        :type search_limiter: dict
+        :param columns: The columns to get. All columns if None
+        :type columns: list or None
+        :return: The SQL and the parameters for it
+        :rtype: (str, list)
+        """
+        tables = [table for table in search_limiter if table != "shared_data"][:2]
+        shared_data = search_limiter["shared_data"]
+        conditions = []
+        params = []
+        for table in tables:
+            table_conditions, table_params = self.conditions(search_limiter[table], table)
+            conditions += table_conditions
+            params += table_params
+
+        selected = ", ".join(columns) if columns else "*"
+        table_1, table_2 = tables
+        sql = f"SELECT {selected} FROM {table_1} JOIN {table_2} ON {table_1}.{shared_data} = {table_2}.{shared_data} " \
+              f"{self._where(conditions)}"
+        return sql.strip(), params
+
+    def drop_temp_tables(self):
+        """
+        Removes the temp tables made for "IN" searches. Should be called when the search is done.
+
+        :return: The temp tables are removed
+        """
+        if self.temp_tables:
+            with self.dbf.transaction() as conn:
+                for table_name in self.temp_tables:
+                    conn.execute(f"DROP TABLE IF EXISTS temp.{table_name}")
+            self.temp_tables = []
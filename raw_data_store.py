@@ -0,0 +1,526 @@
+import configparser
+import os
+import sqlite3
+import struct
+import tempfile
+import zipfile
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from ms_spectrum import SparseSpectrum
+from pickle_handler import df_iterator
+
+
+# The arrays saved for each MS spectrum, in the order SparseSpectrum takes them
+_spectrum_arrays = ["indptr", "indices", "values", "retention_times", "mz_values"]
+
+# Readers for the header of each .npy version
+_npy_headers = {(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}
+
+raw_data_index_table = """ CREATE TABLE IF NOT EXISTS raw_data(
+            raw_key TEXT PRIMARY KEY,
+            sample TEXT,
+            batch TEXT,
+            file_name TEXT NOT NULL
+            ); """
+
+index_raw_data_batch = """ CREATE INDEX IF NOT EXISTS idx_raw_data_batch ON raw_data(batch); """
+
+
+def raw_key(sample, batch):
+    """
+    Makes the key for the raw data for a sample. The same key as the sample had in the pickle files
+
+    :param sample: The sample name
+    :type sample: str
+    :param batch: The batch name
+    :type batch: str or None
+    :return: The key
+    :rtype: str
+    """
+    return f"{sample}_{batch}"
+
+
+def _memmap_arrays(path):
+    """
+    Memory maps the arrays in an .npz file, so only the parts of the arrays that are used are read from the disk.
+    np.load can not memory map an .npz file, but arrays that are saved without compression are a normal .npy file
+    inside the zip file, that can be mapped from where it starts.
+    Arrays that are compressed are not read, and are None.
+
+    :param path: The .npz file
+    :type path: str
+    :return: A dict with the array names as keys and the memory mapped arrays as values
+    :rtype: dict
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename.removesuffix(".npy")
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = None
+                continue
+
+            # The data starts after the local header of the zip file, and the header of the .npy file
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version not in _npy_headers:
+                arrays[name] = None
+                continue
+            shape, fortran_order, dtype = _npy_headers[version](f)
+
+            if dtype.hasobject or not np.prod(shape):
+                arrays[name] = None
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran_order else "C")
+    return arrays
+
+
+class RawSample:
+    """
+    :param path: The file for the sample in the raw data store
+    :type path: str
+    """
+    def __init__(self, path):
+        self.path = path
+        self._arrays = None
+
+    def __str__(self):
+        """
+        Handle for the raw data for one sample, that reads nothing until the data is used.
+        Works as the data dict for the sample, so sample["uv"] is the UV DataFrame and sample["ms_pos"] and
+        sample["ms_neg"] are the SparseSpectrum for each ion mode. The arrays are memory mapped, so plots and
+        integration only reads the part of the data they use, and it is left to the OS to keep it in memory or not.
+        """
+
+    def __getitem__(self, part):
+        """
+        Gets the UV or MS data for the sample
+
+        :param part: "uv", "ms_pos" or "ms_neg"
+        :type part: str
+        :return: The UV data as a DataFrame, or the MS data as a SparseSpectrum. Data that is missing is an empty
+            string, the same as in the data from the data miner
+        :rtype: pd.DataFrame or SparseSpectrum or str
+        """
+        if part not in ("uv", "ms_pos", "ms_neg"):
+            raise KeyError(part)
+        if self._arrays is None:
+            self._arrays = _memmap_arrays(self.path)
+
+        names = [part, f"{part}_retention_times", f"{part}_wavelengths"] if part == "uv" else \
+            [f"{part}_{name}" for name in _spectrum_arrays]
+        if names[0] not in self._arrays:
+            return ""
+        if any(self._arrays[name] is None for name in names):
+            # Compressed arrays can not be mapped, and are read from the file when they are used
+            with np.load(self.path, allow_pickle=False) as arrays:
+                return RawDataStore.data_part(arrays, part)
+        return RawDataStore.data_part(self._arrays, part)
+
+    def keys(self):
+        """
+        :return: The parts of the data for the sample
+        :rtype: list
+        """
+        return ["uv", "ms_pos", "ms_neg"]
+
+
+class RawDataStore:
+    """
+    :param folder: The folder for the raw data files and the index
+    :type folder: str
+    :param compress: If the files are compressed. Files that are not compressed can be memory mapped
+    :type compress: bool
+    """
+    def __init__(self, folder, compress=False):
+        self.folder = folder
+        self.compress = compress
+        self.index_file = os.path.join(folder, "raw_data_index.db")
+
+    def __str__(self):
+        """
+        Saves the UV and MS data for each sample in its own .npz file, with the arrays for the UV data and the sparse
+        MS spectra, instead of adding all the samples to one pickle file.
+        A SQLite index in the same folder has the file for each sample, so a sample, or all the samples in a batch, is
+        found with one look up, without reading the data for any other sample.
+        """
+
+    def _connect(self):
+        """
+        Connects to the index, and makes the table if it is missing
+
+        :return: Connection to the index
+        :rtype: sqlite3.Connection
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        conn = sqlite3.connect(self.index_file)
+        conn.execute(raw_data_index_table)
+        conn.execute(index_raw_data_batch)
+        return conn
+
+    def _fetch(self, data, params=()):
+        """
+        Searches the index
+
+        :param data: The search
+        :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: tuple or list
+        :return: The rows
+        :rtype: list
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute(data, params).fetchall()
+
+    def _path(self, file_name):
+        """
+        :param file_name: The file name from the index, relative to the folder
+        :type file_name: str
+        :return: The path to the file
+        :rtype: str
+        """
+        return os.path.join(self.folder, file_name)
+
+    @staticmethod
+    def _arrays(data):
+        """
+        Splits the data for a sample into the arrays that are saved in the file.
+        MS data that is still a DataFrame is made sparse, and data that is missing is left out.
+
+        :param data: The data for the sample, with "uv", "ms_pos" and "ms_neg"
+        :type data: dict
+        :return: The arrays, with the name they are saved under
+        :rtype: dict
+        """
+        arrays = {}
+        if isinstance(data.get("uv"), pd.DataFrame):
+            arrays["uv"] = data["uv"].to_numpy()
+            arrays["uv_retention_times"] = data["uv"].index.to_numpy(dtype=np.float64)
+            arrays["uv_wavelengths"] = data["uv"].columns.to_numpy(dtype=np.float64)
+
+        for ms_mode in ["ms_pos", "ms_neg"]:
+            spectrum = data.get(ms_mode)
+            if isinstance(spectrum, pd.DataFrame):
+                spectrum = SparseSpectrum.from_frame(spectrum)
+            if isinstance(spectrum, SparseSpectrum):
+                arrays[f"{ms_mode}_indptr"] = spectrum.indptr
+                arrays[f"{ms_mode}_indices"] = spectrum.indices
+                arrays[f"{ms_mode}_values"] = spectrum.values
+                arrays[f"{ms_mode}_retention_times"] = spectrum.index.to_numpy()
+                arrays[f"{ms_mode}_mz_values"] = spectrum.columns.to_numpy()
+        return arrays
+
+    @staticmethod
+    def data_part(arrays, part):
+        """
+        Puts the arrays from a file back together, as the UV or MS data for the sample.
+        The arrays are used as they are, so memory mapped arrays stays memory mapped.
+
+        :param arrays: The arrays from the file
+        :type arrays: np.lib.npyio.NpzFile or dict
+        :param part: "uv", "ms_pos" or "ms_neg"
+        :type part: str
+        :return: The UV data as a DataFrame, or the MS data as a SparseSpectrum. Data that is missing is an empty
+            string, the same as in the data from the data miner
+        :rtype: pd.DataFrame or SparseSpectrum or str
+        """
+        if part == "uv":
+            if "uv" not in arrays:
+                return ""
+            return pd.DataFrame(arrays["uv"], columns=arrays["uv_wavelengths"], index=arrays["uv_retention_times"],
+                                copy=False)
+        if f"{part}_indptr" not in arrays:
+            return ""
+        return SparseSpectrum(*[arrays[f"{part}_{name}"] for name in _spectrum_arrays])
+
+    def _data(self, arrays):
+        """
+        Puts the arrays from a file back together, as the data for the sample
+
+        :param arrays: The arrays from the file
+        :type arrays: np.lib.npyio.NpzFile
+        :return: The data for the sample, with "uv", "ms_pos" and "ms_neg"
+        :rtype: dict
+        """
+        return {part: self.data_part(arrays, part) for part in ["uv", "ms_pos", "ms_neg"]}
+
+    def _save(self, key, batch, arrays):
+        """
+        Saves the arrays for a sample in a new file. The file gets a new name every time, so a file that is memory
+        mapped by a RawSample is never written over, as Windows does not allow that. The index is pointed to the new
+        file when it is written, so a sample is never half written.
+
+        :param key: The key for the sample
+        :type key: str
+        :param batch: The batch name
+        :type batch: str or None
+        :param arrays: The arrays, with the name they are saved under
+        :type arrays: dict
+        :return: The file name, relative to the folder
+        :rtype: str
+        """
+        folder = batch or "no_batch"
+        os.makedirs(self._path(folder), exist_ok=True)
+        file_handle, path = tempfile.mkstemp(dir=self._path(folder), prefix=f"{key}_", suffix=".npz")
+        try:
+            with os.fdopen(file_handle, "wb") as f:
+                if self.compress:
+                    np.savez_compressed(f, **arrays)
+                else:
+                    np.savez(f, **arrays)
+        except BaseException:
+            os.remove(path)
+            raise
+        return os.path.join(folder, os.path.basename(path))
+
+    @staticmethod
+    def _remove(paths):
+        """
+        Removes files that are not used any more. Files that are still open, as a RawSample can have them memory
+        mapped, can not be removed on Windows. They are left, and are removed by clean_up later.
+
+        :param paths: The files
+        :type paths: iter
+        :return: Amount of files removed
+        :rtype: int
+        """
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except (FileNotFoundError, PermissionError):
+                continue
+            removed += 1
+        return removed
+
+    def clean_up(self):
+        """
+        Removes the files that are not in the index, from samples that were written again while the old file was open
+
+        :return: Amount of files removed
+        :rtype: int
+        """
+        used = {os.path.normcase(os.path.normpath(self._path(file_name)))
+                for file_name, in self._fetch("SELECT file_name FROM raw_data")}
+        unused = []
+        for folder, _, file_names in os.walk(self.folder):
+            for file_name in file_names:
+                path = os.path.join(folder, file_name)
+                if file_name.endswith(".npz") and os.path.normcase(os.path.normpath(path)) not in used:
+                    unused.append(path)
+        return self._remove(unused)
+
+    def write_many(self, samples):
+        """
+        Saves the data for more samples, and adds them to the index in one transaction.
+        A sample that is already in the store gets a new file, and the old file is removed if it is not in use.
+
+        :param samples: The sample name, batch name and data for each sample. The data needs "uv", "ms_pos" and
+            "ms_neg"
+        :type samples: iter
+        :return: A dict with the key for each sample as keys and the path to the file as values
+        :rtype: dict
+        """
+        rows = []
+        for sample, batch, data in samples:
+            key = raw_key(sample, batch)
+            rows.append((key, sample, batch, self._save(key, batch, self._arrays(data))))
+
+        with closing(self._connect()) as conn, conn:
+            old_files = [self._path(row[0]) for key, *_ in rows
+                         for row in conn.execute("SELECT file_name FROM raw_data WHERE raw_key = ?", [key])]
+            conn.executemany("INSERT OR REPLACE INTO raw_data (raw_key, sample, batch, file_name) VALUES(?, ?, ?, ?)",
+                             rows)
+        self._remove(old_files)
+        return {key: self._path(file_name) for key, _, _, file_name in rows}
+
+    def write(self, sample, batch, data):
+        """
+        Saves the data for one sample
+
+        :param sample: The sample name
+        :type sample: str
+        :param batch: The batch name
+        :type batch: str
+        :param data: The data for the sample, with "uv", "ms_pos" and "ms_neg"
+        :type data: dict
+        :return: The path to the file
+        :rtype: str
+        """
+        return self.write_many([(sample, batch, data)])[raw_key(sample, batch)]
+
+    def file(self, sample, batch):
+        """
+        Finds the file for a sample
+
+        :param sample: The sample name
+        :type sample: str
+        :param batch: The batch name
+        :type batch: str
+        :return: The path to the file, or None if the sample is not in the store
+        :rtype: str or None
+        """
+        rows = self._fetch("SELECT file_name FROM raw_data WHERE raw_key = ?", [raw_key(sample, batch)])
+        return self._path(rows[0][0]) if rows else None
+
+    def read(self, sample, batch):
+        """
+        Reads the data for one sample
+
+        :param sample: The sample name
+        :type sample: str
+        :param batch: The batch name
+        :type batch: str
+        :return: The data for the sample, with "uv", "ms_pos" and "ms_neg", or None if the sample is not in the store
+        :rtype: dict or None
+        """
+        path = self.file(sample, batch)
+        if path is None:
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            return self._data(arrays)
+
+    def open(self, sample, batch):
+        """
+        Opens the data for one sample, without reading it
+
+        :param sample: The sample name
+        :type sample: str
+        :param batch: The batch name
+        :type batch: str
+        :return: A handle for the data, that reads the data when it is used, or None if the sample is not in the store
+        :rtype: RawSample or None
+        """
+        path = self.file(sample, batch)
+        return None if path is None else RawSample(path)
+
+    def open_batch(self, batch):
+        """
+        Opens the data for all the samples in a batch, without reading it
+
+        :param batch: The batch name
+        :type batch: str
+        :return: A dict with the sample names as keys and a handle for the data for each sample as values
+        :rtype: dict
+        """
+        return {sample: RawSample(self._path(file_name)) for sample, file_name in
+                self._fetch("SELECT sample, file_name FROM raw_data WHERE batch = ? ORDER BY sample", [batch])}
+
+    def read_batch(self, batch):
+        """
+        Reads the data for all the samples in a batch
+
+        :param batch: The batch name
+        :type batch: str
+        :return: A dict with the sample names as keys and the data for each sample as values
+        :rtype: dict
+        """
+        batch_data = {}
+        for sample, file_name in self._fetch("SELECT sample, file_name FROM raw_data WHERE batch = ? "
+                                             "ORDER BY sample", [batch]):
+            with np.load(self._path(file_name), allow_pickle=False) as arrays:
+                batch_data[sample] = self._data(arrays)
+        return batch_data
+
+    def samples(self, batch=None):
+        """
+        Gets the samples in the store
+
+        :param batch: Only the samples in this batch. All samples if None
+        :type batch: str or None
+        :return: The sample name and batch name for each sample
+        :rtype: list
+        """
+        if batch is None:
+            return self._fetch("SELECT sample, batch FROM raw_data ORDER BY batch, sample")
+        return self._fetch("SELECT sample, batch FROM raw_data WHERE batch = ? ORDER BY sample", [batch])
+
+    def migrate_pickle(self, file_path, names=None):
+        """
+        Moves the samples in a pickle file from df_writer into the store. The pickle file is read one dump at the time
+        and is not changed.
+
+        :param file_path: The pickle file
+        :type file_path: str
+        :param names: A dict with the key for each sample in the pickle file as keys, and the sample name and batch
+            name as values. The pickle file only has the key, so samples that are not in names are saved with the key
+            as the sample name and no batch.
+        :type names: dict or None
+        :return: A dict with the key for each sample as keys and the path to the new file as values
+        :rtype: dict
+        """
+        names = names or {}
+
+        def _samples():
+            for dump in df_iterator(file_path):
+                for key, data in dump.items():
+                    sample, batch = names.get(key, (key, None))
+                    yield sample, batch, data
+
+        return self.write_many(_samples())
+
+
+def raw_data_store_from_config(config):
+    """
+    Makes the raw data store from the settings in the config file
+
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :return: The raw data store
+    :rtype: RawDataStore
+    """
+    folder = config.get("LC_import", "raw_data_folder", fallback="")
+    if not folder:
+        folder = os.path.join(config.get("folders", "main_output_folder", fallback="output"), "raw_data")
+    return RawDataStore(folder, config.getboolean("LC_import", "raw_data_compress", fallback=False))
+
+
+def migrate_from_database(store, dbf, table="lc_raw"):
+    """
+    Moves all the samples in the pickle files that are listed in the database into the store, and points the rows in
+    the database to the new files.
+
+    :param store: The raw data store
+    :type store: RawDataStore
+    :param dbf: The database functions
+    :type dbf: database_handler.DataBaseFunctions
+    :param table: The table with the file for each sample
+    :type table: str
+    :return: A report with the amount of samples moved, and a list of pickle files that could not be found
+    :rtype: dict
+    """
+    pickle_files = {}
+    for row_id, sample, batch, file_name in dbf.fetch(f"SELECT row_id, sample, batch, file_name FROM {table}"):
+        if file_name and not file_name.endswith(".npz"):
+            pickle_files.setdefault(file_name, []).append((row_id, sample, batch))
+
+    report = {"samples": 0, "missing": []}
+    for file_name, rows in pickle_files.items():
+        if not os.path.isfile(file_name):
+            report["missing"].append(file_name)
+            continue
+        files = store.migrate_pickle(file_name, {raw_key(sample, batch): (sample, batch)
+                                                 for _, sample, batch in rows})
+        updates = [(files[raw_key(sample, batch)], row_id) for row_id, sample, batch in rows
+                   if raw_key(sample, batch) in files]
+        with dbf.transaction() as conn:
+            conn.executemany(f"UPDATE {table} SET file_name = ? WHERE row_id = ?", updates)
+        report["samples"] += len(updates)
+    return report
+
+
+if __name__ == "__main__":
+    from database_handler import DataBaseFunctions
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    dbf = DataBaseFunctions(config)
+    with dbf:
+        print(migrate_from_database(raw_data_store_from_config(config), dbf,
+                                    config["Tables"].get("lcms_experiment_raw", fallback="lc_raw")))
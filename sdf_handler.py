@@ -1,19 +1,63 @@
 import configparser
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from rdkit.Chem import AllChem
 from rdkit import Chem
 from rdkit.Chem.rdmolfiles import MolFromMolBlock
 from chem_operators import ChemOperators
+from descriptor_store import descriptors
+from origin_resolver import OriginResolver
+from structure_index import inchikey
+
+
+def _parse_records(records, first_record):
+    """
+    Reads a chunk of records from an SDF file. Runs in the worker processes, so only text and dicts are send between
+    the processes, not mols.
+
+    :param records: The records, as the text for each record, ending with "$$$$"
+    :type records: list
+    :param first_record: The number of the first record in the file, for the error report
+    :type first_record: int
+    :return: The compounds, and the records that could not be read
+    :rtype: (list, list)
+    """
+    supplier = Chem.SDMolSupplier()
+    supplier.SetData("".join(records))
+    compounds = []
+    errors = []
+    for index, mol in enumerate(supplier):
+        if mol is None:
+            errors.append({"row": first_record + index, "data": records[index].split("\n", 1)[0],
+                           "error": "Could not read the molecule"})
+            continue
+        try:
+            compounds.append({"barcode": mol.GetProp("Barcode"),
+                              "smiles": Chem.MolToSmiles(mol),
+                              "inchikey": inchikey(mol),
+                              "descriptors": descriptors(mol),
+                              "amount": mol.GetProp("Volume uL"),
+                              "concentration": mol.GetProp("Concentration mM"),
+                              "ac": mol.GetProp("A/C"),
+                              "origin": mol.GetProp("Origin"),
+                              "origin_id": mol.GetProp("Origin ID")})
+        except KeyError as error:
+            errors.append({"row": first_record + index, "data": records[index].split("\n", 1)[0],
+                           "error": f"Missing property: {error}"})
+    return compounds, errors
 
 
 class SDFReader:
 
     def __init__(self, config, fd, dbf):
-        self.size = (100, 100)
         self.co = ChemOperators()
         self.fd = fd
         self.dbf = dbf
-        self.fact_cache = {}
+        self.origins = OriginResolver(dbf, config["Tables"].get("compound_source", fallback="origin"))
+        self.chunk_size = config.getint("SDF_import", "chunk_size", fallback=1000)
+        self.workers = config.getint("SDF_import", "workers", fallback=1) or os.cpu_count() or 1
 
     def __str__(self):
         """
@@ -22,91 +66,104 @@ class SDFReader:
         :return: A dict of data with compound information
         """
 
-    def _fact(self, search_limiter, table):
-        ''' Memoized factorial function '''
-
-        try:
-            row = self.fact_cache[search_limiter["origin"]["value"]]
-            return row["ac_id"]
-        except KeyError:
-            rows = self.fd.data_search(table, search_limiter)
-
-        for row_id in rows:
-            row = rows[row_id]
-
-        try:
-            self.fact_cache[search_limiter["origin"]["value"]] = row
-            return self.fact_cache[search_limiter["origin"]["value"]]["ac_id"]
-        except UnboundLocalError:
-            temp_data_dict = {}
-            ac_id = self.dbf.number_of_rows(table) + 1
-            temp_data_dict["ac_id"] = ac_id
-            for headlines in search_limiter:
-                temp_data_dict[headlines] = search_limiter[headlines]["value"]
-
-            self.dbf.add_records_controller(table, temp_data_dict)
-
-        rows = self.fd.data_search(table, search_limiter)
-        for row_id in rows:
-            row = rows[row_id]
-
-        self.fact_cache[search_limiter["origin"]["value"]] = row
-        return self.fact_cache[search_limiter["origin"]["value"]]["ac_id"]
-
-
-    @staticmethod
-    def _sdf_to_mol(sdf_data):
+    def _record_chunks(self, sdf_file, progress=None):
         """
-        Gets mols out of the SDF file
-
-        :param sdf_data: Data from an SDF file
-        :type sdf_data: str
-        :return: Mols
-        :rtype: Chem-mol-data
+        Reads the SDF file one chunk of records at the time, so the whole file is never in memory
+
+        :param sdf_file: SDF file with compound data from a vendor
+        :type sdf_file: str
+        :param progress: Called with the amount of the file that have been read, from 0 to 1
+        :type progress: function or None
+        :return: The number of the first record in the chunk, and the text for the records in the chunk
+        :rtype: (int, list)
         """
-        return Chem.SDMolSupplier(sdf_data)
-
-    def _to_dict(self, mols):
+        file_size = os.path.getsize(sdf_file) or 1
+        first_record = 0
+        records = []
+        lines = []
+        with open(sdf_file, "rb") as f:
+            for line in f:
+                lines.append(line)
+                if line.startswith(b"$$$$"):
+                    records.append(b"".join(lines).decode(errors="replace"))
+                    lines = []
+                    if len(records) == self.chunk_size:
+                        if progress is not None:
+                            progress(f.tell() / file_size)
+                        yield first_record, records
+                        first_record += len(records)
+                        records = []
+            if b"".join(lines).strip():
+                # The last record do not have to end with "$$$$"
+                records.append(b"".join(lines).decode(errors="replace") + "\n$$$$\n")
+        if records:
+            yield first_record, records
+
+    def stream(self, sdf_file, progress=None):
         """
-        Translate the SDF into dict for ease of use
-
-        :param mols: Mols
-        :type mols: Chem-mol-data
-        :return: A dict of data
-        :rtype: dict
+        Reads the SDF file in chunks, and yields the compounds one batch at the time.
+        The chunks are read and made into canonical smiles codes in a process pool, if there is more than one worker.
+        Only a few chunks are read ahead of the batch being used, to keep the memory use down.
+
+        :param sdf_file: SDF file with compound data from a vendor
+        :type sdf_file: str
+        :param progress: Called with the amount of compounds read and the amount of the file read, from 0 to 1
+        :type progress: function or None
+        :return: A batch of compounds, as dicts with the same keys as from _to_dict, and the records that could not
+            be read
+        :rtype: (list, list)
         """
-        data = {}
-        search_limiter = {
-            "ac": {"value": "",
-                   "operator": "=",
-                   "target_column": "ac"},
-            "origin": {"value": "",
-                       "operator": "=",
-                       "target_column": "origin"}
-        }
-        # c = 0
-        for idx, mol in enumerate(mols):
-
-            if mol:
-                # c += 1
-                mol_id = mol.GetProp("Barcode")
-                search_limiter["ac"]["value"] = mol.GetProp("A/C")
-                search_limiter["origin"]["value"] = mol.GetProp("Origin")
-                table = "origin"
-                ac_id = self._fact(search_limiter, table)
-
-                data[mol_id] = {}
-                data[mol_id]["barcode"] = mol.GetProp("Barcode")
-                data[mol_id]["smiles"] = Chem.MolToSmiles(mol)
-                data[mol_id]["amount"] = mol.GetProp("Volume uL")
-                data[mol_id]["concentration"] = mol.GetProp("Concentration mM")
-                data[mol_id]["ac_id"] = ac_id
-                data[mol_id]["origin_id"] = mol.GetProp("Origin ID")
-                data[mol_id]["mol_data"] = self.co.png_string(Chem.MolToSmiles(mol), self.size)
-                # if c == 2982:
-                #     print("DATA IS OVER 2982 COMPOUNDS... IMPORT HAVE STOPPED... THIS IS FROM SDF_HANDLER")
-                #     return data
-        return data
+        read = {"fraction": 0}
+
+        def _read_progress(fraction):
+            read["fraction"] = fraction
+
+        chunks = self._record_chunks(sdf_file, _read_progress)
+        compound_count = 0
+        if self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                pending = deque()
+                for first_record, records in chunks:
+                    pending.append(pool.submit(_parse_records, records, first_record))
+                    if len(pending) >= self.workers * 2:
+                        compounds, errors = pending.popleft().result()
+                        compound_count += len(compounds)
+                        yield self._add_ac_ids(compounds), errors
+                        if progress is not None:
+                            progress(compound_count, read["fraction"])
+                while pending:
+                    compounds, errors = pending.popleft().result()
+                    compound_count += len(compounds)
+                    yield self._add_ac_ids(compounds), errors
+                    if progress is not None:
+                        progress(compound_count, read["fraction"])
+        else:
+            for first_record, records in chunks:
+                compounds, errors = _parse_records(records, first_record)
+                compound_count += len(compounds)
+                yield self._add_ac_ids(compounds), errors
+                if progress is not None:
+                    progress(compound_count, read["fraction"])
+
+        if progress is not None:
+            progress(compound_count, 1)
+
+    def _add_ac_ids(self, compounds):
+        """
+        Finds the ac_id for the origin of each compound, and adds it to the compound instead of "ac" and "origin".
+        The (ac, origin) pairs are collected per streamed batch, not over the whole file, so the file never have to be in
+        memory. New origins in a batch are added to the database in one transaction, and are found as existing origins by
+        the later batches, so each origin is still only added once per file.
+
+        :param compounds: Compounds from _parse_records
+        :type compounds: list
+        :return: The compounds with ac_id
+        :rtype: list
+        """
+        ac_ids = self.origins.resolve((compound["ac"], compound["origin"]) for compound in compounds)
+        for compound in compounds:
+            compound["ac_id"] = ac_ids[(compound.pop("ac"), compound.pop("origin"))]
+        return compounds
 
     def run(self, sdf_data):
         """
@@ -117,8 +174,10 @@ class SDFReader:
         :return: A dict of data.
         :rtype: dict
         """
-        mols = self._sdf_to_mol(sdf_data)
-        data = self._to_dict(mols)
+        data = {}
+        for compounds, _ in self.stream(sdf_data):
+            for compound in compounds:
+                data[compound["barcode"]] = compound
 
         return data
 
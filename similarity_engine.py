@@ -0,0 +1,698 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+
+import numpy as np
+from rdkit import DataStructs
+
+
+# Number of bits set in each byte value, used when numpy do not have bitwise_count
+_byte_bit_counts = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+_matrix_cache = {}
+_cache_lock = threading.Lock()
+
+# The process pool and the folder for the memory-mapped files are made the first time they are needed, and shared
+# by all searches in the process.
+_pool = None
+_pool_workers = None
+_shared_folder = None
+_shared_file_counter = count()
+
+
+def popcount(matrix):
+    """
+    Counts the bits set in each row of a matrix of packed bits
+
+    :param matrix: Packed bits, one row per fingerprint
+    :type matrix: numpy.ndarray
+    :return: Amount of bits set per row
+    :rtype: numpy.ndarray
+    """
+    if hasattr(np, "bitwise_count"):
+        if matrix.shape[1] % 8 == 0 and matrix.flags.c_contiguous:
+            matrix = matrix.view(np.uint64)
+        return np.bitwise_count(matrix).sum(axis=1, dtype=np.int32)
+    return _byte_bit_counts[matrix].sum(axis=1, dtype=np.int32)
+
+
+def fold(matrix, n_bits, target_bits):
+    """
+    Folds fingerprints to a shorter length, the same way as DataStructs.FoldFingerprint.
+    Bit i in the folded fingerprint is set, if any of the bits i + k * target_bits are set.
+
+    :param matrix: Packed bits, one row per fingerprint
+    :type matrix: numpy.ndarray
+    :param n_bits: The number of bits in the fingerprints
+    :type n_bits: int
+    :param target_bits: The number of bits after the fold. n_bits needs to be a multiple of target_bits
+    :type target_bits: int
+    :return: The folded fingerprints as packed bits
+    :rtype: numpy.ndarray
+    """
+    if target_bits % 8 == 0:
+        return np.bitwise_or.reduce(matrix.reshape(len(matrix), n_bits // target_bits, target_bits // 8), axis=1)
+
+    bits = np.unpackbits(matrix, axis=1, count=n_bits)
+    bits = np.bitwise_or.reduce(bits.reshape(len(matrix), n_bits // target_bits, target_bits), axis=1)
+    return np.packbits(bits, axis=1)
+
+
+def tanimoto_scores(matrix, n_bits, bit_counts, query, query_bits, chunk_size):
+    """
+    Scores fingerprints against one fingerprint. Like DataStructs.FingerprintSimilarity, the longest of two
+    fingerprints is folded to the length of the other, before the tanimoto score is made.
+
+    :param matrix: Packed bits, one row per fingerprint
+    :type matrix: numpy.ndarray
+    :param n_bits: The number of bits in the fingerprints in the matrix
+    :type n_bits: int
+    :param bit_counts: The amount of bits set per row in the matrix
+    :type bit_counts: numpy.ndarray
+    :param query: The fingerprint to compare with, as packed bits in a matrix with one row
+    :type query: numpy.ndarray
+    :param query_bits: The number of bits in the query fingerprint
+    :type query_bits: int
+    :param chunk_size: Amount of rows scored at the time
+    :type chunk_size: int
+    :return: The scores from 0 to 100
+    :rtype: numpy.ndarray
+    """
+    target_bits = min(n_bits, query_bits)
+    if n_bits > target_bits:
+        matrix = fold(matrix, n_bits, target_bits)
+        bit_counts = popcount(matrix)
+    if query_bits > target_bits:
+        query = fold(query, query_bits, target_bits)
+    query_count = popcount(query)[0]
+
+    scores = np.zeros(len(matrix), dtype=np.float64)
+    for start in range(0, len(matrix), chunk_size):
+        stop = start + chunk_size
+        common = popcount(matrix[start:stop] & query)
+        union = bit_counts[start:stop] + query_count - common
+        np.divide(common, union, out=scores[start:stop], where=union > 0)
+    return scores * 100
+
+
+def _best_hits(scores, threshold, top_k):
+    """
+    Finds the scores over the threshold
+
+    :param scores: The scores
+    :type scores: numpy.ndarray
+    :param threshold: Minimum score
+    :type threshold: int or float
+    :param top_k: Only keep the best top_k scores. All scores over the threshold if None
+    :type top_k: int or None
+    :return: The index of the hits, not sorted
+    :rtype: numpy.ndarray
+    """
+    hits = np.flatnonzero(scores >= threshold)
+    if top_k is not None and len(hits) > top_k:
+        hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+    return hits
+
+
+def _score_shard(shared_matrix, start, stop, query, query_bits, mask_file, threshold, top_k, chunk_size):
+    """
+    Scores one shard of a shared matrix. Runs in the worker processes.
+    The matrix is read from memory-mapped files, so only the file names and the hits are send between the processes.
+
+    :param shared_matrix: The files and shape for the matrix, see SimilarityEngine._share
+    :type shared_matrix: dict
+    :param start: First row in the shard
+    :type start: int
+    :param stop: Row after the last row in the shard
+    :type stop: int
+    :param query: The fingerprint to compare with, as packed bits in a matrix with one row
+    :type query: numpy.ndarray
+    :param query_bits: The number of bits in the query fingerprint
+    :type query_bits: int
+    :param mask_file: File with a True/False per row, for the rows to score. All rows if None
+    :type mask_file: str or None
+    :param threshold: Minimum score
+    :type threshold: int or float
+    :param top_k: Only return the best top_k scores. All scores over the threshold if None
+    :type top_k: int or None
+    :param chunk_size: Amount of rows scored at the time
+    :type chunk_size: int
+    :return: The rows in the matrix for the hits, and the scores
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    rows = shared_matrix["rows"]
+    stop = min(stop, rows)
+    matrix = np.memmap(shared_matrix["matrix_file"], dtype=np.uint8, mode="r",
+                       shape=(rows, shared_matrix["row_bytes"]))[start:stop]
+    bit_counts = np.memmap(shared_matrix["bit_counts_file"], dtype=np.int32, mode="r", shape=(rows,))[start:stop]
+    index = np.arange(start, stop)
+    if mask_file is not None:
+        keep = np.memmap(mask_file, dtype=np.bool_, mode="r", shape=(rows,))[start:stop]
+        index, matrix, bit_counts = index[keep], matrix[keep], bit_counts[keep]
+
+    scores = tanimoto_scores(matrix, shared_matrix["n_bits"], bit_counts, query, query_bits, chunk_size)
+    hits = _best_hits(scores, threshold, top_k)
+    return index[hits], scores[hits]
+
+
+def _get_pool(workers):
+    """
+    Gets the process pool, and makes a new one if the amount of workers have changed
+
+    :param workers: Amount of worker processes
+    :type workers: int
+    :return: The process pool
+    :rtype: ProcessPoolExecutor
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def _shared_file(array):
+    """
+    Writes an array to a memory-mapped file, that the worker processes can read
+
+    :param array: The array
+    :type array: numpy.ndarray
+    :return: The file name, and the array read back from the file
+    :rtype: (str, numpy.memmap)
+    """
+    global _shared_folder
+    if _shared_folder is None:
+        _shared_folder = tempfile.mkdtemp(prefix="similarity_search_")
+        atexit.register(_remove_shared_folder)
+
+    file_name = os.path.join(_shared_folder, f"array_{next(_shared_file_counter)}.dat")
+    if array.size == 0:
+        # Files of 0 bytes can not be memory-mapped
+        return file_name, array
+    shared = np.memmap(file_name, dtype=array.dtype, mode="w+", shape=array.shape)
+    shared[:] = array
+    shared.flush()
+    return file_name, np.memmap(file_name, dtype=array.dtype, mode="r", shape=array.shape)
+
+
+def _remove_shared_file(file_name):
+    """
+    Removes a memory-mapped file. On Windows, files that are still open can not be removed, those are left for
+    _remove_shared_folder.
+
+    :param file_name: The file
+    :type file_name: str
+    :return: The file is removed
+    """
+    try:
+        os.remove(file_name)
+    except OSError:
+        pass
+
+
+def _remove_shared_folder():
+    """
+    Stops the process pool and removes the folder with the memory-mapped files, when the program closes
+
+    :return: The folder is removed
+    """
+    if _pool is not None:
+        _pool.shutdown()
+    if _shared_folder is not None:
+        shutil.rmtree(_shared_folder, ignore_errors=True)
+
+
+class SimilarityEngine:
+    """
+    :param fp_store: The fingerprint store, with the fingerprints for the compounds
+    :type fp_store: fingerprint_store.FingerprintStore
+    :param chunk_size: Amount of fingerprints scored at the time. With more than one worker, it is also the amount of
+        fingerprints each worker gets at the time
+    :type chunk_size: int
+    :param workers: Amount of worker processes for the search. 1 searches in this process, 0 uses all cores
+    :type workers: int
+    :param lsh_index: An approximate index, to find the candidates for large searches. All compounds are scored if
+        None
+    :type lsh_index: lsh_index.LSHIndex or None
+    """
+    def __init__(self, fp_store, chunk_size=65536, workers=1, lsh_index=None):
+        self.fp_store = fp_store
+        self.dbf = fp_store.dbf
+        self.co = fp_store.co
+        self.chunk_size = chunk_size or 65536
+        self.workers = workers or os.cpu_count() or 1
+        self.lsh_index = lsh_index
+
+    def __str__(self):
+        """
+        Scores how similar a smiles code is to all compounds at once.
+        The fingerprint for the smiles code is only made once. Bit vector fingerprints (finger and morgan) are loaded
+        from the fingerprint store into one matrix of packed bits, that is kept in memory until the fingerprints in
+        the database changes, and scored with a popcount in numpy.
+        With more than one worker, the matrix is saved in memory-mapped files, and split into shards that are scored
+        in a process pool. The workers reads the matrix from the files, so the fingerprints are not pickled, and only
+        the hits are send back.
+        Atom pair fingerprints (dice) are scored with RDKit's BulkDiceSimilarity.
+        With an LSH index, large searches only scores the candidates from the index.
+        """
+
+    def _fingerprint_search(self, methode, params_key):
+        """
+        Makes the search_limiter for the fingerprints of one type, with the same settings
+
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params_key: The settings for the fingerprint, see FingerprintStore.params_key
+        :type params_key: str
+        :return: The search_limiter
+        :rtype: dict
+        """
+        return {
+            "fp_type": {"value": methode, "operator": "=", "target_column": "fp_type"},
+            "fp_params": {"value": params_key, "operator": "=", "target_column": "fp_params"},
+        }
+
+    def _bit_matrix(self, methode, params_key):
+        """
+        Gets all the fingerprints of one type as matrices of packed bits, one matrix per fingerprint length.
+        Most fingerprints have the same length, but "finger" fingerprints are folded to different lengths.
+        The matrices are cached, and loaded again if the fingerprint table have been written to, or the amount of
+        fingerprints in the database have changed.
+
+        :param methode: What fingerprint type to use. (finger or morgan)
+        :type methode: str
+        :param params_key: The settings for the fingerprint, see FingerprintStore.params_key
+        :type params_key: str
+        :return: A dict with the number of bits as keys, and as values:
+            - The compound_ids, one per row in the matrix
+            - The matrix of packed bits
+            - The amount of bits set per row
+            - The memory-mapped files for the matrix, see _share. None if there is only one worker
+        :rtype: dict
+        """
+        search_limiter = self._fingerprint_search(methode, params_key)
+        version = (self.dbf.statistics.writes(self.fp_store.table),
+                   self.dbf.statistics.count(self.fp_store.table, search_limiter))
+        cache_key = (self.dbf.database, self.fp_store.table, methode, params_key)
+        with _cache_lock:
+            cached = _matrix_cache.get(cache_key)
+        if cached and cached[0] == version and (cached[2] > 1) == (self.workers > 1):
+            return cached[1]
+
+        groups = {}
+        for row in self.dbf.stream_table_data(self.fp_store.table, search_limiter,
+                                              ["compound_id", "n_bits", "fingerprint"]):
+            compound_ids, blobs = groups.setdefault(row["n_bits"], ([], []))
+            compound_ids.append(row["compound_id"])
+            blobs.append(row["fingerprint"])
+
+        matrices = {}
+        for n_bits, (compound_ids, blobs) in groups.items():
+            matrix = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), -1)
+            bit_counts = popcount(matrix)
+            shared_matrix = None
+            if self.workers > 1:
+                shared_matrix, matrix, bit_counts = self._share(n_bits, matrix, bit_counts)
+            matrices[n_bits] = (np.array(compound_ids, dtype=np.int64), matrix, bit_counts, shared_matrix)
+
+        with _cache_lock:
+            old = _matrix_cache.get(cache_key)
+            _matrix_cache[cache_key] = (version, matrices, self.workers)
+        if old:
+            self._unshare(old[1])
+        return matrices
+
+    @staticmethod
+    def _share(n_bits, matrix, bit_counts):
+        """
+        Moves a matrix and its bit counts to memory-mapped files, so the worker processes can read them
+
+        :param n_bits: The number of bits in the fingerprints in the matrix
+        :type n_bits: int
+        :param matrix: Packed bits, one row per fingerprint
+        :type matrix: numpy.ndarray
+        :param bit_counts: The amount of bits set per row in the matrix
+        :type bit_counts: numpy.ndarray
+        :return: A dict with the files and shape of the matrix, and the matrix and bit counts read from the files
+        :rtype: (dict, numpy.memmap, numpy.memmap)
+        """
+        matrix_file, matrix = _shared_file(matrix)
+        bit_counts_file, bit_counts = _shared_file(bit_counts)
+        shared_matrix = {"matrix_file": matrix_file, "bit_counts_file": bit_counts_file, "n_bits": n_bits,
+                         "rows": matrix.shape[0], "row_bytes": matrix.shape[1]}
+        return shared_matrix, matrix, bit_counts
+
+    @staticmethod
+    def _unshare(matrices):
+        """
+        Removes the memory-mapped files for matrices that are no longer used
+
+        :param matrices: The matrices from _bit_matrix
+        :type matrices: dict
+        :return: The files are removed
+        """
+        for _, _, _, shared_matrix in matrices.values():
+            if shared_matrix:
+                _remove_shared_file(shared_matrix["matrix_file"])
+                _remove_shared_file(shared_matrix["bit_counts_file"])
+
+    def _smiles(self, compound_ids):
+        """
+        Gets the smiles codes for compounds from the compound table
+
+        :param compound_ids: The compounds
+        :type compound_ids: list
+        :return: A dict with compound_id as keys and smiles codes as values
+        :rtype: dict
+        """
+        if not compound_ids:
+            return {}
+        search_limiter = {"compound_id": {"value": compound_ids, "operator": "IN", "target_column": "compound_id"}}
+        return {row["compound_id"]: row["smiles"] for row in
+                self.dbf.stream_table_data(self.fp_store.compound_table, search_limiter, ["compound_id", "smiles"])}
+
+    def _fill_missing(self, candidates, methode, params, compound_ids):
+        """
+        Makes fingerprints for the candidates that do not have one in the fingerprint store.
+        Candidates without a smiles code gets it from the compound table.
+
+        :param candidates: A dict with compound_id as keys and smiles codes, or None, as values
+        :type candidates: dict
+        :param methode: What fingerprint type to use. (finger, morgan or dice)
+        :type methode: str
+        :param params: The full settings for the fingerprint
+        :type params: dict
+        :param compound_ids: The compound_ids that have a fingerprint
+        :type compound_ids: numpy.ndarray
+        :return: True if fingerprints have been added
+        :rtype: bool
+        """
+        known = set(compound_ids.tolist())
+        missing = {compound_id: smiles for compound_id, smiles in candidates.items() if compound_id not in known}
+        missing.update(self._smiles([compound_id for compound_id, smiles in missing.items() if smiles is None]))
+        missing = {compound_id: smiles for compound_id, smiles in missing.items() if smiles}
+        if not missing:
+            return False
+        return self.fp_store.add(missing, methode, params)["added"] > 0
+
+    def _candidate_matrices(self, methode, params, candidates):
+        """
+        Gets the bit matrices, and makes fingerprints for the candidates that are missing one first
+
+        :param methode: What fingerprint type to use. (finger, morgan or pattern)
+        :type methode: str
+        :param params: The full settings for the fingerprint
+        :type params: dict
+        :param candidates: A dict with compound_id as keys and smiles codes, or None, as values. All compounds if None
+        :type candidates: dict or None
+        :return: The matrices, see _bit_matrix, and the compound_ids for the candidates, or None for all compounds
+        :rtype: (dict, numpy.ndarray or None)
+        """
+        params_key = self.fp_store.params_key(params)
+        matrices = self._bit_matrix(methode, params_key)
+        candidate_ids = None
+        if candidates is not None:
+            known = np.concatenate([group[0] for group in matrices.values()] or [np.array([])])
+            if self._fill_missing(candidates, methode, params, known):
+                matrices = self._bit_matrix(methode, params_key)
+            candidate_ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        return matrices, candidate_ids
+
+    def _bit_scores(self, fp_search, methode, params, candidates, threshold, top_k):
+        """
+        Scores the fingerprints in the bit matrices against the fingerprint for the search.
+        Large matrices are split into shards, and scored in the process pool, if there is more than one worker.
+
+        :param fp_search: The fingerprint for the search smiles code
+        :type fp_search: DataStructs.ExplicitBitVect
+        :param methode: What fingerprint type to use. (finger or morgan)
+        :type methode: str
+        :param params: The full settings for the fingerprint
+        :type params: dict
+        :param candidates: A dict with compound_id as keys and smiles codes, or None, as values. All compounds if None
+        :type candidates: dict or None
+        :param threshold: Minimum score. Only used to limit what the workers send back
+        :type threshold: int or float
+        :param top_k: Only the best top_k. Only used to limit what the workers send back
+        :type top_k: int or None
+        :return: The compound_ids and the scores from 0 to 100
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        matrices, candidate_ids = self._candidate_matrices(methode, params, candidates)
+
+        query, query_bits = self.fp_store.to_blob(fp_search)
+        query = np.frombuffer(query, dtype=np.uint8).reshape(1, -1)
+
+        all_compound_ids = []
+        all_scores = []
+        for n_bits, (compound_ids, matrix, bit_counts, shared_matrix) in matrices.items():
+            keep = None
+            if candidate_ids is not None:
+                keep = np.isin(compound_ids, candidate_ids)
+
+            if shared_matrix and len(compound_ids) > self.chunk_size:
+                rows, scores = self._parallel_scores(shared_matrix, query, query_bits, keep, threshold, top_k)
+                compound_ids = compound_ids[rows]
+            else:
+                if keep is not None:
+                    compound_ids, matrix, bit_counts = compound_ids[keep], matrix[keep], bit_counts[keep]
+                scores = tanimoto_scores(matrix, n_bits, bit_counts, query, query_bits, self.chunk_size)
+            all_compound_ids.append(compound_ids)
+            all_scores.append(scores)
+
+        if not all_compound_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        return np.concatenate(all_compound_ids), np.concatenate(all_scores)
+
+    def _parallel_scores(self, shared_matrix, query, query_bits, keep, threshold, top_k):
+        """
+        Splits a shared matrix into shards of chunk_size rows, and scores them in the process pool
+
+        :param shared_matrix: The files and shape for the matrix, see _share
+        :type shared_matrix: dict
+        :param query: The fingerprint to compare with, as packed bits in a matrix with one row
+        :type query: numpy.ndarray
+        :param query_bits: The number of bits in the query fingerprint
+        :type query_bits: int
+        :param keep: True/False per row, for the rows to score. All rows if None
+        :type keep: numpy.ndarray or None
+        :param threshold: Minimum score
+        :type threshold: int or float
+        :param top_k: Only the best top_k scores from each shard. All scores over the threshold if None
+        :type top_k: int or None
+        :return: The rows in the matrix for the hits, and the scores
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        mask_file = None
+        if keep is not None:
+            mask_file, _ = _shared_file(keep)
+
+        try:
+            pool = _get_pool(self.workers)
+            shards = [pool.submit(_score_shard, shared_matrix, start, start + self.chunk_size, query, query_bits,
+                                  mask_file, threshold, top_k, self.chunk_size)
+                      for start in range(0, shared_matrix["rows"], self.chunk_size)]
+            results = [shard.result() for shard in shards]
+        finally:
+            if mask_file is not None:
+                _remove_shared_file(mask_file)
+
+        rows = np.concatenate([result[0] for result in results])
+        scores = np.concatenate([result[1] for result in results])
+        return rows, scores
+
+    def _sparse_scores(self, fp_search, methode, params, candidates):
+        """
+        Scores atom pair fingerprints against the fingerprint for the search, with BulkDiceSimilarity
+
+        :param fp_search: The fingerprint for the search smiles code
+        :type fp_search: DataStructs.IntSparseIntVect
+        :param methode: What fingerprint type to use. (dice)
+        :type methode: str
+        :param params: The full settings for the fingerprint
+        :type params: dict
+        :param candidates: A dict with compound_id as keys and smiles codes, or None, as values. All compounds if None
+        :type candidates: dict or None
+        :return: The compound_ids and the scores from 0 to 100
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if candidates is not None:
+            fingerprints = self.fp_store.load(candidates, methode, params, fill_missing=False)
+            missing = self._smiles([compound_id for compound_id in candidates if compound_id not in fingerprints])
+            if missing:
+                fingerprints.update(self.fp_store.load(missing, methode, params))
+            rows = fingerprints.items()
+        else:
+            search_limiter = self._fingerprint_search(methode, self.fp_store.params_key(params))
+            rows = ((row["compound_id"], self.fp_store.from_blob(row["fingerprint"], row["n_bits"]))
+                    for row in self.dbf.stream_table_data(self.fp_store.table, search_limiter,
+                                                          ["compound_id", "n_bits", "fingerprint"]))
+
+        compound_ids = []
+        scores = []
+        chunk = []
+        for compound_id, fp in rows:
+            compound_ids.append(compound_id)
+            chunk.append(fp)
+            if len(chunk) == self.chunk_size:
+                scores += DataStructs.BulkDiceSimilarity(fp_search, chunk)
+                chunk = []
+        if chunk:
+            scores += DataStructs.BulkDiceSimilarity(fp_search, chunk)
+        return np.array(compound_ids, dtype=np.int64), np.array(scores, dtype=np.float64) * 100
+
+    def _substructure_scores(self, smiles, candidates, top_k):
+        """
+        Finds the compounds that contains a substructure.
+        First all compounds are screened with their pattern fingerprints. A compound can only contain the substructure
+        if all the bits in the pattern fingerprint for the substructure are also set for the compound, so the rest
+        are removed with numpy, without looking at the atoms. Only the compounds that are left are checked with
+        HasSubstructMatch.
+
+        :param smiles: Smiles code or SMARTS for the substructure
+        :type smiles: str
+        :param candidates: A dict with compound_id as keys and smiles codes, or None, as values. All compounds if None
+        :type candidates: dict or None
+        :param top_k: Stop when top_k compounds have been found. All compounds if None
+        :type top_k: int or None
+        :return: The compound_ids, and a score of 100 for each
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        query_mol = self.co.get_query_mol(smiles)
+        if query_mol is None:
+            raise ValueError(f"Could not read the smiles code: {smiles}")
+        params = self.co.fingerprint_params("pattern")
+        query, _ = self.fp_store.to_blob(self.co.fingerprint(query_mol, "pattern", params))
+        query = np.frombuffer(query, dtype=np.uint8)
+
+        matrices, candidate_ids = self._candidate_matrices("pattern", params, candidates)
+        survivors = []
+        for compound_ids, matrix, _, _ in matrices.values():
+            if candidate_ids is not None:
+                keep = np.isin(compound_ids, candidate_ids)
+                compound_ids, matrix = compound_ids[keep], matrix[keep]
+            for start in range(0, len(compound_ids), self.chunk_size):
+                stop = start + self.chunk_size
+                screen = np.all((matrix[start:stop] & query) == query, axis=1)
+                survivors.extend(compound_ids[start:stop][screen].tolist())
+
+        survivor_smiles = self._smiles(survivors).items()
+
+        hits = []
+        for compound_id, compound_smiles in survivor_smiles:
+            mol = self.co.get_mol(compound_smiles)
+            if mol is not None and mol.HasSubstructMatch(query_mol):
+                hits.append(compound_id)
+                if top_k is not None and len(hits) == top_k:
+                    break
+        return np.array(hits, dtype=np.int64), np.full(len(hits), 100.0)
+
+    def _lsh_candidates(self, fp_search, methode, params, candidates):
+        """
+        Finds the candidates for a search with the LSH index. The index is only used when there are enough
+        fingerprints, and it is brought up to date with the fingerprint store first.
+        The candidates are scored like any other search, so the scores and the threshold are exact.
+
+        :param fp_search: The fingerprint for the search smiles code
+        :type fp_search: DataStructs.ExplicitBitVect or DataStructs.IntSparseIntVect
+        :param methode: What fingerprint type to use. (morgan or dice)
+        :type methode: str
+        :param params: The full settings for the fingerprint
+        :type params: dict
+        :param candidates: A dict with compound_id as keys and smiles codes, or None, as values. All compounds if None
+        :type candidates: dict or None
+        :return: The candidates, as a dict with compound_id as keys and smiles codes, or None, as values. The
+            candidates that was given, if the index is not used
+        :rtype: dict or None
+        """
+        params_key = self.fp_store.params_key(params)
+        stored = self.dbf.statistics.count(self.fp_store.table, self._fingerprint_search(methode, params_key))
+        if stored < self.lsh_index.min_compounds:
+            return candidates
+
+        self.lsh_index.sync(self.fp_store, methode, params)
+        hits = self.lsh_index.query(fp_search, methode, params_key)
+        if candidates is None:
+            return dict.fromkeys(hits)
+        return {compound_id: candidates[compound_id] for compound_id in hits if compound_id in candidates}
+
+    def search(self, smiles, methode, threshold, params=None, candidates=None, top_k=None):
+        """
+        Finds the compounds that are similar to a smiles code
+
+        :param smiles: The smiles code to compare the compounds with
+        :type smiles: str
+        :param methode: What structure search methode to use. (finger, morgan, dice or substructure)
+        :type methode: str
+        :param threshold: Minimum similarity score, from 0 to 100, the compounds needs. Not used for substructure
+        :type threshold: int or float
+        :param params: The settings for the fingerprint. Default settings are used for the missing ones
+        :type params: dict or None
+        :param candidates: A dict with compound_id as keys and smiles codes, or None, as values, to only search in
+            those compounds. The smiles codes are found in the compound table if they are needed. All compounds in the
+            fingerprint store if None
+        :type candidates: dict or None
+        :param top_k: Only return the best top_k compounds. All compounds over the threshold if None
+        :type top_k: int or None
+        :return: A list of (compound_id, score), with the best score first. Scores are rounded to 2 decimals
+        :rtype: list
+        """
+        if methode == "substructure":
+            compound_ids, scores = self._substructure_scores(smiles, candidates, top_k)
+            return [(int(compound_id), float(score)) for compound_id, score in zip(compound_ids, scores)]
+
+        params = self.co.fingerprint_params(methode, params)
+        mol = self.co.get_mol(smiles)
+        if mol is None:
+            raise ValueError(f"Could not read the smiles code: {smiles}")
+        fp_search = self.co.fingerprint(mol, methode, params)
+        if self.lsh_index is not None and self.lsh_index.usable(methode, threshold):
+            candidates = self._lsh_candidates(fp_search, methode, params, candidates)
+
+        if isinstance(fp_search, DataStructs.ExplicitBitVect):
+            compound_ids, scores = self._bit_scores(fp_search, methode, params, candidates, threshold, top_k)
+        else:
+            compound_ids, scores = self._sparse_scores(fp_search, methode, params, candidates)
+
+        hits = _best_hits(scores, threshold, top_k)
+        scores = np.round(scores, 2)
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(compound_ids[index]), float(scores[index])) for index in hits]
+
+
+if __name__ == "__main__":
+    import configparser
+    import sys
+
+    from database_handler import DataBaseFunctions
+    from fingerprint_store import FingerprintStore
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    dbf = DataBaseFunctions(config)
+    fps = FingerprintStore(dbf, config["Tables"]["compound_fingerprint_table"], config["Tables"]["compound_main"])
+    engine = SimilarityEngine(fps, config.getint("Structure_search", "chunk_size", fallback=65536),
+                              config.getint("Structure_search", "workers", fallback=1))
+    smiles_search = sys.argv[1] if len(sys.argv) > 1 else "c1ccccc1O"
+
+    # Compares the search methodes on the compounds in the database. The first search fills the fingerprint store
+    # and loads the fingerprints, the next searches uses the cached fingerprints.
+    benchmarks = [("finger", None), ("dice", None), ("morgan", None),
+                  ("morgan", {"radius": 3, "n_bits": 1024, "chirality": True})]
+    with dbf:
+        for methode, params in benchmarks:
+            fps.backfill(methode, params)
+            times = []
+            for _ in range(4):
+                start = time.perf_counter()
+                hits = engine.search(smiles_search, methode, 50, params)
+                times.append(time.perf_counter() - start)
+            print(f"{methode:<8} {fps.params_key(engine.co.fingerprint_params(methode, params)):<52} "
+                  f"first: {times[0] * 1000:8.1f} ms  cached: {min(times[1:]) * 1000:8.1f} ms  hits: {len(hits)}")
@@ -0,0 +1,207 @@
+import configparser
+
+from rdkit import Chem
+
+
+def inchikey(mol):
+    """
+    Makes the InChIKey for a compound. Used as the key for the structure, as it is the same for the same compound,
+    no matter how the smiles code was written.
+
+    :param mol: The compound
+    :type mol: Chem.Mol
+    :return: The InChIKey, or None if it can not be made
+    :rtype: str or None
+    """
+    if mol is None:
+        return None
+    return Chem.MolToInchiKey(mol) or None
+
+
+class StructureIndex:
+    """
+    :param dbf: The database functions
+    :type dbf: database_handler.DataBaseFunctions
+    :param table: The table with the structures
+    :type table: str
+    :param compound_table: The table with the compounds
+    :type compound_table: str
+    :param alias_table: The table with the compound_ids of duplicates that was not added, and the compound they are
+        a duplicate of
+    :type alias_table: str
+    """
+    def __init__(self, dbf, table="compound_structure", compound_table="compound_main", alias_table="compound_alias"):
+        self.dbf = dbf
+        self.table = table
+        self.compound_table = compound_table
+        self.alias_table = alias_table
+
+    def __str__(self):
+        """
+        Keeps the InChIKey and canonical smiles code for each structure in the database, with the compound_id for the
+        first compound with the structure.
+        The InChIKey is the primary key, so finding a duplicate is one look up in the index per compound, and a whole
+        import batch is checked with one search.
+        Duplicates that are not added are saved as aliases for the compound with the same structure, so plates that
+        uses the compound_id of the duplicate can be added to the compound that is in the database.
+        """
+
+    def find(self, inchikeys):
+        """
+        Finds the compounds for the InChIKeys that are already in the database
+
+        :param inchikeys: The InChIKeys to look for
+        :type inchikeys: iter
+        :return: A dict with the InChIKeys that was found as keys and the compound_id as values
+        :rtype: dict
+        """
+        inchikeys = list({key for key in inchikeys if key})
+        if not inchikeys:
+            return {}
+        search_limiter = {"inchikey": {"value": inchikeys, "operator": "IN", "target_column": "inchikey"}}
+        return {row["inchikey"]: row["compound_id"] for row in
+                self.dbf.stream_table_data(self.table, search_limiter, ["inchikey", "compound_id"])}
+
+    def check(self, compounds):
+        """
+        Splits a batch of compounds into new compounds and duplicates.
+        A compound is a duplicate if the structure is in the database, or if it is in the batch more than once, where
+        the first one is seen as the new compound. Compounds without an InChIKey are always new.
+
+        :param compounds: The compounds, with "compound_id" and "inchikey"
+        :type compounds: list
+        :return: The new compounds, and a list of the duplicates, with the compound_id, InChIKey and the compound_id
+            of the compound with the same structure
+        :rtype: (list, list)
+        """
+        known = self.find(compound["inchikey"] for compound in compounds)
+        new_compounds = []
+        duplicates = []
+        for compound in compounds:
+            key = compound["inchikey"]
+            if key and key in known:
+                duplicates.append({"compound_id": compound["compound_id"], "inchikey": key,
+                                   "duplicate_of": known[key]})
+                continue
+            if key:
+                known[key] = compound["compound_id"]
+            new_compounds.append(compound)
+        return new_compounds, duplicates
+
+    def add(self, compounds):
+        """
+        Adds the structures for new compounds to the index
+
+        :param compounds: The compounds, with "compound_id", "smiles" and "inchikey"
+        :type compounds: list
+        :return: A report with amount of structures added, and a list of the ones that failed and why
+        :rtype: dict
+        """
+        rows = [{"inchikey": compound["inchikey"], "smiles": compound["smiles"],
+                 "compound_id": compound["compound_id"]} for compound in compounds if compound["inchikey"]]
+        return self.dbf.bulk_insert(self.table, rows)
+
+    def merge(self, duplicates, volumes):
+        """
+        Adds the volume of the duplicates to the compounds that have the same structure, in one transaction
+
+        :param duplicates: The duplicates from check
+        :type duplicates: list
+        :param volumes: A dict with the compound_id of the duplicates as keys and the volume as values
+        :type volumes: dict
+        :return: Amount of compounds that have been updated
+        :rtype: int
+        """
+        updates = [(volumes[duplicate["compound_id"]], duplicate["duplicate_of"]) for duplicate in duplicates]
+        if not updates:
+            return 0
+        self.dbf.statistics.invalidate(self.compound_table)
+        with self.dbf.transaction() as conn:
+            cursor = conn.executemany(f"UPDATE {self.compound_table} SET volume = volume + ? WHERE compound_id = ?",
+                                      updates)
+        return cursor.rowcount
+
+    def add_aliases(self, duplicates):
+        """
+        Saves the compound_id of duplicates that are not added, as an alias for the compound with the same structure.
+        Duplicates that already have an alias, or have the same compound_id as the compound, are left out.
+
+        :param duplicates: The duplicates from check
+        :type duplicates: list
+        :return: A report with amount of aliases added, and a list of the ones that failed and why
+        :rtype: dict
+        """
+        known = self.resolve_aliases(duplicate["compound_id"] for duplicate in duplicates)
+        rows = [{"alias_id": duplicate["compound_id"], "compound_id": duplicate["duplicate_of"]}
+                for duplicate in duplicates
+                if duplicate["compound_id"] != duplicate["duplicate_of"] and duplicate["compound_id"] not in known]
+        return self.dbf.bulk_insert(self.alias_table, rows)
+
+    def resolve_aliases(self, compound_ids):
+        """
+        Finds the compounds for compound_ids that are aliases
+
+        :param compound_ids: The compound_ids to look for. Can be strings, as they are read from a file
+        :type compound_ids: iter
+        :return: A dict with the compound_ids that are aliases as keys, as they were given, and the compound_id of the
+            compound in the database as values
+        :rtype: dict
+        """
+        compound_ids = {compound_id for compound_id in compound_ids if compound_id not in (None, "")}
+        if not compound_ids:
+            return {}
+        search_limiter = {"alias_id": {"value": list(compound_ids), "operator": "IN", "target_column": "alias_id"}}
+        found = {str(row["alias_id"]): row["compound_id"] for row in
+                 self.dbf.stream_table_data(self.alias_table, search_limiter, ["alias_id", "compound_id"])}
+        return {compound_id: found[str(compound_id)] for compound_id in compound_ids if str(compound_id) in found}
+
+    def backfill(self, batch_size=None):
+        """
+        Adds the structures for all compounds in the database that are not in the index.
+        If more compounds have the same structure, the one with the lowest compound_id is used.
+
+        :param batch_size: Amount of compounds per insert. Defaults to bulk_chunk_size from the config
+        :type batch_size: int or None
+        :return: Amount of structures added
+        :rtype: int
+        """
+        batch_size = batch_size or self.dbf.chunk_size
+        missing = f"SELECT compound_id, smiles FROM {self.compound_table} WHERE compound_id NOT IN " \
+                  f"(SELECT compound_id FROM {self.table}) ORDER BY compound_id"
+        compounds = self.dbf.fetch(missing)
+
+        added = 0
+        for start in range(0, len(compounds), batch_size):
+            batch = [{"compound_id": compound_id, "smiles": smiles,
+                      "inchikey": inchikey(Chem.MolFromSmiles(smiles)) if smiles else None}
+                     for compound_id, smiles in compounds[start:start + batch_size]]
+            new_compounds, _ = self.check(batch)
+            added += self.add(new_compounds)["added"]
+        return added
+
+
+def duplicates_from_config(config):
+    """
+    Gets how duplicates are handled on import, from the config file
+
+    :param config: The config handler, with all the default information in the config file.
+    :type config: configparser.ConfigParser
+    :return: "skip" to leave the duplicates out, "merge" to add the volume to the compound with the same structure,
+        or "add" to add them as new compounds
+    :rtype: str
+    """
+    duplicates = config.get("Compound_import", "duplicates", fallback="skip").strip().casefold()
+    if duplicates not in ("skip", "merge", "add"):
+        raise ValueError(f"Unknown duplicate handling: {duplicates}")
+    return duplicates
+
+
+if __name__ == "__main__":
+    from database_handler import DataBaseFunctions
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    dbf = DataBaseFunctions(config)
+    si = StructureIndex(dbf, config["Tables"]["compound_structure_table"], config["Tables"]["compound_main"])
+    with dbf:
+        print("structures added", si.backfill())
@@ -8,7 +8,6 @@ compound_main = """ CREATE TABLE IF NOT EXISTS compound_main(
             png TEXT, 
             volume REAL,
             concentration REAL,
-            ac = TEXT
             ac_id INTEGER,
             origin_id INTEGER,
             FOREIGN KEY (ac_id) REFERENCES origin(ac_id)
@@ -65,9 +64,9 @@ location_table = """ CREATE TABLE IF NOT EXISTS locations(
 
 bio_experiment_table = """ CREATE TABLE IF NOT EXISTS bio_experiment(
             exp_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            assay_name TEXT
+            assay_name TEXT,
             raw_data TEXT,
-            plate_layout TEXT
+            plate_layout TEXT,
             responsible TEXT,
             date REAL
             ); """
@@ -83,7 +82,7 @@ biological_data = """ CREATE TABLE IF NOT EXISTS biological(
             ); """
 
 lc_experiment_table = """ CREATE TABLE IF NOT EXISTS lc_experiment(
-            batch PRIMARY KEY AUTOINCREMENT,
+            batch TEXT PRIMARY KEY,
             date REAL
             ); """
 
@@ -104,7 +103,7 @@ lcms_experiment_raw = """ CREATE TABLE IF NOT EXISTS lc_raw(
             batch TEXT,
             method TEXT,
             file_name TEXT,
-            date REAL
+            date REAL,
             FOREIGN KEY (compound_id) REFERENCES compound_main(compound_id),
             FOREIGN KEY (batch) REFERENCES lc_experiment(batch)
             ); """
@@ -113,4 +112,74 @@ compound_source = """ CREATE TABLE IF NOT EXISTS origin(
                 ac_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 ac TEXT,
                 origin TEXT
-                ); """
\ No newline at end of file
+                ); """
+
+compound_fingerprint_table = """ CREATE TABLE IF NOT EXISTS compound_fingerprint(
+            fp_type TEXT,
+            fp_params TEXT,
+            compound_id INTEGER,
+            n_bits INTEGER,
+            fingerprint BLOB,
+            PRIMARY KEY (fp_type, fp_params, compound_id),
+            FOREIGN KEY (compound_id) REFERENCES compound_main(compound_id)
+            ) WITHOUT ROWID; """
+
+compound_structure_table = """ CREATE TABLE IF NOT EXISTS compound_structure(
+            inchikey TEXT PRIMARY KEY,
+            smiles TEXT,
+            compound_id INTEGER,
+            FOREIGN KEY (compound_id) REFERENCES compound_main(compound_id)
+            ) WITHOUT ROWID; """
+
+compound_alias_table = """ CREATE TABLE IF NOT EXISTS compound_alias(
+            alias_id INTEGER PRIMARY KEY,
+            compound_id INTEGER,
+            FOREIGN KEY (compound_id) REFERENCES compound_main(compound_id)
+            ); """
+
+compound_descriptor_table = """ CREATE TABLE IF NOT EXISTS compound_descriptor(
+            compound_id INTEGER PRIMARY KEY,
+            mw REAL,
+            clogp REAL,
+            hbd INTEGER,
+            hba INTEGER,
+            tpsa REAL,
+            rot_bonds INTEGER,
+            FOREIGN KEY (compound_id) REFERENCES compound_main(compound_id)
+            ); """
+
+index_compound_main_ac = """ CREATE INDEX IF NOT EXISTS idx_compound_main_ac_id ON compound_main(ac_id); """
+
+index_compound_mp_well = """ CREATE INDEX IF NOT EXISTS idx_compound_mp_barcode_well ON compound_mp(mp_barcode, mp_well); """
+
+index_compound_mp_compound = """ CREATE INDEX IF NOT EXISTS idx_compound_mp_compound_id ON compound_mp(compound_id); """
+
+index_compound_dp_barcode = """ CREATE INDEX IF NOT EXISTS idx_compound_dp_barcode ON compound_dp(dp_barcode); """
+
+index_compound_dp_compound = """ CREATE INDEX IF NOT EXISTS idx_compound_dp_compound_id ON compound_dp(compound_id); """
+
+index_mp_plates_date = """ CREATE INDEX IF NOT EXISTS idx_mp_plates_date ON mp_plates(date); """
+
+index_dp_plates_date = """ CREATE INDEX IF NOT EXISTS idx_dp_plates_date ON dp_plates(date); """
+
+index_lc_experiment_date = """ CREATE INDEX IF NOT EXISTS idx_lc_experiment_date ON lc_experiment(date); """
+
+index_lc_raw_batch = """ CREATE INDEX IF NOT EXISTS idx_lc_raw_batch ON lc_raw(batch); """
+
+index_origin = """ CREATE INDEX IF NOT EXISTS idx_origin_origin ON origin(origin, ac); """
+
+index_purity_compound = """ CREATE INDEX IF NOT EXISTS idx_purity_compound_id ON purity(compound_id); """
+
+index_bio_experiment_date = """ CREATE INDEX IF NOT EXISTS idx_bio_experiment_date ON bio_experiment(date); """
+
+index_descriptor_mw = """ CREATE INDEX IF NOT EXISTS idx_compound_descriptor_mw ON compound_descriptor(mw); """
+
+index_descriptor_clogp = """ CREATE INDEX IF NOT EXISTS idx_compound_descriptor_clogp ON compound_descriptor(clogp); """
+
+index_descriptor_hbd = """ CREATE INDEX IF NOT EXISTS idx_compound_descriptor_hbd ON compound_descriptor(hbd); """
+
+index_descriptor_hba = """ CREATE INDEX IF NOT EXISTS idx_compound_descriptor_hba ON compound_descriptor(hba); """
+
+index_descriptor_tpsa = """ CREATE INDEX IF NOT EXISTS idx_compound_descriptor_tpsa ON compound_descriptor(tpsa); """
+
+index_descriptor_rot_bonds = """ CREATE INDEX IF NOT EXISTS idx_compound_descriptor_rot_bonds ON compound_descriptor(rot_bonds); """
@@ -0,0 +1,162 @@
+import threading
+
+
+_statistics_cache = {}
+# How many times each table have been written to, per database. None as table is for writes to all tables
+_write_counts = {}
+_cache_lock = threading.Lock()
+
+
+class TableStatistics:
+    """
+    :param dbf: The database functions, used for the searches
+    :type dbf: database_handler.DataBaseFunctions
+    """
+    def __init__(self, dbf):
+        self.dbf = dbf
+
+    def __str__(self):
+        """
+        Counts, max ids and totals for the tables, made with COUNT() and MAX() in the database, instead of getting all
+        the rows out of the database.
+        The results are cached per database, and shared between all DataBaseFunctions for the same database.
+        DataBaseFunctions clears the cache for a table, every time it writes to the table.
+        The writes are also counted, so other caches made from a table can see when the table have changed.
+        """
+
+    def _cached(self, tables, key, data, params=()):
+        """
+        Gets a statistic from the cache, or from the database if it is not in the cache
+
+        :param tables: The tables the statistic is made from. Used to clear the statistic when a table changes
+        :type tables: tuple
+        :param key: What the statistic is
+        :type key: tuple
+        :param data: The search
+        :type data: str
+        :param params: Values for the "?" placeholders in data
+        :type params: list or tuple
+        :return: All rows from the search
+        :rtype: list
+        """
+        cache_key = (self.dbf.database, tables, key)
+        with _cache_lock:
+            if cache_key in _statistics_cache:
+                return _statistics_cache[cache_key]
+
+        records = self.dbf.fetch(data, params)
+
+        with _cache_lock:
+            _statistics_cache[cache_key] = records
+        return records
+
+    def invalidate(self, table=None):
+        """
+        Clears the cached statistics for a table
+
+        :param table: The table that have changed. All tables if None
+        :type table: str or None
+        :return: The statistics for the table is removed from the cache
+        """
+        with _cache_lock:
+            _write_counts[self.dbf.database, table] = _write_counts.get((self.dbf.database, table), 0) + 1
+            for cache_key in list(_statistics_cache):
+                database, tables, _ = cache_key
+                if database == self.dbf.database and (table is None or table in tables):
+                    del _statistics_cache[cache_key]
+
+    def writes(self, table):
+        """
+        Gets how many times a table have been written to, by any DataBaseFunctions for the database. Used as the
+        version for caches that are made from the table, as it changes on every write, also when the amount of rows
+        stays the same.
+
+        :param table: Table name
+        :type table: str
+        :return: Amount of writes to all tables, and amount of writes to the table
+        :rtype: (int, int)
+        """
+        with _cache_lock:
+            return _write_counts.get((self.dbf.database, None), 0), _write_counts.get((self.dbf.database, table), 0)
+
+    def count(self, table, search_limiter=None):
+        """
+        Counts the rows in a table. The count is cleared from the cache when the table, or any other table the
+        search_limiter looks in, changes.
+
+        :param table: Table name
+        :type table: str
+        :param search_limiter: A dict over values to search for in the db. All rows if None
+        :type search_limiter: dict or None
+        :return: Number of rows in the table, that fits the search_limiter
+        :rtype: int
+        """
+        data, params = self.dbf.query_builder.select(table, search_limiter, ["COUNT(*)"])
+        try:
+            if self.dbf.query_builder.temp_tables:
+                # Temp tables have a new name for every search, so there is no reason to cache it
+                return self.dbf.fetch(data, params)[0][0]
+            tables = (table, *self.dbf.query_builder.search_tables(search_limiter))
+            return self._cached(tables, ("count", data, tuple(params)), data, params)[0][0]
+        finally:
+            self.dbf.query_builder.drop_temp_tables()
+
+    def max_id(self, table, column=None):
+        """
+        Finds the highest id in a table
+
+        :param table: Table name
+        :type table: str
+        :param column: The id column. Defaults to the primary key of the table
+        :type column: str or None
+        :return: The highest id, or 0 if the table is empty
+        :rtype: int
+        """
+        if column is None:
+            column = self._primary_key(table)
+        data = f"SELECT MAX({column}) FROM {table}"
+        return self._cached((table,), ("max", column), data)[0][0] or 0
+
+    def group_count(self, table, column):
+        """
+        Counts the rows in a table for each value in a column
+
+        :param table: Table name
+        :type table: str
+        :param column: The column to group the rows by
+        :type column: str
+        :return: A dict with the values in the column as keys, and the amount of rows as values
+        :rtype: dict
+        """
+        data = f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}"
+        return dict(self._cached((table,), ("group_count", column), data))
+
+    def origin_totals(self, compound_table="compound_main", origin_table="origin"):
+        """
+        Counts the compounds in the database for each origin
+
+        :param compound_table: The table with the compounds
+        :type compound_table: str
+        :param origin_table: The table with the origins
+        :type origin_table: str
+        :return: A dict with the origins as keys, and the amount of compounds as values
+        :rtype: dict
+        """
+        data = f"SELECT {origin_table}.origin, COUNT({compound_table}.compound_id) FROM {origin_table} " \
+               f"LEFT JOIN {compound_table} ON {compound_table}.ac_id = {origin_table}.ac_id " \
+               f"GROUP BY {origin_table}.origin"
+        return dict(self._cached((compound_table, origin_table), ("origin_totals",), data))
+
+    def _primary_key(self, table):
+        """
+        Finds the primary key for a table
+
+        :param table: Table name
+        :type table: str
+        :return: The name of the primary key column, or "rowid" if the table do not have one
+        :rtype: str
+        """
+        for clm in self.dbf.fetch(f"PRAGMA table_info({table})"):
+            if clm[5]:
+                return clm[1]
+        return "rowid"
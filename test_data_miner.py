@@ -0,0 +1,63 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_miner import _jdx_scans, _ms_spectrum
+
+
+def _baseline_frame(ms_file):
+    """
+    The MS parser from before the data was kept sparse, that searched each line for numbers and mz_range for the column
+    """
+    mz_range = np.arange(100, 1000.05, 0.05).round(2)
+    zero_matrix = np.zeros((len(ms_file), len(mz_range)))
+    ms_retention_times = []
+    for m, scan in enumerate(ms_file):
+        x = scan.split("\n")
+        ms_retention_times.append(float(re.findall(r"\d*\.?\d+", x[1].replace(",", "."))[0]))
+        del x[0:5]
+        del x[-1]
+        if m == len(ms_file) - 1:
+            del x[-1]
+        for line in x:
+            line = line.replace(",", ".", 1)
+            x_mz = float(re.findall(r"\d*\.?\d+", line)[0])
+            ind = np.where(mz_range == x_mz)[0][0]
+            zero_matrix[m][ind] = float(re.findall(r"\d*\.?\d+", line)[1])
+    df_ms = pd.DataFrame(zero_matrix)
+    df_ms.columns = mz_range
+    df_ms.index = ms_retention_times
+    return df_ms
+
+
+def _jdx_file(path, scans):
+    """
+    Writes a JCAMP-DX file with a scan for each list of peak lines
+    """
+    text = "##TITLE= test\n"
+    for number, lines in enumerate(scans, start=1):
+        text += f"##SCAN_NUMBER= {number}\n##RETENTION_TIME= {number * 0.0125:.4f}".replace(".", ",") + "\n"
+        text += "##TIC= 0\n##NPOINTS= 0\n##XYDATA= (XY..XY)\n"
+        text += "".join(f"{line}\n" for line in lines)
+    path.write_text(text + "##END=\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("separator", ["\t", " ", ", ", ";"])
+def test_ms_spectrum_is_the_same_as_the_baseline_parser(tmp_path, separator):
+    scans = [[f"100,05{separator}1200", f"250,5{separator}33,5", f"999,95{separator}7"],
+             [f"100{separator}4", f"250,5{separator}10", f"250,5{separator}12", f"612,35{separator}0,25"],
+             [f"432,1{separator}98765"]]
+    ms_file = _jdx_scans(_jdx_file(tmp_path / "sample_Seg1Ev2.JDX", scans))
+
+    pd.testing.assert_frame_equal(_ms_spectrum(ms_file).to_frame(), _baseline_frame(ms_file))
+
+
+@pytest.mark.parametrize("line", ["123,45", "123,4.5", "250,5"])
+def test_lines_with_one_number_are_not_split(tmp_path, line):
+    ms_file = _jdx_scans(_jdx_file(tmp_path / "sample_Seg1Ev2.JDX", [["100,05\t1200", line]]))
+
+    with pytest.raises(ValueError):
+        _ms_spectrum(ms_file)
@@ -0,0 +1,69 @@
+from database_controller import AddData
+
+
+def _compounds(dbf, compound_ids):
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": "C", "png": None, "volume": 100,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}
+                                      for compound_id in compound_ids])
+
+
+def _volumes(dbf, table, key):
+    return {row[0]: row[1] for row in dbf.fetch(f"SELECT {key}, volume FROM {table}")}
+
+
+def test_mother_plate_added_again_does_not_take_volume_twice(dbf, config, tmp_path):
+    _compounds(dbf, [1, 2])
+    csv_file = tmp_path / "mp.csv"
+    csv_file.write_text("MP1;A1;1;10\nMP1;B1;2;20\n")
+    add_data = AddData(config)
+
+    with dbf:
+        first = add_data.mother_plate([str(csv_file)], "pb_mp_output")
+        again = add_data.mother_plate([str(csv_file)], "pb_mp_output")
+
+    assert first["compound_mp"]["added"] == 2
+    assert again["compound_mp"]["added"] == 0
+    assert len(again["compound_mp"]["errors"]) == 2
+    assert _volumes(dbf, "compound_main", "compound_id") == {1: 90, 2: 80}
+
+
+def test_daughter_plate_added_again_does_not_take_volume_twice(dbf, config, monkeypatch):
+    _compounds(dbf, [1])
+    dbf.bulk_insert("mp_plates", [{"mp_barcode": "MP1", "date": "2022-07-13"}])
+    dbf.bulk_insert("compound_mp", [{"row_counter": None, "mp_barcode": "MP1", "compound_id": 1, "mp_well": "A1",
+                                     "volume": 50, "date": "2022-07-13"}])
+    add_data = AddData(config)
+
+    def _xml_controller(file_list):
+        data_dict = {f"transfer_{counter}": {"Row_Counter": counter, "DestinationBarcode": "DP1",
+                                             "DestinationWell": well, "Volume": 5, "Date": "2022-07-14",
+                                             "SourceBarcode": "MP1", "SourceWell": "A1"}
+                     for counter, well in enumerate(["A1", "A2"], start=1)}
+        return data_dict, {"DP1": {"DestinationBarcode": "DP1", "date": "2022-07-14"}}
+
+    monkeypatch.setattr(add_data.xml_r, "xml_controller", _xml_controller)
+
+    with dbf:
+        first = add_data.daughter_plate(["echo.xml"])
+        again = add_data.daughter_plate(["echo.xml"])
+
+    assert first["compound_dp"]["added"] == 2
+    assert again["compound_dp"]["added"] == 0
+    assert _volumes(dbf, "compound_mp", "mp_well") == {"A1": 40}
+
+
+def test_reports_from_each_part_of_an_import_are_merged(dbf, config, monkeypatch):
+    add_data = AddData(config)
+    monkeypatch.setattr("database_controller.file_list_distributor",
+                        lambda folder: (["compounds.sdf"], ["mp.csv"], [], [], [], []))
+    monkeypatch.setattr("database_controller.move_files", lambda file_list: None)
+    monkeypatch.setattr("database_controller.LCMSHandler", lambda: None)
+    monkeypatch.setattr(add_data, "compound_main", lambda file_list: {
+        "mp_plates": {"added": 1, "errors": [{"row": 0}]}, "duplicates": [{"compound_id": 7}]})
+    monkeypatch.setattr(add_data, "mother_plate", lambda file_list, file_type: {
+        "mp_plates": {"added": 2, "errors": [{"row": 3}]}, "aliases": [{"row": "Transferee_0"}]})
+
+    report = add_data.auto_controller("folder", "pb_mp_output")
+
+    assert report == {"mp_plates": {"added": 3, "errors": [{"row": 0}, {"row": 3}]},
+                      "duplicates": [{"compound_id": 7}], "aliases": [{"row": "Transferee_0"}]}
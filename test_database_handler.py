@@ -0,0 +1,138 @@
+import sqlite3
+
+import pytest
+
+
+def _plates(barcodes):
+    return [{"mp_barcode": barcode, "date": "2022-07-13"} for barcode in barcodes]
+
+
+def _count(dbf, table):
+    return dbf.fetch(f"SELECT COUNT(*) FROM {table}")[0][0]
+
+
+def test_bulk_insert_adds_all_rows(dbf):
+    report = dbf.bulk_insert("mp_plates", _plates(f"MP{number}" for number in range(25)), chunk_size=10)
+
+    assert report == {"added": 25, "errors": []}
+    assert _count(dbf, "mp_plates") == 25
+
+
+def test_bulk_insert_reports_failing_rows_and_adds_the_rest_of_the_chunk(dbf):
+    dbf.bulk_insert("mp_plates", _plates(["MP3"]))
+
+    rows = _plates(["MP0", "MP1", "MP2", "MP3", "MP4", "MP5", "MP5", "MP7"])
+    report = dbf.bulk_insert("mp_plates", rows, chunk_size=3)
+
+    assert report["added"] == 6
+    assert [error["row"] for error in report["errors"]] == [3, 6]
+    assert [error["data"] for error in report["errors"]] == [rows[3], rows[6]]
+    assert all("UNIQUE" in error["error"] for error in report["errors"])
+    assert _count(dbf, "mp_plates") == 7
+
+
+def test_bulk_insert_reports_missing_references(dbf):
+    dbf.bulk_insert("mp_plates", _plates(["MP1"]))
+    dbf.bulk_insert("compound_main", [{"compound_id": 1, "smiles": "C", "png": None, "volume": 10,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}])
+
+    rows = [{"row_counter": None, "mp_barcode": "MP1", "compound_id": compound_id, "mp_well": "A1", "volume": 10,
+             "date": "2022-07-13"} for compound_id in [1, 2]]
+    report = dbf.bulk_insert("compound_mp", rows)
+
+    assert report["added"] == 1
+    assert report["errors"][0]["row"] == 1
+    assert "FOREIGN KEY" in report["errors"][0]["error"]
+
+
+def test_bulk_insert_rolls_back_everything_on_other_errors(dbf):
+    def rows():
+        yield from _plates(f"MP{number}" for number in range(10))
+        raise RuntimeError("The file could not be read")
+
+    with pytest.raises(RuntimeError):
+        dbf.bulk_insert("mp_plates", rows(), chunk_size=3)
+
+    assert _count(dbf, "mp_plates") == 0
+
+
+def test_bulk_insert_is_rolled_back_with_the_outer_transaction(dbf):
+    with pytest.raises(sqlite3.OperationalError):
+        with dbf.transaction() as conn:
+            dbf.bulk_insert("mp_plates", _plates(["MP1", "MP2"]))
+            conn.execute("SELECT * FROM missing_table")
+
+    assert _count(dbf, "mp_plates") == 0
+
+
+def _mother_plate(dbf):
+    dbf.bulk_insert("mp_plates", _plates(["MP1"]))
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": "C", "png": None, "volume": 100,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}
+                                      for compound_id in [1, 2]])
+    dbf.bulk_insert("compound_mp", [{"row_counter": None, "mp_barcode": "MP1", "compound_id": compound_id,
+                                     "mp_well": well, "volume": 50, "date": "2022-07-13"}
+                                    for compound_id, well in [(1, "A1"), (2, "B1")]])
+
+
+def test_volume_ledger_subtracts_all_transfers_from_the_same_well(dbf):
+    _mother_plate(dbf)
+    transfers = {"DP1_A1": {"mp_barcode": "MP1", "mp_well": "A1", "volume": 5},
+                 "DP2_A1": {"mp_barcode": "MP1", "mp_well": "A1", "volume": 7},
+                 "DP1_B1": {"mp_barcode": "MP1", "mp_well": "B1", "volume": 1},
+                 "DP1_C1": {"mp_barcode": "MP1", "mp_well": "C1", "volume": 3}}
+
+    updated = dbf.update_volumes("compound_mp", transfers, ["mp_barcode", "mp_well"])
+
+    assert updated == 2
+    assert dict(dbf.fetch("SELECT mp_well, volume FROM compound_mp")) == {"A1": 38, "B1": 49}
+
+
+def test_volume_ledger_finds_the_source_of_each_transfer(dbf):
+    _mother_plate(dbf)
+    transfers = {"DP1_A1": {"mp_barcode": "MP1", "mp_well": "A1", "volume": 5},
+                 "DP2_A1": {"mp_barcode": "MP1", "mp_well": "A1", "volume": 7},
+                 "DP1_C1": {"mp_barcode": "MP1", "mp_well": "C1", "volume": 3}}
+
+    with dbf.transaction():
+        dbf.load_volume_ledger(transfers, ["mp_barcode", "mp_well"])
+        sources = dbf.resolve_volume_ledger("compound_mp", ["mp_barcode", "mp_well"], "compound_id")
+
+    assert sources == {"DP1_A1": 1, "DP2_A1": 1}
+
+
+def _synchronous(dbf):
+    return dbf.conn.execute("PRAGMA synchronous").fetchone()[0]
+
+
+def test_bulk_load_sets_synchronous_back(dbf):
+    with dbf:
+        normal = _synchronous(dbf)
+        with dbf.bulk_load():
+            assert _synchronous(dbf) != normal
+            dbf.conn.execute("INSERT INTO mp_plates VALUES('MP1', '2022-07-13')")
+        assert _synchronous(dbf) == normal
+    assert _count(dbf, "mp_plates") == 1
+
+
+def test_bulk_load_keeps_the_original_error(dbf):
+    with pytest.raises(KeyError):
+        with dbf, dbf.bulk_load():
+            normal = dbf.connection_settings["pragmas"]["synchronous"]
+            dbf.conn.execute("INSERT INTO mp_plates VALUES('MP1', '2022-07-13')")
+            raise KeyError("compound_id")
+
+    with dbf:
+        assert _synchronous(dbf) == {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}[normal]
+        assert _count(dbf, "mp_plates") == 0
+
+
+def test_bulk_load_inside_a_transaction(dbf):
+    with dbf:
+        normal = _synchronous(dbf)
+        with dbf.transaction() as conn:
+            conn.execute("INSERT INTO mp_plates VALUES('MP1', '2022-07-13')")
+            with dbf.bulk_load():
+                conn.execute("INSERT INTO mp_plates VALUES('MP2', '2022-07-13')")
+        assert _synchronous(dbf) == normal
+    assert _count(dbf, "mp_plates") == 2
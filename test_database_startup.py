@@ -0,0 +1,32 @@
+from database_startup import DatabaseSetUp
+
+
+def _compounds(dbf):
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": smiles, "png": None, "volume": 100,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}
+                                      for compound_id, smiles in [(1, "CCO"), (2, "OCC"), (3, "not a smiles code")]])
+
+
+def _count(dbf, table):
+    return dbf.fetch(f"SELECT COUNT(*) FROM {table}")[0][0]
+
+
+def test_migrations_do_not_add_data(dbf, config):
+    _compounds(dbf)
+    with dbf:
+        dbf.conn.execute("PRAGMA user_version = 3")
+
+    DatabaseSetUp(config, config["Database"]["database"]).migrate()
+
+    assert _count(dbf, "compound_structure") == 0
+    assert _count(dbf, "compound_descriptor") == 0
+
+
+def test_backfill_in_background(dbf, config):
+    _compounds(dbf)
+    reports = []
+
+    DatabaseSetUp(config, config["Database"]["database"]).backfill_in_background(reports.append).join()
+
+    assert reports == [{"compound_structure": 1, "compound_descriptor": 3}]
+    assert [tuple(row) for row in dbf.fetch("SELECT compound_id FROM compound_structure")] == [(1,)]
@@ -0,0 +1,28 @@
+from descriptor_store import DescriptorStore
+
+
+def _compounds(dbf, smiles_codes):
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": smiles, "png": None, "volume": 100,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}
+                                      for compound_id, smiles in enumerate(smiles_codes, start=1)])
+
+
+def test_compounds_that_can_not_be_read_are_only_tried_once(dbf):
+    _compounds(dbf, ["CCO", "not a smiles code", None])
+    store = DescriptorStore(dbf)
+
+    assert store.backfill() == 3
+    assert not store.missing()
+    assert store.backfill() == 0
+    assert [tuple(row) for row in dbf.fetch("SELECT compound_id, mw FROM compound_descriptor WHERE mw IS NULL")] \
+        == [(2, None), (3, None)]
+
+
+def test_exists_search_finds_compounds_in_the_range(dbf):
+    _compounds(dbf, ["C", "CCCCCCO", "not a smiles code"])
+    store = DescriptorStore(dbf)
+    store.backfill()
+    search_limiter = {"descriptors": store.exists_search({"mw": {"value": [50, None], "operator": "BETWEEN",
+                                                                 "target_column": "mw"}})}
+
+    assert [row["compound_id"] for row in dbf.stream_table_data("compound_main", search_limiter)] == [2]
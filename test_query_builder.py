@@ -0,0 +1,101 @@
+import pytest
+
+
+def _compounds(dbf, amount):
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": "C", "png": None,
+                                       "volume": compound_id * 10, "concentration": 10, "ac_id": None,
+                                       "origin_id": None} for compound_id in range(1, amount + 1)])
+
+
+def _search(dbf, search_limiter):
+    sql, params = dbf.query_builder.select("compound_main", search_limiter, ["compound_id"])
+    try:
+        return sorted(row[0] for row in dbf.fetch(sql, params))
+    finally:
+        dbf.query_builder.drop_temp_tables()
+
+
+def test_values_are_bound_as_parameters(dbf):
+    search_limiter = {"volume": {"value": 30, "operator": "<=", "target_column": "volume"},
+                      "smiles": {"value": "C' OR 1=1 --", "operator": "=", "target_column": "smiles"}}
+
+    sql, params = dbf.query_builder.select("compound_main", search_limiter)
+
+    assert sql == "SELECT * FROM compound_main WHERE ? <= volume AND ? = smiles"
+    assert params == [30, "C' OR 1=1 --"]
+
+
+def test_small_in_search_uses_placeholders(dbf):
+    _compounds(dbf, 10)
+    search_limiter = {"compound_id": {"value": [2, 4, 99], "operator": "IN", "target_column": "compound_id"}}
+
+    sql, params = dbf.query_builder.select("compound_main", search_limiter)
+
+    assert sql.endswith("WHERE compound_id IN (?,?,?)")
+    assert params == [2, 4, 99]
+    assert _search(dbf, search_limiter) == [2, 4]
+
+
+def test_large_in_search_uses_a_temp_table(dbf):
+    _compounds(dbf, 300)
+    values = list(range(0, 600, 2)) + [4, 4]
+    search_limiter = {"compound_id": {"value": values, "operator": "IN", "target_column": "compound_id"}}
+
+    sql, params = dbf.query_builder.select("compound_main", search_limiter)
+    dbf.query_builder.drop_temp_tables()
+
+    assert "SELECT value FROM temp.query_values_" in sql
+    assert params == []
+    assert _search(dbf, search_limiter) == list(range(2, 301, 2))
+
+
+def test_searches_that_are_not_used_are_left_out(dbf):
+    search_limiter = {"volume": {"value": 30, "operator": "<", "target_column": "volume", "use": False},
+                      "smiles": {"value": "", "operator": "=", "target_column": "smiles"}}
+
+    assert dbf.query_builder.select("compound_main", search_limiter) == ("SELECT * FROM compound_main", [])
+
+
+def test_unknown_operator(dbf):
+    search_limiter = {"volume": {"value": 30, "operator": "; DROP TABLE", "target_column": "volume"}}
+
+    with pytest.raises(ValueError):
+        dbf.query_builder.select("compound_main", search_limiter)
+
+
+@pytest.mark.parametrize("limits, sql, expected", [([20, 40], "volume BETWEEN ? AND ?", [2, 3, 4]),
+                                                   ([70, None], "? <= volume", [7, 8, 9, 10]),
+                                                   (["", 30], "? >= volume", [1, 2, 3])])
+def test_between_search(dbf, limits, sql, expected):
+    _compounds(dbf, 10)
+    search_limiter = {"volume": {"value": limits, "operator": "BETWEEN", "target_column": "volume"}}
+
+    assert dbf.query_builder.select("compound_main", search_limiter)[0].endswith(f"WHERE {sql}")
+    assert _search(dbf, search_limiter) == expected
+
+
+def test_between_search_without_limits_is_left_out(dbf):
+    search_limiter = {"volume": {"value": [None, ""], "operator": "BETWEEN", "target_column": "volume"}}
+
+    assert dbf.query_builder.select("compound_main", search_limiter) == ("SELECT * FROM compound_main", [])
+
+
+def test_exists_search_looks_in_the_other_table(dbf):
+    _compounds(dbf, 10)
+    dbf.bulk_insert("compound_descriptor", [{"compound_id": compound_id, "mw": compound_id * 100, "clogp": None,
+                                             "hbd": None, "hba": None, "tpsa": None, "rot_bonds": None}
+                                            for compound_id in range(1, 8)])
+    search_limiter = {"volume": {"value": 30, "operator": "<=", "target_column": "volume"},
+                      "descriptors": {"value": {"mw": {"value": [200, 500], "operator": "BETWEEN",
+                                                       "target_column": "mw"}},
+                                      "operator": "EXISTS",
+                                      "target_column": "compound_id",
+                                      "table": "compound_descriptor"}}
+
+    sql, params = dbf.query_builder.select("compound_main", search_limiter)
+
+    assert sql.endswith("WHERE ? <= volume AND EXISTS (SELECT 1 FROM compound_descriptor WHERE "
+                        "compound_descriptor.compound_id = compound_main.compound_id AND "
+                        "compound_descriptor.mw BETWEEN ? AND ?)")
+    assert params == [30, 200, 500]
+    assert _search(dbf, search_limiter) == [3, 4, 5]
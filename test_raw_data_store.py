@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ms_spectrum import SparseSpectrum
+from pickle_handler import df_writer
+from raw_data_store import RawDataStore, raw_key
+
+
+def _sample_data(seed, uv_dtype=np.float64):
+    rng = np.random.default_rng(seed)
+    uv = pd.DataFrame(rng.random((6, 4)).astype(uv_dtype), columns=[190.0, 191.2, 192.4, 193.6],
+                      index=[0.01, 0.02, 0.03, 0.04, 0.05, 0.06])
+    dense = rng.random((5, 8)) * (rng.random((5, 8)) > 0.6)
+    ms_neg = SparseSpectrum.from_frame(pd.DataFrame(dense, columns=(100 + 0.05 * np.arange(8)).round(2),
+                                                    index=[0.0125, 0.025, 0.0375, 0.05, 0.0625]))
+    return {"uv": uv, "ms_pos": "", "ms_neg": ms_neg}
+
+
+def _assert_same(data, expected):
+    pd.testing.assert_frame_equal(data["uv"], expected["uv"])
+    assert data["ms_pos"] == ""
+    pd.testing.assert_frame_equal(data["ms_neg"].to_frame(), expected["ms_neg"].to_frame())
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_write_and_read(tmp_path, compress):
+    store = RawDataStore(str(tmp_path / "raw_data"), compress)
+    data = _sample_data(1)
+
+    path = store.write("S1", "B1", data)
+
+    assert store.file("S1", "B1") == path
+    _assert_same(store.read("S1", "B1"), data)
+    assert store.read("S2", "B1") is None
+
+
+def test_uv_keeps_its_type(tmp_path):
+    store = RawDataStore(str(tmp_path))
+    store.write("S1", "B1", _sample_data(1, np.float32))
+
+    assert store.read("S1", "B1")["uv"].to_numpy().dtype == np.float32
+
+
+def test_read_batch_only_reads_the_batch(tmp_path):
+    store = RawDataStore(str(tmp_path))
+    data = {sample: _sample_data(seed) for seed, sample in enumerate(["S1", "S2", "S3"])}
+    store.write_many([("S1", "B1", data["S1"]), ("S2", "B1", data["S2"]), ("S3", "B2", data["S3"])])
+
+    batch_data = store.read_batch("B1")
+
+    assert list(batch_data) == ["S1", "S2"]
+    for sample in batch_data:
+        _assert_same(batch_data[sample], data[sample])
+    assert store.samples() == [("S1", "B1"), ("S2", "B1"), ("S3", "B2")]
+    assert store.samples("B2") == [("S3", "B2")]
+
+
+def test_writing_a_sample_again_replaces_it(tmp_path):
+    store = RawDataStore(str(tmp_path))
+    store.write("S1", "B1", _sample_data(1))
+    data = _sample_data(2)
+    store.write("S1", "B1", data)
+
+    _assert_same(store.read("S1", "B1"), data)
+    assert store.samples() == [("S1", "B1")]
+
+
+def test_migrate_pickle(tmp_path):
+    pickle_file = str(tmp_path / "purity_data")
+    data = {"S1_B1": _sample_data(1), "S2_B1": _sample_data(2)}
+    ms_frame = _sample_data(3)
+    ms_frame["ms_neg"] = ms_frame["ms_neg"].to_frame()
+    open(pickle_file, "wb").close()
+    for key, sample_data in data.items():
+        df_writer(pickle_file, {key: sample_data})
+    df_writer(pickle_file, {"old_sample": ms_frame})
+    store = RawDataStore(str(tmp_path / "raw_data"))
+
+    files = store.migrate_pickle(pickle_file, {"S1_B1": ("S1", "B1"), "S2_B1": ("S2", "B1")})
+
+    assert sorted(files) == [raw_key("S1", "B1"), raw_key("S2", "B1"), raw_key("old_sample", None)]
+    _assert_same(store.read("S2", "B1"), data["S2_B1"])
+    pd.testing.assert_frame_equal(store.read("old_sample", None)["ms_neg"].to_frame(), ms_frame["ms_neg"])
+
+
+def _is_mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_open_maps_the_arrays(tmp_path):
+    store = RawDataStore(str(tmp_path))
+    data = _sample_data(1)
+    store.write("S1", "B1", data)
+
+    raw_sample = store.open("S1", "B1")
+
+    assert _is_mapped(raw_sample["ms_neg"].values)
+    assert _is_mapped(raw_sample["uv"].to_numpy())
+    _assert_same(raw_sample, data)
+    assert list(store.open_batch("B1")) == ["S1"]
+    assert store.open("S2", "B1") is None
+
+
+def test_writing_a_sample_that_is_open(tmp_path, monkeypatch):
+    store = RawDataStore(str(tmp_path))
+    old_data = _sample_data(1)
+    old_file = store.write("S1", "B1", old_data)
+    raw_sample = store.open("S1", "B1")
+    raw_sample["uv"]
+
+    def _file_in_use(path):
+        raise PermissionError(f"The file is used by another process: {path}")
+
+    # Windows does not allow removing, or writing over, a file that is memory mapped
+    with monkeypatch.context() as patch:
+        patch.setattr("raw_data_store.os.remove", _file_in_use)
+        patch.setattr("raw_data_store.os.replace", _file_in_use)
+        new_data = _sample_data(2)
+        new_file = store.write("S1", "B1", new_data)
+
+    assert new_file != old_file
+    _assert_same(raw_sample, old_data)
+    _assert_same(store.read("S1", "B1"), new_data)
+    assert store.clean_up() == 1
+    assert store.clean_up() == 0
+    assert os.listdir(os.path.dirname(new_file)) == [os.path.basename(new_file)]
@@ -0,0 +1,22 @@
+from fingerprint_store import FingerprintStore
+from similarity_engine import SimilarityEngine
+
+
+def _compounds(dbf, compounds):
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": smiles, "png": None, "volume": 100,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}
+                                      for compound_id, smiles in compounds.items()])
+
+
+def test_cached_fingerprints_are_loaded_again_when_the_table_changes(dbf):
+    fp_store = FingerprintStore(dbf)
+    engine = SimilarityEngine(fp_store)
+    _compounds(dbf, {1: "CCO", 2: "c1ccccc1", 3: "c1ccccc1"})
+    with dbf:
+        fp_store.add({1: "CCO", 2: "c1ccccc1"}, "morgan")
+        assert [hit[0] for hit in engine.search("c1ccccc1", "morgan", 90)] == [2]
+
+        # Same amount of fingerprints as before, but for other compounds
+        dbf.conn.execute("DELETE FROM compound_fingerprint WHERE compound_id = 2")
+        fp_store.add({3: "c1ccccc1"}, "morgan")
+        assert [hit[0] for hit in engine.search("c1ccccc1", "morgan", 90)] == [3]
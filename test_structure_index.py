@@ -0,0 +1,19 @@
+from structure_index import StructureIndex
+
+
+def _compounds(dbf, compound_ids):
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": "CCO", "png": None, "volume": 100,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}
+                                      for compound_id in compound_ids])
+
+
+def test_skipped_duplicates_resolve_to_the_compound_in_the_database(dbf):
+    _compounds(dbf, [1])
+    structures = StructureIndex(dbf)
+    duplicates = [{"compound_id": 7, "inchikey": "LFQSCWFLJHTTHZ-UHFFFAOYSA-N", "duplicate_of": 1},
+                  {"compound_id": 1, "inchikey": "LFQSCWFLJHTTHZ-UHFFFAOYSA-N", "duplicate_of": 1}]
+
+    assert structures.add_aliases(duplicates) == {"added": 1, "errors": []}
+    assert structures.add_aliases(duplicates) == {"added": 0, "errors": []}
+    assert structures.resolve_aliases(["7", "1", "", None, "abc"]) == {"7": 1}
+    assert structures.resolve_aliases([7]) == {7: 1}
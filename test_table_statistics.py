@@ -0,0 +1,14 @@
+from descriptor_store import DescriptorStore
+
+
+def test_counts_are_cleared_when_a_table_in_an_exists_search_changes(dbf):
+    dbf.bulk_insert("compound_main", [{"compound_id": compound_id, "smiles": smiles, "png": None, "volume": 100,
+                                       "concentration": 10, "ac_id": None, "origin_id": None}
+                                      for compound_id, smiles in [(1, "C"), (2, "CCCCCCO")]])
+    store = DescriptorStore(dbf)
+    search_limiter = {"descriptors": store.exists_search({"mw": {"value": [50, None], "operator": "BETWEEN",
+                                                                 "target_column": "mw"}})}
+
+    assert dbf.statistics.count("compound_main", search_limiter) == 0
+    store.backfill()
+    assert dbf.statistics.count("compound_main", search_limiter) == 1
@@ -13,16 +13,10 @@ def uv_chromatogram(data, canvas, samples):
     uv_tensor is the tensor of intrest, e.g. P1_uv_tensor. When calling the function it is only necessary to define plate number (P).
     Data is the main dictionary containing all data."""
     # Define uv retention times
-    uv_tensor = []
-    for index, sample in enumerate(samples):
-        if index == 0:
-            uv_rt = data[sample]["uv"].index
-        uv_tensor.append(data[sample]["uv"])
-
-    uv_tensor = np.array(uv_tensor)
+    uv_rt = data[samples[0]]["uv"].index
 
-    # Sum over all wavelengths
-    uv_tensor_sum_wavelengths = np.sum(uv_tensor, axis=2)
+    # Sum over all wavelengths, one sample at the time, so the data for the samples is not copied into one tensor
+    uv_tensor_sum_wavelengths = [np.sum(np.asarray(data[sample]["uv"]), axis=1) for sample in samples]
     # Plot figure
     fig, ax = plt.subplots()
     for index, sample in enumerate(samples):
@@ -42,7 +36,7 @@ def MS_chromatogram(samples, plates, ms_mode, ms_tensor, data, canvas):
     Samples is a vector with the sample number(s) of intrest.
     P is the plate number.
     MS_mode can only take 'positive' or 'negative' as input.
-    MS_tensor is the tensor of intrest, e.g. P4_MS_pos_tensor.
+    MS_tensor is a list with the SparseSpectrum for each sample, e.g. P4_MS_pos_tensor.
     data is the main dictionary containing all data."""
     # Positive MS mode
     if ms_mode == 'pos':
@@ -56,12 +50,12 @@ def MS_chromatogram(samples, plates, ms_mode, ms_tensor, data, canvas):
 
     # Sum over all mz-values
 
-    ms_tensor_sum_mz = np.sum(ms_tensor, axis=2)
+    ms_tensor_sum_mz = [spectrum.sum_mz() for spectrum in ms_tensor]
     # Plot figure
     fig, ax = plt.subplots()
 
     for value, sample in enumerate([value - 1 for value, sample in enumerate(samples)]):
-        plt.plot(ms_tensor_sum_mz[value, :], label=samples[value])
+        plt.plot(ms_tensor_sum_mz[value], label=samples[value])
     plt.legend(loc='best', ncol=2, shadow=True, fancybox=True)
     ax.set_xticks(list(range(0, len(ms_rt), 5)))
     ax.set_xticklabels([str(x) for x in ms_rt[::5]])
@@ -81,7 +75,7 @@ def MS_spectrum(samples, plates, rt_mz, ms_mode, ms_tensor, data, canvas):
     P is the plate number.
     RT_mz is the retention time of interest.
     MS_mode can only take 'positive' or 'negative' as input.
-    MS_tensor is the tensor of intrest, e.g. P4_MS_pos_tensor.
+    MS_tensor is a list with the SparseSpectrum for each sample, e.g. P4_MS_pos_tensor.
     data is the main dictionary containing all data."""
     #Convert to seconds
     rt_mz = rt_mz*60
@@ -103,7 +97,7 @@ def MS_spectrum(samples, plates, rt_mz, ms_mode, ms_tensor, data, canvas):
     fig, ax = plt.subplots()
     #for sample in [sample - 1 for sample in samples]:
     for value, sample in enumerate([value - 1 for value, sample in enumerate(samples)]):
-        plt.plot(ms_tensor[value, rt_indx, :], label=samples[value])
+        plt.plot(ms_tensor[value].scan(rt_indx), label=samples[value])
     plt.legend(loc='best', ncol=2, shadow=True, fancybox=True)
     ax.set_xticks(list(range(0, len(ms_mz), 500)))
     ax.set_xticklabels([str(x) for x in ms_mz[::500]])
@@ -150,20 +144,20 @@ def heatmap_uv_rt(samples, plates, rt_value, uv_tensor, data, canvas):
     samples is a vector with the sample number(s) of intrest.
     uv_tensor is the tensor of intrest, e.g. P1_uv_tensor.
     data is the main dictionary containing all data."""
-    # Extract uv data for the given samples
-    uv_tensor_samples = []
-    for value, sample in enumerate(samples):
-        uv_tensor_samples.append(uv_tensor[value-1])
-    uv_tensor_samples = np.array(uv_tensor_samples)
     # Define uv wavelengths and retention times
     uv_wavelengths = data[plates[0]][samples[0]]['UV'].columns
     uv_rt = data[plates[0]][samples[0]]['UV'].index
     # Find index for selected retention time
     rt_closest_value = uv_rt[(np.fabs(uv_rt-rt_value)).argmin(axis=0)]
     rt_indx = [i for i, x in enumerate(uv_rt == rt_closest_value) if x][0]
+    # Extract uv data for the given samples. Only the selected retention time is read for each sample
+    uv_tensor_samples = []
+    for value, sample in enumerate(samples):
+        uv_tensor_samples.append(np.asarray(uv_tensor[value-1])[rt_indx, :])
+    uv_tensor_samples = np.array(uv_tensor_samples)
     #Plot figure
     fig, ax = plt.subplots()
-    sns.heatmap(uv_tensor_samples[:, rt_indx, :], ax=ax, center=0)
+    sns.heatmap(uv_tensor_samples, ax=ax, center=0)
     ax.set_xticks(list(range(0, len(uv_wavelengths), 25)))
     ax.set_xticklabels([str(x) for x in uv_wavelengths[::25]])
     ax.set_yticklabels(samples)
@@ -183,20 +177,20 @@ def heatmap_uv_wavelength(samples, plates, wavelength, uv_tensor, data, canvas):
     samples is a vector with the sample number(s) of intrest.
     uv_tensor is the tensor of intrest, e.g. P1_uv_tensor.
     data is the main dictionary containing all data."""
-    # Extract uv data for the given samples
-    uv_tensor_samples = []
-    for value, sample in enumerate(samples):
-        uv_tensor_samples.append(uv_tensor[value-1])
-    uv_tensor_samples = np.array(uv_tensor_samples)
     # Define uv wavelengths and retention times
     uv_wavelengths = data[plates[0]][samples[0]]['UV'].columns
     uv_rt = data[plates[0]][samples[0]]['UV'].index
     # Find index for selected wavelength
     wave_number = uv_wavelengths[(np.fabs(uv_wavelengths-wavelength)).argmin(axis=0)]
     wave_indx = [i for i, x in enumerate(uv_wavelengths == wave_number) if x][0]
+    # Extract uv data for the given samples. Only the selected wavelength is kept for each sample
+    uv_tensor_samples = []
+    for value, sample in enumerate(samples):
+        uv_tensor_samples.append(np.asarray(uv_tensor[value-1])[:, wave_indx])
+    uv_tensor_samples = np.array(uv_tensor_samples)
     #Plot figure
     fig, ax = plt.subplots()
-    sns.heatmap(uv_tensor_samples[:, :, wave_indx], ax=ax, center=0)
+    sns.heatmap(uv_tensor_samples, ax=ax, center=0)
     sns.color_palette("vlag", as_cmap=True)
     ax.set_xticks(list(range(0, len(uv_rt), 50)))
     ax.set_xticklabels([str(x) for x in uv_rt[::50]])
@@ -215,7 +209,7 @@ def heatmap_MS_sample_binned(samples, plates, bin_numbers, ms_mode, ms_tensor, d
     sample is the sample number of interest.
     P is the plate number.
     MS_mode is either 'pos' or 'neg'.
-    uv_tensor is the tensor of intrest, e.g. P1_uv_tensor.
+    ms_tensor is a list with the SparseSpectrum for each sample.
     data is the main dictionary containing all data."""
     # Positive MS mode
     if ms_mode == 'pos':
@@ -237,10 +231,10 @@ def heatmap_MS_sample_binned(samples, plates, bin_numbers, ms_mode, ms_tensor, d
     bin_size = round(len(ms_mz)/bin_numbers)
     for i in range(0, bin_numbers):
         if i == 0:
-            ms.append(np.sum(ms_tensor[temp_value-1, :, 0:bin_size+bin_size], axis=1))
+            ms.append(ms_tensor[temp_value-1].sum_mz(0, bin_size+bin_size))
             ms_columns.append(ms_mz[round(bin_size/2)])
         else:
-            ms.append(np.sum(ms_tensor[temp_value-1, :, i*bin_size:i*bin_size+bin_size], axis=1))
+            ms.append(ms_tensor[temp_value-1].sum_mz(i*bin_size, i*bin_size+bin_size))
             ms_columns.append(ms_mz[(bin_size*i)+round(bin_size/2)])
     ms = pd.DataFrame(ms)
     ms.index = ms_columns
@@ -264,7 +258,7 @@ def heatmap_MS_RT_binned(samples, plates, bin_numbers, ms_mode, rt_value, ms_ten
     P is the plate number.
     samples is a vector with the sample number(s) of intrest.
     MS_mode is either 'pos' or 'neg'.
-    uv_tensor is the tensor of intrest, e.g. P1_uv_tensor.
+    ms_tensor is a list with the SparseSpectrum for each sample.
     data is the main dictionary containing all data."""
     # Positive MS mode
     if ms_mode == 'pos':
@@ -280,21 +274,22 @@ def heatmap_MS_RT_binned(samples, plates, bin_numbers, ms_mode, rt_value, ms_ten
     ms_tensor_samples = []
     for value, samples in enumerate(samples):
         ms_tensor_samples.append(ms_tensor[value - 1])
-    ms_tensor_samples = np.array(ms_tensor_samples)
     ms_rt = np.round(ms_rt/60, 1)
     # Find index for selected retention time
     rt_closest_value = ms_rt[(np.fabs(ms_rt-rt_value)).argmin(axis=0)]
     rt_indx = [i for i, x in enumerate(ms_rt == rt_closest_value) if x][0]
+    # Only the selected scan is made dense
+    ms_tensor_samples = np.array([spectrum.scan(rt_indx) for spectrum in ms_tensor_samples])
     # Bin m/z-values accoridng to the number of bins defined
     ms = []
     ms_columns = []
     bin_size = round(len(ms_mz)/bin_numbers)
     for i in range(0, bin_numbers):
         if i == 0:
-            ms.append(np.sum(ms_tensor_samples[:, rt_indx, 0:bin_size+bin_size], axis=1))
+            ms.append(np.sum(ms_tensor_samples[:, 0:bin_size+bin_size], axis=1))
             ms_columns.append(ms_mz[round(bin_size/2)])
         else:
-            ms.append(np.sum(ms_tensor_samples[:, rt_indx, i*bin_size:i*bin_size+bin_size], axis=1))
+            ms.append(np.sum(ms_tensor_samples[:, i*bin_size:i*bin_size+bin_size], axis=1))
             ms_columns.append(ms_mz[(bin_size*i)+round(bin_size/2)])
     ms = pd.DataFrame(ms)
     ms.index = ms_columns
@@ -317,7 +312,7 @@ def heatmap_MS_mz(samples, plates, ms_mode, mz_value, ms_tensor, data, canvas):
     P is the plate number.
     samples is a vector with the sample number(s) of intrest.
     MS_mode is either 'pos' or 'neg'.
-    uv_tensor is the tensor of intrest, e.g. P1_uv_tensor.
+    ms_tensor is a list with the SparseSpectrum for each sample.
     data is the main dictionary containing all data."""
     # Positive MS mode
     if ms_mode == 'pos':
@@ -333,15 +328,16 @@ def heatmap_MS_mz(samples, plates, ms_mode, mz_value, ms_tensor, data, canvas):
     ms_tensor_samples = []
     for value, samples in enumerate(samples):
         ms_tensor_samples.append(ms_tensor[value-1])
-    ms_pos_tensor_samples = np.array(ms_tensor_samples)
 
     ms_rt = np.round(ms_rt/60, 1)
     # Find index for selected m/z-value
     mz_closest_value = ms_mz[(np.fabs(ms_mz-mz_value)).argmin(axis=0)]
     mz_indx = [i for i, x in enumerate(ms_mz == mz_closest_value) if x][0]
+    # Only the selected m/z-value is made dense
+    ms_pos_tensor_samples = np.array([spectrum.mz_trace(mz_indx) for spectrum in ms_tensor_samples])
     # Plot figure
     fig, ax = plt.subplots()
-    sns.heatmap(ms_pos_tensor_samples[:, :, mz_indx], ax=ax, center=0)
+    sns.heatmap(ms_pos_tensor_samples, ax=ax, center=0)
     ax.set_xticks(list(range(0, len(ms_rt), 5)))
     ax.set_xticklabels([str(x) for x in ms_rt[::5]])
     ax.set_ylabel(r'Sample number')